@@ -0,0 +1,287 @@
+# Copyright 2019, David Wilson
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Policies deciding which connection multiplexer communicates with each
+inventory host, used by
+:meth:`ansible_mitogen.process.ClassicWorkerModel._listener_for_name`.
+
+Each multiplexer is placed at several points on a ring using a stable hash,
+and inventory names are looked up by walking the ring from the hash of the
+name. Unlike :func:`hash`, the result does not depend on Python hash
+randomisation, so a host is handled by the same multiplexer on every run,
+and only a fraction of hosts move when the multiplexer count changes.
+
+Multiplexers periodically publish their load into a shared memory segment
+created before they are forked, where it can be read by every process
+without an RPC. The first assignment of each name is recorded in the same
+segment, so every WorkerProcess agrees on the multiplexer for a host even
+when the policy depends on load.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import bisect
+import ctypes
+import hashlib
+import itertools
+import logging
+import mmap
+import os
+import struct
+
+import mitogen.core
+
+import ansible_mitogen.affinity
+
+
+LOG = logging.getLogger(__name__)
+
+#: Maximum number of multiplexers whose load can be published.
+MAX_MUXES = 256
+
+#: Maximum number of inventory names whose assignment can be recorded. Names
+#: beyond this are assigned by the policy on every lookup.
+MAX_NAMES = 16384
+
+
+def stable_hash(s):
+    """
+    Return a 64-bit hash of the text `s` that is identical in every process
+    and run.
+    """
+    digest = hashlib.sha1(mitogen.core.to_text(s).encode('utf-8')).digest()
+    return struct.unpack('>Q', digest[:8])[0]
+
+
+class MuxLoad(ctypes.Structure):
+    """
+    Load published by one multiplexer.
+    """
+    _fields_ = [
+        ('streams', ctypes.c_uint32),
+        ('names', ctypes.c_uint32),
+        ('pending_bytes', ctypes.c_uint64),
+    ]
+
+
+class Assignment(ctypes.Structure):
+    """
+    Record of the multiplexer assigned an inventory name, stored in an open
+    addressing hash table keyed by :func:`stable_hash` of the name.
+    """
+    _fields_ = [
+        ('key', ctypes.c_uint64),
+        # Multiplexer index plus one, or 0 if the slot is free.
+        ('index', ctypes.c_uint32),
+    ]
+
+
+class State(ctypes.Structure):
+    """
+    Contents of shared memory segment.
+    """
+    _fields_ = [
+        ('lock', ansible_mitogen.affinity.sem_t),
+        ('loads', MuxLoad * MAX_MUXES),
+        ('assignments', Assignment * MAX_NAMES),
+    ]
+
+
+class HashPolicy(object):
+    """
+    Assign each name to the multiplexer following its hash on the ring.
+
+    :param int count:
+        Number of multiplexers.
+    :param bool shared:
+        If :data:`False`, do not create a shared memory segment, so no load
+        is published and assignments are not recorded.
+    """
+    #: Number of points each multiplexer occupies on the ring. More points
+    #: spread names more evenly.
+    replicas = 64
+
+    def __init__(self, count, shared=True):
+        self.count = count
+        ring = sorted(
+            (stable_hash(u'%d-%d' % (index, replica)), index)
+            for index in range(count)
+            for replica in range(self.replicas)
+        )
+        self._keys = [key for key, _ in ring]
+        self._indices = [index for _, index in ring]
+
+        #: :class:`State` in shared memory, or :data:`None` if shared locks
+        #: are unavailable on this platform.
+        self.state = None
+        if shared and ansible_mitogen.affinity._sem_init is not None and \
+                count <= MAX_MUXES:
+            self.mem = mmap.mmap(-1, ctypes.sizeof(State))
+            self.state = State.from_buffer(self.mem)
+            self.state.lock.init()
+
+    def candidates(self, name):
+        """
+        Yield each multiplexer index once, in ring order starting from the
+        hash of `name`.
+        """
+        pos = bisect.bisect(self._keys, stable_hash(name))
+        seen = set()
+        for i in range(len(self._keys)):
+            index = self._indices[(pos + i) % len(self._keys)]
+            if index not in seen:
+                seen.add(index)
+                yield index
+                if len(seen) == self.count:
+                    return
+
+    def _choose(self, name):
+        return next(self.candidates(name))
+
+    def _find_slot(self, key):
+        slots = self.state.assignments
+        pos = key % MAX_NAMES
+        for i in range(MAX_NAMES):
+            slot = slots[(pos + i) % MAX_NAMES]
+            if slot.key == key or not slot.index:
+                return slot
+
+    def choose(self, name):
+        """
+        Return the index of the multiplexer that should communicate with
+        inventory name `name`, recording it if this is the first assignment
+        of `name`.
+        """
+        if self.state is None:
+            return self._choose(name)
+
+        key = stable_hash(name)
+        self.state.lock.acquire()
+        try:
+            slot = self._find_slot(key)
+            if slot is not None and slot.index:
+                return slot.index - 1
+
+            index = self._choose(name)
+            self.state.loads[index].names += 1
+            if slot is not None:
+                slot.key = key
+                slot.index = index + 1
+            return index
+        finally:
+            self.state.lock.release()
+
+    def publish(self, index, streams, pending_bytes):
+        """
+        From the multiplexer with index `index`, record its current number of
+        streams and bytes awaiting transmission.
+        """
+        if self.state is not None:
+            load = self.state.loads[index]
+            load.streams = streams
+            load.pending_bytes = pending_bytes
+
+    def dump(self):
+        """
+        Return a list of dicts describing the last load published by each
+        multiplexer, and the number of names assigned to it.
+        """
+        if self.state is None:
+            return []
+        return [
+            {
+                'index': index,
+                'names': self.state.loads[index].names,
+                'streams': self.state.loads[index].streams,
+                'pending_bytes': self.state.loads[index].pending_bytes,
+            }
+            for index in range(self.count)
+        ]
+
+
+class LoadPolicy(HashPolicy):
+    """
+    Assign each new name to the least loaded of the first :attr:`choices`
+    multiplexers following its hash on the ring. The chosen multiplexer is
+    recorded, so later lookups of the name agree regardless of load.
+
+    Load is the sum of names already assigned, which counts hosts whose
+    connection is not yet established, streams, and pending bytes in units of
+    :attr:`pending_bytes_per_stream`.
+    """
+    #: Number of ring candidates compared for each new name.
+    choices = 2
+
+    #: Bytes awaiting transmission considered as costly as one stream.
+    pending_bytes_per_stream = 1048576
+
+    def _load(self, index):
+        load = self.state.loads[index]
+        return (
+            load.names + load.streams +
+            load.pending_bytes // self.pending_bytes_per_stream
+        )
+
+    def _choose(self, name):
+        candidates = itertools.islice(self.candidates(name), self.choices)
+        return min(candidates, key=self._load)
+
+
+POLICIES = {
+    'hash': HashPolicy,
+    'load': LoadPolicy,
+}
+
+
+def get_policy(count, shared=True):
+    """
+    Return a policy for `count` multiplexers, chosen by the
+    ``MITOGEN_MUX_ASSIGNMENT`` environment variable.
+
+    :param bool shared:
+        If :data:`False`, the multiplexers were not forked from this process,
+        so cannot publish load into a segment it creates. A
+        :class:`HashPolicy` without shared memory is returned.
+    """
+    name = os.environ.get('MITOGEN_MUX_ASSIGNMENT', 'hash')
+    klass = POLICIES.get(name)
+    if klass is None:
+        LOG.warning('unknown MITOGEN_MUX_ASSIGNMENT %r, using "hash"', name)
+        klass = HashPolicy
+    if not shared:
+        if klass is not HashPolicy:
+            LOG.warning('persistent multiplexers cannot share load, '
+                        'using "hash" policy')
+        return HashPolicy(count, shared=False)
+    policy = klass(count)
+    if policy.state is None and klass is not HashPolicy:
+        LOG.warning('shared memory is unavailable, using "hash" policy')
+        policy = HashPolicy(count)
+    return policy
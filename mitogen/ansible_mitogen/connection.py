@@ -505,6 +505,12 @@ class Connection(ansible.plugins.connection.ConnectionBase):
     #: pipelined directory creation or file transfer fails.
     chain = None
 
+    #: Broker shard owning the stream to the target, as returned by
+    #: ContextService, or :data:`None`. When set, its FileService serves
+    #: :meth:`put_file` transfers, keeping file data out of the connection
+    #: multiplexer's broker.
+    shard = None
+
     #
     # Note: any of the attributes below may be :data:`None` if the connection
     # plugin was constructed directly by a non-cooperative action, such as in
@@ -820,6 +826,7 @@ class Connection(ansible.plugins.connection.ConnectionBase):
             self.login_context = self.context
 
         self.init_child_result = dct['init_child_result']
+        self.shard = dct['shard']
 
     def get_good_temp_dir(self):
         """
@@ -876,6 +883,7 @@ class Connection(ansible.plugins.connection.ConnectionBase):
         self.login_context = None
         self.init_child_result = None
         self.chain = None
+        self.shard = None
 
     def close(self):
         """
@@ -1167,8 +1175,16 @@ class Connection(ansible.plugins.connection.ConnectionBase):
                                      utimes=(st.st_atime, st.st_mtime))
 
         self._connect()
+        if self.shard is not None:
+            # The shard is a fork of the multiplexer, so can read the file and
+            # stream it to the target without involving the multiplexer.
+            register_context = service_context = self.shard
+        else:
+            register_context = self.binding.get_service_context()
+            service_context = self.binding.get_child_service_context()
+
         mitogen.service.call(
-            call_context=self.binding.get_service_context(),
+            call_context=register_context,
             service_name='mitogen.service.FileService',
             method_name='register',
             path=ansible_mitogen.utils.unsafe.cast(in_path)
@@ -1180,7 +1196,7 @@ class Connection(ansible.plugins.connection.ConnectionBase):
         # file alive, but that requires more work.
         self.get_chain().call(
             ansible_mitogen.target.transfer_file,
-            context=self.binding.get_child_service_context(),
+            context=service_context,
             in_path=ansible_mitogen.utils.unsafe.cast(in_path),
             out_path=ansible_mitogen.utils.unsafe.cast(out_path)
         )
@@ -200,31 +200,64 @@ def scan(module_name, module_path, search_path):
     return result
 
 
+#: search_path -> `(ImportGraph, {name: ModuleSpec or None})`, shared by
+#: every scan using that search path.
+_graph_by_search_path = {}
+
+
 def _scan_importlib_find_spec(module_name, module_path, search_path):
     # type: (str, str, list[str]) -> list[(str, str, bool)]
+    try:
+        graph, specs = _graph_by_search_path[search_path]
+    except KeyError:
+        prefix = importlib.machinery.ModuleSpec(
+            PREFIX.rstrip('.'), loader=None,
+        )
+        prefix.submodule_search_locations = search_path
+        graph = mitogen.master.ImportGraph()
+        specs = {prefix.name: prefix}
+        _graph_by_search_path[search_path] = (graph, specs)
+
+    # Ansible modules are keyed by path, so they never collide with a
+    # module_utils name, nor with another module of the same name.
     module = importlib.machinery.ModuleSpec(
         module_name, loader=None, origin=module_path,
     )
-    prefix = importlib.machinery.ModuleSpec(
-        PREFIX.rstrip('.'), loader=None,
+
+    def get_imports(key):
+        if key == module_path:
+            spec = module
+        else:
+            spec = specs[key]
+        if graph.is_stale(key):
+            graph.discard(key)
+        names = graph.get(key)
+        if names is None:
+            names = _scan_spec_imports(spec, specs)
+            graph.add(key, spec.origin, names)
+        return names
+
+    return sorted(
+        (name, specs[name].origin,
+         specs[name].submodule_search_locations is not None)
+        for name in graph.closure(module_path, get_imports)
     )
-    prefix.submodule_search_locations = search_path
-    queue = collections.deque([module])
-    specs = {prefix.name: prefix}
-    while queue:
-        spec = queue.popleft()
-        if spec.origin is None:
-            continue
-        try:
-            with open(spec.origin, 'rb') as f:
-                code = compile(f.read(), spec.name, 'exec')
-        except Exception as exc:
-            raise ValueError((exc, module, spec, specs))
-
-        for name in walk_imports(code, prefix.name):
-            if name in specs:
-                continue
 
+
+def _scan_spec_imports(spec, specs):
+    # type: (ModuleSpec, dict) -> list[str]
+    """Return the names of module_utils imported by `spec`, resolving any
+    not yet present in `specs`.
+    """
+    try:
+        with open(spec.origin, 'rb') as f:
+            code = compile(f.read(), spec.name, 'exec')
+    except Exception as exc:
+        raise ValueError((exc, spec, specs))
+
+    names = []
+    for name in walk_imports(code, PREFIX.rstrip('.')):
+        if name not in specs:
             parent_name = name.rpartition('.')[0]
             parent = specs[parent_name]
             if parent is None or not parent.submodule_search_locations:
@@ -235,17 +268,12 @@ def _scan_importlib_find_spec(module_name, module_path, search_path):
                 name, parent.submodule_search_locations,
             )
             if child is None or child.origin is None:
-                specs[name] = None
-                continue
-
+                child = None
             specs[name] = child
-            queue.append(child)
 
-    del specs[prefix.name]
-    return sorted(
-        (spec.name, spec.origin, spec.submodule_search_locations is not None)
-        for spec in specs.values() if spec is not None
-    )
+        if specs[name] is not None and name not in names:
+            names.append(name)
+    return names
 
 
 def _scan_imp_find_module(module_name, module_path, search_path):
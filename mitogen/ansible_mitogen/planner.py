@@ -153,6 +153,13 @@ class Planner(object):
         """
         return []
 
+    def record_imports(self, names):
+        """
+        Note the Python module names the target reported importing from the
+        master while running the module. The default implementation does
+        nothing.
+        """
+
     def get_kwargs(self, **kwargs):
         """
         If :meth:`detect` returned :data:`True`, plan for the module's
@@ -332,7 +339,21 @@ class NewStylePlanner(ScriptPlanner):
         ]
 
     def get_module_deps(self):
-        return self.get_module_map()['builtin']
+        return self.get_module_map()['builtin'] + self._profile
+
+    def _get_profile_name(self):
+        return 'ansible_module_%s' % (self._inv.module_name,)
+
+    def record_imports(self, names):
+        binding = self._inv.connection.get_binding()
+        mitogen.service.call(
+            call_context=binding.get_service_context(),
+            service_name='ansible_mitogen.services.ModuleDepService',
+            method_name='record_imports',
+
+            module_name=self._get_profile_name(),
+            names=names,
+        )
 
     #: Module names appearing in this set always require forking, usually due
     #: to some terminal leakage that cannot be worked around in any sane
@@ -410,21 +431,26 @@ class NewStylePlanner(ScriptPlanner):
         )
 
     _module_map = None
+    #: Names of Python modules previous runs of this module imported from the
+    #: master, as recorded by :meth:`record_imports`.
+    _profile = None
 
     def get_module_map(self):
         if self._module_map is None:
             binding = self._inv.connection.get_binding()
-            self._module_map = mitogen.service.call(
+            module_map = mitogen.service.call(
                 call_context=binding.get_service_context(),
                 service_name='ansible_mitogen.services.ModuleDepService',
                 method_name='scan',
 
-                module_name='ansible_module_%s' % (self._inv.module_name,),
+                module_name=self._get_profile_name(),
                 module_path=self._inv.module_path,
                 search_path=self.get_search_path(),
                 builtin_path=ansible.executor.module_common._MODULE_UTILS_PATH,
                 context=self._inv.connection.context,
             )
+            self._profile = module_map.pop('profile', [])
+            self._module_map = module_map
         return self._module_map
 
     def get_kwargs(self):
@@ -531,7 +557,7 @@ def _propagate_deps(invocation, planner, context):
 
         context=context,
         paths=planner.get_push_files(),
-        # modules=planner.get_module_deps(), TODO
+        modules=planner.get_module_deps(),
         overridden_sources=invocation._overridden_sources,
         # needs to be a list because can't unpickle() a set()
         extra_sys_paths=list(invocation._extra_sys_paths),
@@ -688,4 +714,7 @@ def invoke(invocation):
             kwargs=planner.get_kwargs(),
         )
 
+    imports = response.pop('mitogen_imports', None)
+    if imports:
+        planner.record_imports(imports)
     return invocation.action._postprocess_response(response)
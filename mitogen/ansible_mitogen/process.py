@@ -30,13 +30,18 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
 import atexit
+import errno
+import fcntl
+import hashlib
 import logging
 import multiprocessing
 import os
 import resource
 import socket
 import signal
+import stat
 import sys
+import time
 
 try:
     import faulthandler
@@ -61,10 +66,14 @@ import mitogen.utils
 import ansible
 import ansible.constants as C
 import ansible.errors
+import ansible.executor.module_common
 
 import ansible_mitogen.logging
+import ansible_mitogen.loaders
+import ansible_mitogen.module_finder
 import ansible_mitogen.services
 import ansible_mitogen.affinity
+import ansible_mitogen.assignment
 
 
 LOG = logging.getLogger(__name__)
@@ -76,6 +85,17 @@ ANSIBLE_PKG_OVERRIDE = (
 
 MAX_MESSAGE_SIZE = 4096 * 1048576
 
+#: Modules whose :class:`mitogen.master.ModuleResponder` replies, along with
+#: those of their related modules, each multiplexer builds in a pool thread at
+#: startup, so the first target requesting them does not wait while they are
+#: compiled, minified and compressed. Replaced by the comma-separated list in
+#: ``MITOGEN_WARM_MODULES`` when it is set.
+WARM_MODULES = (
+    'mitogen',
+    'ansible_mitogen.target',
+    'ansible.module_utils.basic',
+)
+
 worker_model_msg = (
     'Mitogen connection types may only be instantiated when one of the '
     '"mitogen_*" or "operon_*" strategies are active.'
@@ -95,6 +115,11 @@ shutting_down_msg = (
 _worker_model = None
 
 
+#: Names of the Ansible modules used by the play that started the
+#: multiplexers, whose module_utils they also build at startup. Set by
+#: :class:`StrategyMixin` via :func:`set_warm_actions` before they fork.
+_warm_actions = ()
+
 #: A copy of the sole :class:`ClassicWorkerModel` that ever exists during a
 #: classic run, as return by :func:`get_classic_worker_model`.
 _classic_worker_model = None
@@ -138,6 +163,61 @@ def get_classic_worker_model(**kwargs):
     return _classic_worker_model
 
 
+def set_warm_actions(actions):
+    """
+    Record the names of the Ansible modules used by the current play, for
+    multiplexers started after this call to build at startup.
+    """
+    global _warm_actions
+    _warm_actions = tuple(actions)
+
+
+def get_warm_modules():
+    """
+    Return the list of module names a multiplexer builds at startup, from
+    ``MITOGEN_WARM_MODULES`` if it is set, otherwise :data:`WARM_MODULES`.
+    """
+    value = os.environ.get('MITOGEN_WARM_MODULES')
+    if value is None:
+        return list(WARM_MODULES)
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def get_module_utils(action):
+    """
+    Return the names of the builtin module_utils imported by the new-style
+    Ansible module implementing `action`, or the empty list if it cannot be
+    found or is not written in Python.
+    """
+    try:
+        path = ansible_mitogen.loaders.module_loader.find_plugin(action, '')
+    except Exception:
+        LOG.debug('cannot find module for %r', action, exc_info=True)
+        return []
+
+    if not (path and path.endswith('.py')):
+        return []
+
+    builtin_path = os.path.abspath(
+        ansible.executor.module_common._MODULE_UTILS_PATH
+    )
+    try:
+        resolved = ansible_mitogen.module_finder.scan(
+            module_name='ansible_module_%s' % (action,),
+            module_path=path,
+            search_path=(builtin_path,),
+        )
+    except Exception:
+        LOG.debug('cannot scan %r', path, exc_info=True)
+        return []
+
+    return [
+        fullname
+        for fullname, path, is_pkg in resolved
+        if os.path.abspath(path).startswith(builtin_path)
+    ]
+
+
 def getenv_int(key, default=0):
     """
     Get an integer-valued environment variable `key`, if it exists and parses
@@ -278,6 +358,115 @@ def get_cpu_count(default=None):
     return cpu_count
 
 
+def get_daemon_dir():
+    """
+    Return the directory for persistent multiplexer sockets from the
+    MITOGEN_MUX_DAEMON environment variable, creating it if necessary, or
+    :data:`None` if persistent multiplexers are disabled.
+    """
+    path = os.environ.get('MITOGEN_MUX_DAEMON')
+    if not path:
+        return None
+
+    path = os.path.abspath(os.path.expanduser(path))
+    try:
+        os.makedirs(path, int('0700', 8))
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+    # Anyone able to write here could hand us their own multiplexer.
+    st = os.lstat(path)
+    if not (stat.S_ISDIR(st.st_mode) and st.st_uid == os.geteuid() and
+            stat.S_IMODE(st.st_mode) & int('0077', 8) == 0):
+        LOG.warning('not using MITOGEN_MUX_DAEMON directory %s: it must be a '
+                    'directory owned by UID %d with mode 0700', path,
+                    os.geteuid())
+        return None
+    return path
+
+
+#: Prefixes of environment variables that configure a persistent
+#: multiplexer, and so are part of :func:`get_daemon_tag`.
+DAEMON_ENV_PREFIXES = ('MITOGEN_', 'ANSIBLE_')
+
+#: Other environment variables that are part of :func:`get_daemon_tag`.
+DAEMON_ENV_NAMES = ('PATH', 'PYTHONPATH', 'HOME', 'USER')
+
+
+def get_daemon_tag():
+    """
+    Return a string identifying the Mitogen, Ansible and Python installations
+    in use, and the configuration and environment a multiplexer inherits
+    when it is started, so a persistent multiplexer is only reused by a
+    controller that would have started an identical one.
+    """
+    env = sorted(
+        (key, value)
+        for key, value in os.environ.items()
+        if key.startswith(DAEMON_ENV_PREFIXES) or key in DAEMON_ENV_NAMES
+    )
+    s = repr((
+        mitogen.__version__,
+        ansible.__version__,
+        sys.executable,
+        sys.path,
+        os.path.dirname(mitogen.__file__),
+        env,
+        getattr(C, 'CONFIG_FILE', None),
+        C.DEFAULT_FORKS,
+        C.DEFAULT_STRATEGY,
+    ))
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()[:12]
+
+
+def stop_mux_daemons(path=None, timeout=10.0):
+    """
+    Ask every persistent multiplexer with a socket in the directory `path`
+    to shut down cleanly, waiting up to `timeout` seconds for each to exit.
+
+    :param str path:
+        Directory, or :data:`None` to use :func:`get_daemon_dir`.
+    :returns:
+        Count of multiplexers that were running.
+    """
+    path = path or get_daemon_dir()
+    if path is None or not os.path.isdir(path):
+        return 0
+
+    count = 0
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.pid'):
+            continue
+
+        pid_path = os.path.join(path, name)
+        sock_path = pid_path[:-len('.pid')] + '.sock'
+        try:
+            if mitogen.unix.is_path_dead(sock_path):
+                LOG.debug('removing stale %s', pid_path)
+                os.unlink(pid_path)
+                continue
+            with open(pid_path) as fp:
+                pid = int(fp.read())
+            LOG.debug('stopping multiplexer PID %d at %s', pid, sock_path)
+            os.kill(pid, signal.SIGTERM)
+        except ValueError:
+            LOG.warning('ignoring %s: it does not contain a PID', pid_path)
+            continue
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT and e.errno != errno.ESRCH:
+                raise
+            # Exitted since the socket was checked.
+            LOG.debug('%s: %s', pid_path, e)
+            continue
+        count += 1
+
+        deadline = mitogen.core.now() + timeout
+        while os.path.exists(sock_path) and mitogen.core.now() < deadline:
+            time.sleep(0.1)
+    return count
+
+
 class Broker(mitogen.master.Broker):
     """
     WorkerProcess maintains fewer file descriptors, therefore does not need
@@ -408,6 +597,10 @@ class ClassicWorkerModel(WorkerModel):
     #: top-level process when running a new-style mode.
     parent = None
 
+    #: :mod:`ansible_mitogen.assignment` policy choosing the multiplexer for
+    #: each inventory name, and holding the load published by multiplexers.
+    assignment_policy = None
+
     def __init__(self, _init_logging=True):
         """
         Arrange for classic model multiplexers to be started. The parent choses
@@ -430,10 +623,17 @@ class ClassicWorkerModel(WorkerModel):
         mitogen.core.set_cloexec(self.parent_sock.fileno())
         mitogen.core.set_cloexec(self.child_sock.fileno())
 
+        daemon_dir = get_daemon_dir()
         self._muxes = [
-            MuxProcess(self, index)
+            MuxProcess(self, index, daemon_dir)
             for index in range(get_cpu_count(default=1))
         ]
+        # Persistent multiplexers may have been forked by an earlier run,
+        # and would publish into that run's segment.
+        self.assignment_policy = ansible_mitogen.assignment.get_policy(
+            len(self._muxes),
+            shared=daemon_dir is None,
+        )
         for mux in self._muxes:
             mux.start()
 
@@ -444,13 +644,27 @@ class ClassicWorkerModel(WorkerModel):
     def _listener_for_name(self, name):
         """
         Given an inventory hostname, return the UNIX listener that should
-        communicate with it. This is a simple hash of the inventory name.
+        communicate with it, as chosen by :attr:`assignment_policy`.
         """
-        mux = self._muxes[abs(hash(name)) % len(self._muxes)]
+        mux = self._muxes[self.assignment_policy.choose(name)]
         LOG.debug('will use multiplexer %d (%s) to connect to "%s"',
                   mux.index, mux.path, name)
         return mux.path
 
+    def get_mux_load(self):
+        """
+        Return a list of dicts describing the load last published by each
+        multiplexer, and the number of inventory names assigned to it. The
+        list is empty if :attr:`assignment_policy` has no shared memory, as
+        with persistent multiplexers.
+        """
+        dump = self.assignment_policy.dump()
+        for dct in dump:
+            mux = self._muxes[dct['index']]
+            dct['pid'] = mux.pid
+            dct['path'] = mux.path
+        return dump
+
     def _reconnect(self, path):
         if self.router is not None:
             # Router can just be overwritten, but the previous parent
@@ -489,6 +703,11 @@ class ClassicWorkerModel(WorkerModel):
         if self._pid != os.getpid():
             return
 
+        for dct in self.get_mux_load():
+            LOG.debug('multiplexer %(index)d PID %(pid)d: %(names)d names, '
+                      '%(streams)d streams, %(pending_bytes)d bytes pending',
+                      dct)
+
         try:
             self.parent_sock.shutdown(socket.SHUT_WR)
         except socket.error:
@@ -500,6 +719,8 @@ class ClassicWorkerModel(WorkerModel):
         self.parent_sock.close()
 
         for mux in self._muxes:
+            if mux.daemon:
+                continue
             _, status = os.waitpid(mux.pid, 0)
             status = mitogen.fork._convert_exit_status(status)
             LOG.debug('multiplexer %d PID %d %s', mux.index, mux.pid,
@@ -585,21 +806,120 @@ class MuxProcess(object):
     #: applied to locally executed commands and modules.
     cls_original_env = None
 
-    def __init__(self, model, index):
+    #: Seconds between updates of the load published to
+    #: :attr:`ClassicWorkerModel.assignment_policy`.
+    load_publish_interval = 1.0
+
+    #: Seconds a persistent multiplexer waits with no connected
+    #: WorkerProcess before exiting.
+    idle_timeout = getenv_int('MITOGEN_MUX_IDLE_TIMEOUT', default=300)
+
+    _load_timer = None
+    _stop_requested = False
+
+    def __init__(self, model, index, daemon_dir=None):
         #: :class:`ClassicWorkerModel` instance we were created by.
         self.model = model
         #: MuxProcess CPU index.
         self.index = index
-        #: Individual path of this process.
-        self.path = mitogen.unix.make_socket_path()
+        #: If :data:`True`, this is a persistent multiplexer living in
+        #: `daemon_dir`, that may already be running, and outlives the
+        #: top-level process. See :func:`get_daemon_dir`.
+        self.daemon = daemon_dir is not None
+        if self.daemon:
+            #: Individual path of this process.
+            self.path = os.path.join(daemon_dir, 'mux-%s-%d.sock' % (
+                get_daemon_tag(),
+                index,
+            ))
+            self.pid_path = self.path[:-len('.sock')] + '.pid'
+        else:
+            self.path = mitogen.unix.make_socket_path()
 
-    def start(self):
-        self.pid = os.fork()
-        if self.pid:
-            # Wait for child to boot before continuing.
-            mitogen.core.io_op(self.model.parent_sock.recv, 1)
+    def _read_pid(self):
+        try:
+            with open(self.pid_path) as fp:
+                return int(fp.read())
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def _close_inherited_fds(self):
+        """
+        Close descriptors above stderr that the top-level process inherited
+        from whatever started it, so a persistent multiplexer does not hold
+        open pipes or files belonging to the first run's caller. Descriptors
+        created by Python and Mitogen are close-on-exec, so are left alone,
+        since objects in this process still refer to them. On Python 2 they
+        are not, so nothing is closed.
+        """
+        if sys.version_info < (3,):
             return
 
+        try:
+            names = os.listdir('/proc/self/fd')
+        except OSError:
+            names = range(mitogen.parent.SC_OPEN_MAX)
+
+        for name in names:
+            fd = int(name)
+            if fd <= 2:
+                continue
+            try:
+                if not fcntl.fcntl(fd, fcntl.F_GETFD) & fcntl.FD_CLOEXEC:
+                    os.close(fd)
+            except (IOError, OSError):
+                pass
+
+    def _start_daemon(self):
+        """
+        Reuse a persistent multiplexer already listening on :attr:`path`, or
+        start one as a detached grandchild.
+
+        :returns:
+            :data:`True` in the new multiplexer, otherwise :data:`False`.
+        """
+        fp = open(self.path[:-len('.sock')] + '.lock', 'w')
+        try:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            if not mitogen.unix.is_path_dead(self.path):
+                self.pid = self._read_pid()
+                LOG.debug('reusing multiplexer %d PID %d at %s',
+                          self.index, self.pid, self.path)
+                return False
+
+            pid = os.fork()
+            if pid:
+                os.waitpid(pid, 0)
+                # Wait for grandchild to boot before continuing.
+                mitogen.core.io_op(self.model.parent_sock.recv, 1)
+                self.pid = self._read_pid()
+                return False
+
+            os.setsid()
+            if os.fork():
+                os._exit(0)
+
+            # Don't hold open pipes the top-level's caller may wait on.
+            null = os.open(os.devnull, os.O_RDWR)
+            for fd in 0, 1, 2:
+                os.dup2(null, fd)
+            os.close(null)
+            self._close_inherited_fds()
+            return True
+        finally:
+            fp.close()
+
+    def start(self):
+        if self.daemon:
+            if not self._start_daemon():
+                return
+        else:
+            self.pid = os.fork()
+            if self.pid:
+                # Wait for child to boot before continuing.
+                mitogen.core.io_op(self.model.parent_sock.recv, 1)
+                return
+
         ansible_mitogen.logging.set_process_name('mux:' + str(self.index))
         if setproctitle:
             setproctitle.setproctitle('mitogen mux:%s (%s)' % (
@@ -637,19 +957,56 @@ class MuxProcess(object):
         self._setup_services()
 
         try:
+            if self.daemon:
+                with open(self.pid_path, 'w') as fp:
+                    fp.write(str(os.getpid()))
+                signal.signal(signal.SIGTERM, self._on_sigterm)
+
             # Let the parent know our listening socket is ready.
             mitogen.core.io_op(self.model.child_sock.send, b'1')
-            # Block until the socket is closed, which happens on parent exit.
-            mitogen.core.io_op(self.model.child_sock.recv, 1)
+            if self.daemon:
+                self.model.child_sock.close()
+                self._wait_idle()
+            else:
+                # Block until the socket is closed, which happens on parent
+                # exit.
+                mitogen.core.io_op(self.model.child_sock.recv, 1)
         finally:
             self.broker.shutdown()
             self.broker.join()
+            if self.daemon and self._read_pid() == os.getpid():
+                os.unlink(self.pid_path)
 
             # Test frameworks living somewhere higher on the stack of the
             # original parent process may try to catch sys.exit(), so do a C
             # level exit instead.
             os._exit(0)
 
+    def _on_sigterm(self, signum, frame):
+        self._stop_requested = True
+
+    def _count_clients(self):
+        return sum(
+            1
+            for stream in set(self.router._stream_by_id.values())
+            if stream.name.startswith(u'unix_client.')
+        )
+
+    def _wait_idle(self):
+        """
+        In a persistent multiplexer, block until SIGTERM is received, or until
+        no WorkerProcess has been connected for :attr:`idle_timeout` seconds.
+        """
+        last_active = mitogen.core.now()
+        while not self._stop_requested:
+            time.sleep(1.0)
+            if self.broker.defer_sync(self._count_clients):
+                last_active = mitogen.core.now()
+            elif mitogen.core.now() - last_active > self.idle_timeout:
+                LOG.debug('%r: idle for %d seconds, exiting',
+                          self, self.idle_timeout)
+                break
+
     def _enable_router_debug(self):
         if 'MITOGEN_ROUTER_DEBUG' in os.environ:
             self.router.enable_debug()
@@ -678,6 +1035,28 @@ class MuxProcess(object):
         )
         self._enable_router_debug()
         self._enable_stack_dumps()
+        if self.model.assignment_policy.state is not None:
+            self.broker.defer(self._publish_load)
+
+    def _publish_load(self):
+        """
+        Publish the number of streams and bytes awaiting transmission, then
+        schedule the next update. Runs on the broker thread.
+        """
+        streams = set(self.router._stream_by_id.values())
+        self.model.assignment_policy.publish(
+            index=self.index,
+            streams=len(streams),
+            pending_bytes=sum(
+                stream.protocol.pending_bytes()
+                for stream in streams
+                if hasattr(stream.protocol, 'pending_bytes')
+            ),
+        )
+        self._load_timer = self.broker.timers.schedule(
+            when=mitogen.core.now() + self.load_publish_interval,
+            func=self._publish_load,
+        )
 
     def _setup_services(self):
         """
@@ -689,6 +1068,22 @@ class MuxProcess(object):
             size=getenv_int('MITOGEN_POOL_SIZE', default=32),
         )
         setup_pool(self.pool)
+        self.pool.defer(self._warm_responder)
+
+    def _warm_responder(self):
+        """
+        Build the responder's replies for :func:`get_warm_modules` and the
+        module_utils of the current play's modules. Runs in a pool thread;
+        requests for modules it has not yet reached are answered by the
+        responder's own builder thread meanwhile.
+        """
+        t0 = mitogen.core.now()
+        names = get_warm_modules()
+        for action in _warm_actions:
+            names.extend(get_module_utils(action))
+        count = self.router.responder.warm(names)
+        LOG.debug('multiplexer %d: warmed %d modules in %d ms', self.index,
+                  count, 1000 * (mitogen.core.now() - t0))
 
     def _on_broker_shutdown(self):
         """
@@ -697,6 +1092,8 @@ class MuxProcess(object):
         up pending handlers and connections, which is required for the threads
         to exit gracefully.
         """
+        if self._load_timer is not None:
+            self._load_timer.cancel()
         self.pool.stop(join=False)
 
     def _on_broker_exit(self):
@@ -92,6 +92,16 @@ for symbol in 'res_init', '__res_init':
 LOG = logging.getLogger(__name__)
 
 
+def _get_master_importer():
+    """
+    Return the :class:`mitogen.core.Importer` fetching modules from the
+    master, or :data:`None` if this process is the master.
+    """
+    for finder in sys.meta_path:
+        if isinstance(finder, mitogen.core.Importer):
+            return finder
+
+
 def shlex_split_b(s):
     """
     Use shlex.split() to split characters in some single-byte encoding, without
@@ -874,6 +884,13 @@ class NewStyleRunner(ScriptRunner):
         synchronization mechanism by importing everything the module will need
         prior to detaching.
         """
+        # Request everything not yet pushed by the master in one message, so
+        # the imports below wait on replies already in flight rather than
+        # paying a round-trip each.
+        importer = _get_master_importer()
+        if importer is not None:
+            importer.prefetch(self.module_map['builtin'])
+
         # I think "custom" means "found in custom module_utils search path",
         # e.g. playbook relative dir, ~/.ansible/..., Ansible collection.
         for fullname, _, _ in self.module_map['custom']:
@@ -908,6 +925,20 @@ class NewStyleRunner(ScriptRunner):
 
                 raise
 
+    def _get_master_imports(self):
+        """
+        Return the names of modules imported from the master since
+        :meth:`setup` began, so the controller can push them ahead of the next
+        run of the same Ansible module.
+        """
+        return [
+            mitogen.core.to_text(fullname)
+            for fullname, module in list(sys.modules.items())
+            if fullname not in self._modules_before_setup
+            and isinstance(getattr(module, '__loader__', None),
+                           mitogen.core.Importer)
+        ]
+
     def _setup_excepthook(self):
         """
         Starting with Ansible 2.6, some modules (file.py) install a
@@ -919,6 +950,7 @@ class NewStyleRunner(ScriptRunner):
     def setup(self):
         super(NewStyleRunner, self).setup()
 
+        self._modules_before_setup = set(sys.modules)
         self._stdio = NewStyleStdio(self.args, self.get_temp_dir())
         # It is possible that not supplying the script filename will break some
         # module, but this has never been a bug report. Instead act like an
@@ -1052,11 +1084,15 @@ class NewStyleRunner(ScriptRunner):
         finally:
             self.atexit_wrapper.run_callbacks()
 
-        return {
+        result = {
             u'rc': rc,
             u'stdout': mitogen.core.to_text(sys.stdout.getvalue()),
             u'stderr': mitogen.core.to_text(sys.stderr.getvalue()),
         }
+        imports = self._get_master_imports()
+        if imports:
+            result[u'mitogen_imports'] = imports
+        return result
 
 
 class JsonArgsRunner(ScriptRunner):
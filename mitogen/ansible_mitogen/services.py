@@ -121,9 +121,28 @@ class ContextService(mitogen.service.Service):
     """
     max_interpreters = int(os.getenv('MITOGEN_MAX_INTERPRETERS', '20'))
 
+    #: Number of broker shards to fork. When non-zero, connections not made
+    #: via another context are instead made via the least loaded shard: a
+    #: forked child with its own broker thread, which then owns the stream.
+    #: Connection setup, target IO and module forwarding for the target then
+    #: happen in the shard, and :meth:`get` returns the shard so workers can
+    #: have its own :class:`mitogen.service.FileService` serve file transfers
+    #: to the target. Other messages between workers and targets are still
+    #: relayed by this process's broker thread.
+    broker_shards = int(os.getenv('MITOGEN_BROKER_SHARDS', '0'))
+
+    #: Number of times :meth:`_get_shard` tries to replace shards that all
+    #: exitted before a connection could be assigned to one.
+    max_shard_attempts = 3
+
+    shards_exitted_msg = 'every broker shard exitted after %d attempts to fork'
+
     def __init__(self, *args, **kwargs):
         super(ContextService, self).__init__(*args, **kwargs)
         self._lock = threading.Lock()
+        #: Serializes forking of broker shards, which happens without holding
+        #: :attr:`_lock`.
+        self._shard_fork_lock = threading.Lock()
         #: Records the :meth:`get` result dict for successful calls, returned
         #: for identical subsequent calls. Keyed by :meth:`key_from_dict`.
         self._response_by_key = {}
@@ -142,6 +161,14 @@ class ContextService(mitogen.service.Service):
         self._key_by_context = {}
         #: Mapping of Context -> parent Context
         self._via_by_context = {}
+        #: List of broker shard contexts, see :attr:`broker_shards`.
+        self._shards = []
+        #: Mapping of shard Context -> number of connections made via it or
+        #: via contexts connected via it, including those in progress.
+        self._load_by_shard = {}
+        #: Mapping of Context -> shard Context owning the stream it is reached
+        #: by.
+        self._shard_by_context = {}
 
     @mitogen.service.expose(mitogen.service.AllowParents())
     @mitogen.service.arg_spec({
@@ -230,6 +257,10 @@ class ContextService(mitogen.service.Service):
         return count
 
     def _forget_context_unlocked(self, context):
+        shard = self._shard_by_context.pop(context, None)
+        if shard in self._load_by_shard:
+            self._load_by_shard[shard] -= 1
+
         key = self._key_by_context.get(context)
         if key is None:
             LOG.debug('%r: attempt to forget unknown %r', self, context)
@@ -300,6 +331,8 @@ class ContextService(mitogen.service.Service):
                 'context_name': context.name,
                 'via': getattr(self._via_by_context.get(context),
                                'name', None),
+                'shard': getattr(self._shard_by_context.get(context),
+                                 'name', None),
                 'refs': self._refs_by_context.get(context),
             }
             for context, key in sorted(self._key_by_context.items(),
@@ -318,6 +351,81 @@ class ContextService(mitogen.service.Service):
         finally:
             self._lock.release()
 
+    def _on_shard_disconnect(self, shard):
+        """
+        Respond to a broker shard exitting by forgetting it, so a replacement
+        is forked for the next connection. Contexts connected via the shard
+        receive their own disconnect events.
+        """
+        self._lock.acquire()
+        try:
+            LOG.warning('%r: broker shard %r disconnected', self, shard)
+            if shard in self._shards:
+                self._shards.remove(shard)
+            self._load_by_shard.pop(shard, None)
+        finally:
+            self._lock.release()
+
+    def _start_shards(self):
+        """
+        Fork any missing broker shards. Forking is a round-trip to the new
+        child, so it happens outside :attr:`_lock`, and only the result is
+        published under it. At most :attr:`broker_shards` are forked, even if
+        some exit meanwhile.
+        """
+        self._shard_fork_lock.acquire()
+        try:
+            for _ in range(self.broker_shards):
+                self._lock.acquire()
+                try:
+                    index = len(self._shards)
+                finally:
+                    self._lock.release()
+                if index >= self.broker_shards:
+                    return
+
+                shard = self.router.fork(name='shard.%d' % (index,))
+                mitogen.core.listen(shard, 'disconnect',
+                    lambda shard=shard: self._on_shard_disconnect(shard))
+                self._lock.acquire()
+                try:
+                    self._shards.append(shard)
+                    self._load_by_shard[shard] = 0
+                finally:
+                    self._lock.release()
+                LOG.debug('%r: started broker shard %r', self, shard)
+        finally:
+            self._shard_fork_lock.release()
+
+    def _get_shard(self):
+        """
+        Return the broker shard with the fewest connections, forking any
+        missing shards, and count a new connection against it.
+
+        :raises Error:
+            Every shard exitted :attr:`max_shard_attempts` times in a row.
+        """
+        for _ in range(self.max_shard_attempts):
+            self._start_shards()
+            self._lock.acquire()
+            try:
+                # Empty if every shard exitted since they were started.
+                if self._shards:
+                    shard = min(self._shards, key=self._load_by_shard.get)
+                    self._load_by_shard[shard] += 1
+                    return shard
+            finally:
+                self._lock.release()
+        raise Error(self.shards_exitted_msg % (self.max_shard_attempts,))
+
+    def _put_shard(self, shard):
+        self._lock.acquire()
+        try:
+            if shard in self._load_by_shard:
+                self._load_by_shard[shard] -= 1
+        finally:
+            self._lock.release()
+
     def _on_context_disconnect(self, context):
         """
         Respond to Context disconnect event by deleting any record of the no
@@ -378,6 +486,7 @@ class ContextService(mitogen.service.Service):
                 {
                     'context': mitogen.core.Context or None,
                     'via': mitogen.core.Context or None,
+                    'shard': mitogen.core.Context or None,
                     'init_child_result': {
                         'fork_context': mitogen.core.Context,
                         'home_dir': str or None,
@@ -386,6 +495,7 @@ class ContextService(mitogen.service.Service):
                 }
 
             Where `context` is a reference to the newly constructed context,
+            `shard` is the broker shard owning its stream, if any,
             `init_child_result` is the result of executing
             :func:`ansible_mitogen.target.init_child` in that context, `msg` is
             an error message and the remaining fields are :data:`None`, or
@@ -396,7 +506,33 @@ class ContextService(mitogen.service.Service):
         except AttributeError:
             raise Error('unsupported method: %(method)s' % spec)
 
-        context = method(via=via, unidirectional=True, **spec['kwargs'])
+        shard = None
+        if via is None and self.broker_shards > 0:
+            shard = self._get_shard()
+        elif via is not None:
+            # Children of a connection stay on its shard.
+            self._lock.acquire()
+            try:
+                shard = self._shard_by_context.get(via)
+                if shard in self._load_by_shard:
+                    self._load_by_shard[shard] += 1
+            finally:
+                self._lock.release()
+
+        try:
+            context = method(via=via or shard, unidirectional=True,
+                             **spec['kwargs'])
+        except Exception:
+            if shard is not None:
+                self._put_shard(shard)
+            raise
+
+        if shard is not None:
+            self._lock.acquire()
+            try:
+                self._shard_by_context[context] = shard
+            finally:
+                self._lock.release()
         if via and spec.get('enable_lru'):
             self._update_lru(context, spec, via)
 
@@ -409,6 +545,7 @@ class ContextService(mitogen.service.Service):
             ansible_mitogen.target.init_child,
             log_level=LOG.getEffectiveLevel(),
             candidate_temp_dirs=self._get_candidate_temp_dirs(),
+            code_cache=bool(os.environ.get('MITOGEN_CODE_CACHE')),
         )
 
         if os.environ.get('MITOGEN_DUMP_THREAD_STACKS'):
@@ -420,6 +557,7 @@ class ContextService(mitogen.service.Service):
         return {
             'context': context,
             'via': via,
+            'shard': shard,
             'init_child_result': init_child_result,
             'msg': None,
         }
@@ -477,6 +615,8 @@ class ContextService(mitogen.service.Service):
 
         :returns dict:
             * context: mitogen.parent.Context or None.
+            * shard: Broker shard owning the context's stream, or None. Its
+              FileService should serve transfers to the context.
             * init_child_result: Result of :func:`init_child`.
             * msg: StreamError exception text or None.
             * method_name: string failing method name.
@@ -510,12 +650,22 @@ class ModuleDepService(mitogen.service.Service):
     """
     Scan a new-style module and produce a cached mapping of module_utils names
     to their resolved filesystem paths.
+
+    Additionally keep a profile for each Ansible module of the Python modules
+    its runs were observed importing from the master, so they can be pushed to
+    the target alongside the next invocation rather than fetched one
+    ``GET_MODULE`` round-trip at a time.
     """
     invoker_class = mitogen.service.SerializedInvoker
 
     def __init__(self, *args, **kwargs):
         super(ModuleDepService, self).__init__(*args, **kwargs)
         self._cache = {}
+        #: Ansible module name -> set of imported Python module names.
+        self._profiles = {}
+        #: Ansible module name -> [hits, misses], where a hit is a reported
+        #: import that was already part of the module's profile.
+        self._profile_stats = {}
 
     def _get_builtin_names(self, builtin_path, resolved):
         return [
@@ -556,4 +706,49 @@ class ModuleDepService(mitogen.service.Service):
                 'builtin': builtin,
                 'custom': custom,
             }
-        return self._cache[key]
+        return dict(
+            self._cache[key],
+            profile=sorted(self._profiles.get(module_name, ())),
+        )
+
+    @mitogen.service.expose(policy=mitogen.service.AllowParents())
+    @mitogen.service.arg_spec({
+        'module_name': mitogen.core.UnicodeType,
+        'names': list,
+    })
+    def record_imports(self, module_name, names):
+        """
+        Merge `names`, the Python modules a run of `module_name` imported from
+        the master, into the module's profile.
+        """
+        profile = self._profiles.setdefault(module_name, set())
+        stats = self._profile_stats.setdefault(module_name, [0, 0])
+        misses = set(names).difference(profile)
+        stats[0] += len(names) - len(misses)
+        stats[1] += len(misses)
+        profile.update(misses)
+        LOG.debug('%r: %s profile hit %d/%d, %d new: %r',
+                  self, module_name, len(names) - len(misses), len(names),
+                  len(misses), sorted(misses))
+
+    @mitogen.service.expose(policy=mitogen.service.AllowParents())
+    def get_profile_stats(self):
+        """
+        Return a dict with overall and per-module hit counts and hit rates of
+        the speculatively pushed module profiles.
+        """
+        hits = sum(h for h, m in self._profile_stats.values())
+        misses = sum(m for h, m in self._profile_stats.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': float(hits) / max(1, hits + misses),
+            'modules': dict(
+                (module_name, {
+                    'hits': h,
+                    'misses': m,
+                    'hit_rate': float(h) / max(1, h + m),
+                })
+                for module_name, (h, m) in self._profile_stats.items()
+            ),
+        }
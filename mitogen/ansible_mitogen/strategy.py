@@ -29,6 +29,7 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import logging
 import os
 import signal
 import threading
@@ -50,6 +51,8 @@ import ansible.utils.sentinel
 import ansible.playbook.play_context
 import ansible.plugins.loader
 
+LOG = logging.getLogger(__name__)
+
 
 def _patch_awx_callback():
     """
@@ -330,12 +333,30 @@ class StrategyMixin(object):
         """
         return ansible_mitogen.process.get_classic_worker_model()
 
+    def _get_play_actions(self, iterator):
+        """
+        Return the sorted action names of the tasks statically known to the
+        play being iterated, for multiplexers to build the module_utils of.
+        """
+        actions = set()
+        for block in getattr(iterator, '_blocks', ()):
+            try:
+                tasks = block.get_tasks()
+            except Exception:
+                LOG.debug('cannot list tasks of %r', block, exc_info=True)
+                continue
+            actions.update(task.action for task in tasks if task.action)
+        return sorted(actions)
+
     def run(self, iterator, play_context, result=0):
         """
         Wrap :meth:`run` to ensure requisite infrastructure and modifications
         are configured for the duration of the call.
         """
         wrappers = AnsibleWrappers()
+        ansible_mitogen.process.set_warm_actions(
+            self._get_play_actions(iterator)
+        )
         self._worker_model = self._get_worker_model()
         ansible_mitogen.process.set_worker_model(self._worker_model)
         try:
@@ -45,13 +45,16 @@ import os
 import pty
 import pwd
 import re
+import shutil
 import signal
 import stat
 import subprocess
 import sys
 import tempfile
+import time
 import traceback
 import types
+import zlib
 
 import mitogen.core
 import mitogen.parent
@@ -100,6 +103,14 @@ _fork_parent = None
 #: temporary directory accessible by the active user account.
 good_temp_dir = None
 
+#: Suffix of files kept by :func:`transfer_file` after an interrupted
+#: transfer, allowing it to be resumed.
+PARTIAL_SUFFIX = '.partial'
+
+#: Files kept by :func:`transfer_file` that were last written more than this
+#: many seconds ago are deleted by later transfers.
+PARTIAL_MAX_AGE = 24 * 60 * 60
+
 
 def subprocess__Popen__close_fds(self, but):
     """
@@ -157,11 +168,139 @@ def get_small_file(context, path):
     return service.get(path)
 
 
+class Crc32Writer(object):
+    """
+    Wrap a file object, maintaining the CRC-32 of everything written to it, so
+    a transfer can be verified without reading it back.
+    """
+    def __init__(self, fp, crc=0):
+        self.fp = fp
+        self.crc = crc
+
+    def write(self, s):
+        self.crc = zlib.crc32(s, self.crc)
+        self.fp.write(s)
+
+    def seek(self, offset):
+        # FileService.get() only rewinds, discarding a stale partial file.
+        assert offset == 0
+        self.fp.seek(0)
+        self.crc = 0
+
+    def truncate(self):
+        self.fp.truncate()
+
+
+def _get_partial_dir():
+    """
+    Return the private directory holding files kept after interrupted
+    transfers, creating it if necessary and deleting any files within that
+    were last written more than :data:`PARTIAL_MAX_AGE` seconds ago. Return
+    :data:`None` if the directory is unusable, so transfers cannot resume.
+    """
+    path = os.path.join(good_temp_dir or tempfile.gettempdir(),
+                        'mitogen_partial')
+    try:
+        os.mkdir(path, int('0700', 8))
+    except OSError:
+        e = sys.exc_info()[1]
+        if e.args[0] != errno.EEXIST:
+            LOG.debug('partial transfer dir %r unusable: %s', path, e)
+            return None
+
+    st = os.lstat(path)
+    if not (stat.S_ISDIR(st.st_mode) and st.st_uid == os.geteuid() and
+            not (st.st_mode & int('077', 8))):
+        LOG.warning('partial transfer dir %r is not a private directory, '
+                    'interrupted transfers will not be resumed', path)
+        return None
+
+    now = time.time()
+    for name in os.listdir(path):
+        partial_path = os.path.join(path, name)
+        try:
+            if now - os.lstat(partial_path).st_mtime > PARTIAL_MAX_AGE:
+                LOG.debug('deleting expired partial transfer %r',
+                          partial_path)
+                os.unlink(partial_path)
+        except OSError:
+            # Claimed or deleted by a concurrent transfer.
+            pass
+    return path
+
+
+def _get_partial_prefix(partial_dir, in_path, out_path):
+    """
+    Return the path prefix of files kept in `partial_dir` after interrupted
+    transfers of `in_path` to `out_path`. The prefix is followed by the size
+    and modification time the source file had when the transfer began.
+    """
+    key = repr((in_path, out_path)).encode('utf-8')
+    return os.path.join(
+        partial_dir,
+        'transfer-%08x-' % (zlib.crc32(key) & 0xffffffff,)
+    )
+
+
+def _claim_partial(partial_prefix, tmp_path):
+    """
+    Rename a file kept after an interrupted transfer over `tmp_path`,
+    deleting any others, and return the `(size, mtime)` of the source file it
+    was received from, or :data:`None` if no usable file was found.
+    """
+    dirname, prefix = os.path.split(partial_prefix)
+    if_range = None
+    for name in sorted(os.listdir(dirname)):
+        if not (name.startswith(prefix) and name.endswith(PARTIAL_SUFFIX)):
+            continue
+
+        path = os.path.join(dirname, name)
+        if if_range is None:
+            try:
+                size, mtime = name[len(prefix):-len(PARTIAL_SUFFIX)].split(
+                    '-'
+                )[:2]
+                if_range = (int(size), float(mtime))
+                os.rename(path, tmp_path)
+                LOG.debug('resuming transfer from %r', path)
+                continue
+            except (ValueError, OSError):
+                # Malformed, or claimed by a concurrent transfer.
+                if_range = None
+
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    return if_range
+
+
+def _get_file_crc32(fp):
+    """
+    Return the CRC-32 of a file's content, leaving it positioned at the end.
+    """
+    crc = 0
+    while True:
+        s = fp.read(mitogen.core.CHUNK_SIZE)
+        if not s:
+            return crc
+        crc = zlib.crc32(s, crc)
+
+
 def transfer_file(context, in_path, out_path, sync=False, set_owner=False):
     """
     Streamily download a file from the connection multiplexer process in the
     controller.
 
+    The file is received into the private directory returned by
+    :func:`_get_partial_dir`. Once the source file's size and modification
+    time are known it is renamed to a name recording them, so if the transfer
+    is interrupted, even by the process being killed, a later call for the
+    same paths resumes from its end, unless the input file changed. The result
+    is verified against the CRC-32 reported by
+    :meth:`mitogen.service.FileService.checksum` before it is moved to
+    `out_path`, copying it if `out_path` is on another filesystem.
+
     :param mitogen.core.Context context:
         Reference to the context hosting the FileService that will transmit the
         file.
@@ -179,39 +318,131 @@ def transfer_file(context, in_path, out_path, sync=False, set_owner=False):
         system and file the file owner using :func:`os.fchmod`.
     """
     out_path = os.path.abspath(out_path)
-    fd, tmp_path = tempfile.mkstemp(suffix='.tmp',
-                                    prefix='.ansible_mitogen_transfer-',
-                                    dir=os.path.dirname(out_path))
-    fp = os.fdopen(fd, 'wb', mitogen.core.CHUNK_SIZE)
+    out_dir = os.path.dirname(out_path)
+    partial_dir = _get_partial_dir()
+    if partial_dir is None:
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp',
+                                        prefix='.ansible_mitogen_transfer-',
+                                        dir=out_dir)
+        os.close(fd)
+        if_range = None
+    else:
+        partial_prefix = _get_partial_prefix(partial_dir, in_path, out_path)
+        fd, tmp_path = tempfile.mkstemp(
+            suffix='.tmp',
+            prefix=os.path.basename(partial_prefix),
+            dir=partial_dir,
+        )
+        os.close(fd)
+        if_range = _claim_partial(partial_prefix, tmp_path)
+    fp = open(tmp_path, 'r+b', mitogen.core.CHUNK_SIZE)
     LOG.debug('transfer_file(%r) temporary file: %s', out_path, tmp_path)
 
+    # Computed by the service while the file is streamed.
+    checksum_recv = context.call_service_async(
+        service_name=mitogen.service.FileService.name(),
+        method_name='checksum',
+        path=in_path,
+    )
+
+    # Current name of the file being received, and whether it should be kept
+    # for a later call to resume from should the transfer fail.
+    state = {'path': tmp_path, 'keep': False}
+
+    def on_metadata(metadata):
+        if partial_dir is None:
+            return
+        # Keep mkstemp()'s random part so concurrent transfers of the same
+        # paths cannot rename over each other.
+        token = os.path.basename(tmp_path)[
+            len(os.path.basename(partial_prefix)):-len('.tmp')
+        ]
+        partial_path = '%s%d-%r-%s%s' % (
+            partial_prefix, metadata['size'], metadata['mtime'], token,
+            PARTIAL_SUFFIX,
+        )
+        os.rename(state['path'], partial_path)
+        state['path'] = partial_path
+        state['keep'] = True
+
     try:
         try:
+            crc = 0
+            if if_range:
+                crc = _get_file_crc32(fp)
+            writer = Crc32Writer(fp, crc)
             ok, metadata = mitogen.service.FileService.get(
                 context=context,
                 path=in_path,
-                out_fp=fp,
+                out_fp=writer,
+                offset=fp.tell(),
+                if_range=if_range,
+                on_metadata=on_metadata,
             )
             if not ok:
                 raise IOError('transfer of %r was interrupted.' % (in_path,))
 
-            set_file_mode(tmp_path, metadata['mode'], fd=fp.fileno())
+            checksum = checksum_recv.get().unpickle()
+            if (checksum['size'], checksum['mtime'], checksum['crc32']) != (
+                metadata['size'], metadata['mtime'],
+                writer.crc & 0xffffffff,
+            ):
+                state['keep'] = False
+                raise IOError('transfer of %r failed verification: expected '
+                              'CRC-32 %08x, received %08x.' % (
+                                  in_path, checksum['crc32'],
+                                  writer.crc & 0xffffffff))
+
+            state['keep'] = False
+            if os.stat(out_dir).st_dev != os.fstat(fp.fileno()).st_dev:
+                fp = _copy_to_dir(fp, state, out_dir)
+
+            set_file_mode(state['path'], metadata['mode'], fd=fp.fileno())
             if set_owner:
-                set_file_owner(tmp_path, metadata['owner'], metadata['group'],
-                               fd=fp.fileno())
+                set_file_owner(state['path'], metadata['owner'],
+                               metadata['group'], fd=fp.fileno())
+            if sync:
+                fp.flush()
+                os.fsync(fp.fileno())
         finally:
             fp.close()
 
-        if sync:
-            os.fsync(fp.fileno())
-        os.rename(tmp_path, out_path)
+        os.rename(state['path'], out_path)
     except BaseException:
-        os.unlink(tmp_path)
+        if state['keep'] and os.path.getsize(state['path']):
+            LOG.debug('keeping %r to resume transfer', state['path'])
+        else:
+            os.unlink(state['path'])
         raise
 
     os.utime(out_path, (metadata['atime'], metadata['mtime']))
 
 
+def _copy_to_dir(fp, state, out_dir):
+    """
+    Copy a received file to a temporary file in `out_dir`, so it can be
+    renamed over a path on another filesystem. Delete the original, update
+    `state` with the new name, and return the new file object, which is
+    closed on failure.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp',
+                                    prefix='.ansible_mitogen_transfer-',
+                                    dir=out_dir)
+    out_fp = os.fdopen(fd, 'r+b', mitogen.core.CHUNK_SIZE)
+    try:
+        fp.seek(0)
+        shutil.copyfileobj(fp, out_fp, mitogen.core.CHUNK_SIZE)
+    except BaseException:
+        out_fp.close()
+        os.unlink(tmp_path)
+        raise
+
+    fp.close()
+    os.unlink(state['path'])
+    state['path'] = tmp_path
+    return out_fp
+
+
 def prune_tree(path):
     """
     Like shutil.rmtree(), but log errors rather than discard them, and do not
@@ -319,7 +550,17 @@ def find_good_temp_dir(candidate_temp_dirs):
 
 
 @mitogen.core.takes_econtext
-def init_child(econtext, log_level, candidate_temp_dirs):
+def enable_code_cache(path, econtext):
+    """
+    Keep code objects of modules received from the master in `path`. Called
+    by :func:`init_child` in the fork parent, so that forked children inherit
+    the setting.
+    """
+    econtext.importer.set_code_cache_dir(path)
+
+
+@mitogen.core.takes_econtext
+def init_child(econtext, log_level, candidate_temp_dirs, code_cache=False):
     """
     Called by ContextService immediately after connection; arranges for the
     (presently) spotless Python interpreter to be forked, where the newly
@@ -335,6 +576,10 @@ def init_child(econtext, log_level, candidate_temp_dirs):
     :param list[str] candidate_temp_dirs:
         List of $variable-expanded and tilde-expanded directory names to add to
         candidate list of temporary directories.
+    :param bool code_cache:
+        If :data:`True`, keep compiled modules received from the master in a
+        ``mitogen_code_cache`` directory beneath the good temporary directory,
+        where later interpreters on the target can reuse them.
 
     :returns:
         Dict like::
@@ -363,6 +608,12 @@ def init_child(econtext, log_level, candidate_temp_dirs):
     global good_temp_dir
     good_temp_dir = find_good_temp_dir(candidate_temp_dirs)
 
+    if code_cache:
+        path = os.path.join(good_temp_dir, 'mitogen_code_cache')
+        enable_code_cache(path, econtext=econtext)
+        if _fork_parent is not None:
+            _fork_parent.call(enable_code_cache, path)
+
     return {
         u'fork_context': _fork_parent,
         u'home_dir': mitogen.core.to_text(os.path.expanduser('~')),
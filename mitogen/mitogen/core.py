@@ -71,6 +71,7 @@ import fcntl
 import itertools
 import linecache
 import logging
+import marshal
 import os
 import pickle as py_pickle
 import pstats
@@ -141,6 +142,7 @@ FORWARD_MODULE = 108
 DETACHING = 109
 CALL_SERVICE = 110
 STUB_CALL_SERVICE = 111
+LOAD_MODULE_BUNDLE = 112
 
 #: Special value used to signal disconnection or the inability to route a
 #: message, when it appears in the `reply_to` field. Usually causes
@@ -166,6 +168,7 @@ if PY3:
     UnicodeType = str
     FsPathTypes = (str,)
     BufferType = lambda buf, start: memoryview(buf)[start:]
+    BytesLikeTypes = (bytes, memoryview)
     integer_types = (int,)
     iteritems, iterkeys, itervalues = dict.items, dict.keys, dict.values
 else:
@@ -176,6 +179,7 @@ else:
     BytesType = str
     FsPathTypes = (str, unicode)
     BufferType = buffer
+    BytesLikeTypes = (str,)
     UnicodeType = unicode
     integer_types = (int, long)
     iteritems, iterkeys, itervalues = dict.iteritems, dict.iterkeys, dict.itervalues
@@ -224,9 +228,154 @@ except IOError:
 #: writing small trailer chunks.
 CHUNK_SIZE = 131072
 
+#: Maximum number of buffers passed to a single :func:`os.writev` call.
+try:
+    IOV_MAX = min(1024, os.sysconf('SC_IOV_MAX'))
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16
+
+#: Preset :mod:`zlib` dictionary of text common to Python modules, Ansible
+#: modules and ``module_utils``, used to compress sources sent in
+#: :data:`LOAD_MODULE` and :data:`LOAD_MODULE_BUNDLE` messages to contexts
+#: that advertise :data:`ZDICT_VERSION` in their :data:`GET_MODULE` requests.
+#: Text most likely to match is placed last, where it is cheapest to refer to.
+ZDICT = b(
+    '# -*- coding: utf-8 -*-\n'
+    '# Copyright: Ansible Project\n'
+    '# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)\n'
+    '# Redistribution and use in source and binary forms, with or without\n'
+    '# modification, are permitted provided that the following conditions are met:\n'
+    '# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"\n'
+    'from __future__ import absolute_import, division, print_function\n'
+    '__metaclass__ = type\n'
+    '\n'
+    'DOCUMENTATION = r\'\'\'\n'
+    '---\n'
+    'module: \n'
+    'short_description: \n'
+    'description:\n'
+    'options:\n'
+    '    type: str\n'
+    '    type: bool\n'
+    '    type: list\n'
+    '    type: dict\n'
+    '    type: int\n'
+    '    default: no\n'
+    '    required: true\n'
+    '    choices: [ absent, present ]\n'
+    'author:\n'
+    '\'\'\'\n'
+    '\n'
+    'EXAMPLES = r\'\'\'\n'
+    '- name: \n'
+    '\'\'\'\n'
+    '\n'
+    'RETURN = r\'\'\'\n'
+    '    returned: always\n'
+    '    sample: \n'
+    '\'\'\'\n'
+    '\n'
+    'import json\n'
+    'import os\n'
+    'import re\n'
+    'import sys\n'
+    'import time\n'
+    'import errno\n'
+    'import logging\n'
+    'import traceback\n'
+    '\n'
+    'from ansible.module_utils.basic import AnsibleModule\n'
+    'from ansible.module_utils.common.text.converters import to_bytes, to_native, to_text\n'
+    'from ansible.module_utils.six import PY2, PY3, string_types, binary_type, text_type\n'
+    'from ansible.module_utils._text import to_bytes, to_native, to_text\n'
+    'from ansible.module_utils.common.\n'
+    'from ansible.module_utils.\n'
+    'import mitogen.core\n'
+    'import mitogen.parent\n'
+    'import ansible_mitogen.\n'
+    '\n'
+    'try:\n'
+    '    import \n'
+    'except ImportError:\n'
+    '    HAS_\n'
+    'except (IOError, OSError):\n'
+    '    e = sys.exc_info()[1]\n'
+    '    if e.args[0] == errno.\n'
+    'finally:\n'
+    '    raise\n'
+    '    pass\n'
+    '\n'
+    '\n'
+    'class (object):\n'
+    '    """\n'
+    '    :param \n'
+    '    :returns:\n'
+    '    """\n'
+    '    def __init__(self, \n'
+    '    def __repr__(self):\n'
+    '        return \'%s(%r)\' % (self.__class__.__name__, \n'
+    '        self.\n'
+    '        if self.\n'
+    '        if not \n'
+    '        if isinstance(\n'
+    '        for name in \n'
+    '        elif \n'
+    '        else:\n'
+    '        return None\n'
+    '        return True\n'
+    '        return False\n'
+    '        return self.\n'
+    '\n'
+    '    module = AnsibleModule(\n'
+    '        argument_spec=dict(\n'
+    '            name=dict(type=\'str\', required=True),\n'
+    '            state=dict(type=\'str\', default=\'present\', choices=[\'absent\', \'present\']),\n'
+    '        ),\n'
+    '        supports_check_mode=True,\n'
+    '    )\n'
+    '    module.fail_json(msg=\n'
+    '    module.exit_json(changed=\n'
+    '    module.params[\'\n'
+    '    module.run_command(\n'
+    '    rc, out, err = \n'
+    '        result[\'changed\'] = True\n'
+    '\n'
+    '\n'
+    'def main():\n'
+    '\n'
+    '\n'
+    'if __name__ == \'__main__\':\n'
+    '    main()\n'
+)
+
+#: Incremented whenever :data:`ZDICT` changes.
+ZDICT_VERSION = 1
+
+#: :data:`True` if this interpreter supports :mod:`zlib` preset dictionaries.
+ZDICT_SUPPORTED = sys.version_info >= (3, 3)
+
 _tls = threading.local()
 
 
+def is_zdict_compressed(data):
+    """
+    Return :data:`True` if the :mod:`zlib` stream `data` was compressed using
+    a preset dictionary, by checking the FDICT flag of its header.
+    """
+    return bool(ord(data[1:2]) & 0x20)
+
+
+def zlib_decompress(data):
+    """
+    Decompress the :mod:`zlib` stream `data`, which may have been compressed
+    using :data:`ZDICT`.
+    """
+    if is_zdict_compressed(data):
+        obj = zlib.decompressobj(zdict=ZDICT)
+        return obj.decompress(data) + obj.flush()
+    return zlib.decompress(data)
+
+
 if __name__ == 'mitogen.core':
     # When loaded using import mechanism, ExternalContext.main() will not have
     # a chance to set the synthetic mitogen global, so just import it here.
@@ -805,70 +954,313 @@ else:
     _Unpickler = pickle.Unpickler
 
 
-class Message(object):
+class _Struct(object):
     """
-    Messages are the fundamental unit of communication, comprising fields from
-    the :ref:`stream-protocol` header, an optional reference to the receiving
-    :class:`mitogen.core.Router` for ingress messages, and helper methods for
-    deserialization and generating replies.
+    Minimal :class:`struct.Struct` for Python 2.4.
+    """
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.size = struct.calcsize(fmt)
+
+    def pack(self, *args):
+        return struct.pack(self.fmt, *args)
+
+    def unpack_from(self, data, pos=0):
+        return struct.unpack(self.fmt, data[pos:pos+self.size])
+
+_Struct = getattr(struct, 'Struct', _Struct)
+_tlv_pack_len = _Struct('>L').pack
+_tlv_unpack_len = _Struct('>L').unpack_from
+_tlv_pack_int = _Struct('>q').pack
+_tlv_unpack_int = _Struct('>q').unpack_from
+_tlv_pack_float = _Struct('>d').pack
+_tlv_unpack_float = _Struct('>d').unpack_from
+
+(_TLV_NONE, _TLV_TRUE, _TLV_FALSE, _TLV_INT, _TLV_LONG, _TLV_FLOAT,
+ _TLV_BYTES, _TLV_BLOB, _TLV_TEXT, _TLV_SECRET, _TLV_LIST, _TLV_TUPLE,
+ _TLV_DICT, _TLV_KWARGS, _TLV_CONTEXT, _TLV_SENDER,
+ _TLV_CALL_ERROR) = [b(c) for c in 'NTFiIdbBuSltDKCsE']
+
+
+def _tlv_encode(obj, out):
+    t = type(obj)
+    if t is UnicodeType:
+        s = obj.encode('utf-8')
+        out.append(_TLV_TEXT + _tlv_pack_len(len(s)))
+        out.append(s)
+    elif t is BytesType:
+        out.append(_TLV_BYTES + _tlv_pack_len(len(obj)))
+        out.append(obj)
+    elif obj is None:
+        out.append(_TLV_NONE)
+    elif t is tuple or t is list:
+        if len(out) + len(obj) > TlvCodec.max_parts:
+            raise TypeError('too many values for TlvCodec')
+        out.append((t is tuple and _TLV_TUPLE or _TLV_LIST) +
+                   _tlv_pack_len(len(obj)))
+        for x in obj:
+            _tlv_encode(x, out)
+    elif t is dict or t is Kwargs:
+        if len(out) + 2 * len(obj) > TlvCodec.max_parts:
+            raise TypeError('too many values for TlvCodec')
+        out.append((t is dict and _TLV_DICT or _TLV_KWARGS) +
+                   _tlv_pack_len(len(obj)))
+        for k, v in obj.items():
+            _tlv_encode(k, out)
+            _tlv_encode(v, out)
+    elif t is bool:
+        out.append(obj and _TLV_TRUE or _TLV_FALSE)
+    elif t in integer_types:
+        if -0x8000000000000000 <= obj <= 0x7fffffffffffffff:
+            out.append(_TLV_INT + _tlv_pack_int(obj))
+        else:
+            s = b(str(obj))
+            out.append(_TLV_LONG + _tlv_pack_len(len(s)) + s)
+    elif t is float:
+        out.append(_TLV_FLOAT + _tlv_pack_float(obj))
+    elif t is Secret:
+        s = obj.encode('utf-8')
+        out.append(_TLV_SECRET + _tlv_pack_len(len(s)))
+        out.append(s)
+    elif t is Blob:
+        out.append(_TLV_BLOB + _tlv_pack_len(len(obj)))
+        out.append(BytesType(obj))
+    elif isinstance(obj, Context):
+        out.append(_TLV_CONTEXT)
+        _tlv_encode((obj.context_id, obj.name), out)
+    elif isinstance(obj, Sender):
+        out.append(_TLV_SENDER)
+        _tlv_encode((obj.context.context_id, obj.dst_handle), out)
+    elif isinstance(obj, CallError):
+        out.append(_TLV_CALL_ERROR)
+        _tlv_encode(obj.args[0], out)
+    else:
+        raise TypeError('TlvCodec cannot serialize %r' % (t,))
+
+
+def _tlv_decode(data, pos, msg, depth=0):
+    if depth > TlvCodec.max_parts:
+        raise ValueError('TlvCodec data nested too deeply')
+    tag = data[pos:pos+1]
+    if tag == _TLV_TEXT:
+        n, = _tlv_unpack_len(data, pos + 1)
+        pos += 5 + n
+        return data[pos-n:pos].decode('utf-8'), pos
+    elif tag == _TLV_BYTES:
+        n, = _tlv_unpack_len(data, pos + 1)
+        pos += 5 + n
+        return data[pos-n:pos], pos
+    elif tag == _TLV_NONE:
+        return None, pos + 1
+    elif tag == _TLV_TUPLE or tag == _TLV_LIST:
+        n, = _tlv_unpack_len(data, pos + 1)
+        if n > TlvCodec.max_parts:
+            raise ValueError('too many values for TlvCodec')
+        pos += 5
+        lst = []
+        for _ in range(n):
+            obj, pos = _tlv_decode(data, pos, msg, depth + 1)
+            lst.append(obj)
+        return (tag == _TLV_TUPLE and tuple(lst) or lst), pos
+    elif tag == _TLV_DICT or tag == _TLV_KWARGS:
+        n, = _tlv_unpack_len(data, pos + 1)
+        if 2 * n > TlvCodec.max_parts:
+            raise ValueError('too many values for TlvCodec')
+        pos += 5
+        dct = {}
+        for _ in range(n):
+            k, pos = _tlv_decode(data, pos, msg, depth + 1)
+            dct[k], pos = _tlv_decode(data, pos, msg, depth + 1)
+        return (tag == _TLV_KWARGS and Kwargs(dct) or dct), pos
+    elif tag == _TLV_INT:
+        return _tlv_unpack_int(data, pos + 1)[0], pos + 9
+    elif tag == _TLV_TRUE:
+        return True, pos + 1
+    elif tag == _TLV_FALSE:
+        return False, pos + 1
+    elif tag == _TLV_FLOAT:
+        return _tlv_unpack_float(data, pos + 1)[0], pos + 9
+    elif tag == _TLV_LONG or tag == _TLV_SECRET or tag == _TLV_BLOB:
+        n, = _tlv_unpack_len(data, pos + 1)
+        pos += 5 + n
+        s = data[pos-n:pos]
+        if tag == _TLV_LONG:
+            return int(s), pos
+        elif tag == _TLV_SECRET:
+            return Secret(s.decode('utf-8')), pos
+        return Blob(s), pos
+    elif tag == _TLV_CONTEXT:
+        args, pos = _tlv_decode(data, pos + 1, msg, depth + 1)
+        return msg._unpickle_context(*args), pos
+    elif tag == _TLV_SENDER:
+        args, pos = _tlv_decode(data, pos + 1, msg, depth + 1)
+        return msg._unpickle_sender(*args), pos
+    elif tag == _TLV_CALL_ERROR:
+        s, pos = _tlv_decode(data, pos + 1, msg, depth + 1)
+        return _unpickle_call_error(s), pos
+    raise ValueError('bad TlvCodec tag %r' % (tag,))
+
+
+class TlvCodec(object):
+    """
+    Compact tag-length-value serialization for exactly the types
+    :meth:`Message.unpickle` accepts from pickle: :data:`None`, booleans,
+    integers, floats, bytes, Unicode, lists, tuples, dicts, :class:`Blob`,
+    :class:`Secret`, :class:`Kwargs`, :class:`Context`, :class:`Sender` and
+    :class:`CallError`. Unlike pickle, it calls no :meth:`__reduce__` or
+    :meth:`Message._find_global` methods, making it cheaper for the small
+    tuples that make up most calls and replies.
+
+    Encoded data begins with :attr:`MAGIC`, whereas a protocol 2 pickle
+    always begins with ``\x80``. Whether it is produced, and whether it is
+    accepted at all, is controlled by :attr:`Message.codec`: a context that
+    has not enabled the codec hands such data to the unpickler, which rejects
+    it.
     """
-    #: Integer target context ID. :class:`Router` delivers messages locally
-    #: when their :attr:`dst_id` matches :data:`mitogen.context_id`, otherwise
-    #: they are routed up or downstream.
-    dst_id = None
+    MAGIC = b('\x01')
 
-    #: Integer source context ID. Used as the target of replies if any are
-    #: generated.
-    src_id = None
+    #: Values containing more than this many parts raise :class:`TypeError`
+    #: and are pickled instead, as the C pickler is faster for bulk data. The
+    #: decoder rejects containers or nesting beyond this limit, bounding the
+    #: work and recursion a peer can cause.
+    max_parts = 32
 
-    #: Context ID under whose authority the message is acting. See
-    #: :ref:`source-verification`.
-    auth_id = None
+    @staticmethod
+    def accepts(obj):
+        """
+        Return :data:`False` if the containers in `obj` alone hold more than
+        :attr:`max_parts` values. Only container lengths are summed, so large
+        values such as the keyword arguments of
+        :func:`ansible_mitogen.target.run_module` are rejected after visiting
+        a few containers, without encoding anything.
+        """
+        budget = TlvCodec.max_parts
+        stack = [obj]
+        while stack:
+            obj = stack.pop()
+            t = type(obj)
+            if t is tuple or t is list:
+                budget -= len(obj)
+                items = obj
+            elif t is dict or t is Kwargs:
+                budget -= 2 * len(obj)
+                items = obj.values()
+            else:
+                continue
+            if budget < 0:
+                return False
+            stack.extend(items)
+        return True
 
-    #: Integer target handle in the destination context. This is one of the
-    #: :ref:`standard-handles`, or a dynamically generated handle used to
-    #: receive a one-time reply, such as the return value of a function call.
-    handle = None
+    @staticmethod
+    def dumps(obj):
+        """
+        Serialize `obj`.
 
-    #: Integer target handle to direct any reply to this message. Used to
-    #: receive a one-time reply, such as the return value of a function call.
-    #: :data:`IS_DEAD` has a special meaning when it appears in this field.
-    reply_to = None
+        :raises TypeError:
+            `obj` contains an unsupported type, or too many parts.
+        """
+        out = [TlvCodec.MAGIC]
+        _tlv_encode(obj, out)
+        return b('').join(out)
 
-    #: Raw message data bytes.
-    data = b('')
+    @staticmethod
+    def loads(msg):
+        """
+        Deserialize :attr:`Message.data` of `msg`, using its router to
+        reconstruct any :class:`Context` or :class:`Sender`.
+        """
+        data = BytesType(msg.data)
+        obj, pos = _tlv_decode(data, 1, msg)
+        if pos != len(data):
+            raise ValueError('trailing bytes after TlvCodec data')
+        return obj
 
-    _unpickled = object()
 
-    #: The :class:`Router` responsible for routing the message. This is
-    #: :data:`None` for locally originated messages.
-    router = None
+class Message(object):
+    """
+    Messages are the fundamental unit of communication, comprising fields from
+    the :ref:`stream-protocol` header, an optional reference to the receiving
+    :class:`mitogen.core.Router` for ingress messages, and helper methods for
+    deserialization and generating replies.
+    """
+    __slots__ = ('dst_id', 'src_id', 'auth_id', 'handle', 'reply_to', 'data',
+                 'router', 'receiver', '_unpickled')
 
-    #: The :class:`Receiver` over which the message was last received. Part of
-    #: the :class:`mitogen.select.Select` interface. Defaults to :data:`None`.
-    receiver = None
+    _no_unpickled = object()
+
+    #: If not :data:`None`, :meth:`pickled` first tries serializing using this
+    #: codec's :meth:`dumps` if its :meth:`accepts` returns :data:`True`,
+    #: falling back to pickle if it raises :class:`TypeError`. Set to
+    #: :class:`TlvCodec` to enable the compact codec. Children inherit the
+    #: setting of their parent.
+    codec = None
 
     HEADER_FMT = '>hLLLLLL'
     HEADER_LEN = struct.calcsize(HEADER_FMT)
     HEADER_MAGIC = 0x4d49  # 'MI'
 
-    def __init__(self, **kwargs):
+    def __init__(self, dst_id=None, src_id=None, auth_id=None, handle=None,
+                 reply_to=None, data=b(''), router=None, receiver=None):
         """
-        Construct a message from from the supplied `kwargs`. :attr:`src_id` and
-        :attr:`auth_id` are always set to :data:`mitogen.context_id`.
+        Construct a message from from the supplied fields. :attr:`src_id` and
+        :attr:`auth_id` default to :data:`mitogen.context_id`.
         """
-        self.src_id = mitogen.context_id
-        self.auth_id = mitogen.context_id
-        vars(self).update(kwargs)
-        assert isinstance(self.data, BytesType), 'Message data is not Bytes'
+        #: Integer target context ID. :class:`Router` delivers messages
+        #: locally when their :attr:`dst_id` matches :data:`mitogen.context_id`,
+        #: otherwise they are routed up or downstream.
+        self.dst_id = dst_id
+
+        if src_id is None:
+            src_id = mitogen.context_id
+        #: Integer source context ID. Used as the target of replies if any are
+        #: generated.
+        self.src_id = src_id
+
+        if auth_id is None:
+            auth_id = mitogen.context_id
+        #: Context ID under whose authority the message is acting. See
+        #: :ref:`source-verification`.
+        self.auth_id = auth_id
+
+        #: Integer target handle in the destination context. This is one of
+        #: the :ref:`standard-handles`, or a dynamically generated handle used
+        #: to receive a one-time reply, such as the return value of a function
+        #: call.
+        self.handle = handle
+
+        #: Integer target handle to direct any reply to this message. Used to
+        #: receive a one-time reply, such as the return value of a function
+        #: call. :data:`IS_DEAD` has a special meaning when it appears in this
+        #: field.
+        self.reply_to = reply_to
+
+        #: Raw message data bytes. On Python 3, large messages received from
+        #: a stream carry a read-only :class:`memoryview` into the stream's
+        #: receive buffer instead, avoiding a copy on the :class:`Broker`
+        #: thread. Use ``BytesType(msg.data)`` where a bytes object is
+        #: required.
+        self.data = data
+
+        #: The :class:`Router` responsible for routing the message. This is
+        #: :data:`None` for locally originated messages.
+        self.router = router
+
+        #: The :class:`Receiver` over which the message was last received.
+        #: Part of the :class:`mitogen.select.Select` interface. Defaults to
+        #: :data:`None`.
+        self.receiver = receiver
+
+        self._unpickled = self._no_unpickled
+        assert isinstance(self.data, BytesLikeTypes), 'Message data is not Bytes'
+
+    def pack_header(self):
+        return struct.pack(self.HEADER_FMT, self.HEADER_MAGIC, self.dst_id,
+                           self.src_id, self.auth_id, self.handle,
+                           self.reply_to or 0, len(self.data))
 
     def pack(self):
-        return (
-            struct.pack(self.HEADER_FMT, self.HEADER_MAGIC, self.dst_id,
-                        self.src_id, self.auth_id, self.handle,
-                        self.reply_to or 0, len(self.data))
-            + self.data
-        )
+        return self.pack_header() + self.data
 
     def _unpickle_context(self, context_id, name):
         return _unpickle_context(context_id, name, router=self.router)
@@ -932,6 +1324,12 @@ class Message(object):
             The new message.
         """
         self = cls(**kwargs)
+        if cls.codec is not None and cls.codec.accepts(obj):
+            try:
+                self.data = cls.codec.dumps(obj)
+                return self
+            except TypeError:
+                pass
         try:
             self.data = pickle__dumps(obj, protocol=2)
         except pickle.PicklingError:
@@ -956,7 +1354,8 @@ class Message(object):
             msg = Message.pickled(msg)
         msg.dst_id = self.src_id
         msg.handle = self.reply_to
-        vars(msg).update(kwargs)
+        for name, value in iteritems(kwargs):
+            setattr(msg, name, value)
         if msg.handle:
             (self.router or router).route(msg)
         else:
@@ -970,7 +1369,7 @@ class Message(object):
 
     def _throw_dead(self):
         if len(self.data):
-            raise ChannelError(self.data.decode('utf-8', 'replace'))
+            raise ChannelError(BytesType(self.data).decode('utf-8', 'replace'))
         elif self.src_id == mitogen.context_id:
             raise ChannelError(ChannelError.local_msg)
         else:
@@ -994,7 +1393,15 @@ class Message(object):
             self._throw_dead()
 
         obj = self._unpickled
-        if obj is Message._unpickled:
+        if (obj is self._no_unpickled and self.codec is TlvCodec and
+                self.data[:1] == TlvCodec.MAGIC):
+            try:
+                obj = self._unpickled = TlvCodec.loads(self)
+            except (TypeError, ValueError, IndexError, RuntimeError,
+                    struct.error):
+                e = sys.exc_info()[1]
+                raise StreamError('invalid message: %s', e)
+        elif obj is self._no_unpickled:
             fp = BytesIO(self.data)
             unpickler = _Unpickler(fp, **self.UNPICKLER_KWARGS)
             unpickler.find_global = self._find_global
@@ -1019,7 +1426,7 @@ class Message(object):
     def __repr__(self):
         return 'Message(%r, %r, %r, %r, %r, %r..%d)' % (
             self.dst_id, self.src_id, self.auth_id, self.handle,
-            self.reply_to, (self.data or '')[:50], len(self.data)
+            self.reply_to, BytesType(self.data[:50]), len(self.data)
         )
 
 
@@ -1036,6 +1443,8 @@ class Sender(object):
     :param int dst_handle:
         Destination handle to send messages to.
     """
+    __slots__ = ('context', 'dst_handle')
+
     def __init__(self, context, dst_handle):
         self.context = context
         self.dst_handle = dst_handle
@@ -1339,7 +1748,12 @@ class Importer(object):
     if PY3:
         ALWAYS_BLACKLIST += ['cStringIO']
 
-    def __init__(self, router, context, core_src, whitelist=(), blacklist=()):
+    #: If not :data:`None`, directory where code objects of modules compiled
+    #: by :meth:`get_code` are kept. Set using :meth:`set_code_cache_dir`.
+    code_cache_dir = None
+
+    def __init__(self, router, context, core_src, whitelist=(), blacklist=(),
+                 stdlib_names=()):
         self._log = logging.getLogger('mitogen.importer')
         self._context = context
         self._present = {'mitogen': self.MITOGEN_PKG_CONTENT}
@@ -1352,9 +1766,25 @@ class Importer(object):
         self.master_whitelist = self.whitelist[:]
         self.master_blacklist = self.blacklist[:]
 
+        #: Top-level names of the master's standard library modules. The
+        #: master refuses to serve these, so they are refused without asking.
+        self.stdlib_names = frozenset(stdlib_names)
+        #: Number of :data:`GET_MODULE` requests not sent because of
+        #: :attr:`stdlib_names`, including those of any children we forwarded
+        #: requests for. Reported to the parent in each request, so any
+        #: avoided after the last request sent are never reported.
+        self.avoided_get_module_count = 0
+
         # Presence of an entry in this map indicates in-flight GET_MODULE.
         self._callbacks = {}
         self._cache = {}
+        # Names whose _cache entry holds uncompressed source, because they
+        # arrived in a LOAD_MODULE_BUNDLE or were compressed using ZDICT.
+        self._uncompressed = set()
+        # Advertised in GET_MODULE requests, or 0 for no ZDICT support.
+        self._zdict_version = 0
+        if ZDICT_SUPPORTED:
+            self._zdict_version = ZDICT_VERSION
         if core_src:
             self._update_linecache('x/mitogen/core.py', core_src)
             self._cache['mitogen.core'] = (
@@ -1387,6 +1817,11 @@ class Importer(object):
             handle=LOAD_MODULE,
             policy=has_parent_authority,
         )
+        router.add_handler(
+            fn=self._on_load_module_bundle,
+            handle=LOAD_MODULE_BUNDLE,
+            policy=has_parent_authority,
+        )
 
     def __repr__(self):
         return 'Importer'
@@ -1468,6 +1903,10 @@ class Importer(object):
                 self.builtin_find_module(fullname)
                 _vv and self._log.debug('%r is available locally', fullname)
             except ImportError:
+                if self._is_refused_stdlib(fullname):
+                    self._log.debug('%r is in the stdlib of the master',
+                                    fullname)
+                    return None
                 _vv and self._log.debug('we will try to load %r', fullname)
                 return self
         finally:
@@ -1530,6 +1969,11 @@ class Importer(object):
             log.debug('Skipping %s. Available as %r', fullname, spec)
             return spec
 
+        if self._is_refused_stdlib(fullname):
+            log.debug('Skipping %s. Unavailable locally, and in the stdlib '
+                      'of the master', fullname)
+            return None
+
         log.debug('Handling %s. Unavailable locally', fullname)
         return importlib.machinery.ModuleSpec(fullname, loader=self)
 
@@ -1581,13 +2025,23 @@ class Importer(object):
         fullname = tup[0]
         _v and self._log.debug('received %s', fullname)
 
+        # Store ZDICT-compressed sources uncompressed, so they can be passed
+        # on to children that lack support for it.
+        uncompressed = tup[3] is not None and is_zdict_compressed(tup[3])
+        if uncompressed:
+            tup = tup[:3] + (zlib_decompress(tup[3]),) + tup[4:]
+
         self._lock.acquire()
         try:
             self._cache[fullname] = tup
+            if uncompressed:
+                self._uncompressed.add(fullname)
+            else:
+                self._uncompressed.discard(fullname)
             if tup[2] is not None and PY24:
                 self._update_linecache(
                     path='master:' + tup[2],
-                    data=zlib.decompress(tup[3])
+                    data=self.get_source_bytes(fullname)
                 )
             callbacks = self._callbacks.pop(fullname, [])
         finally:
@@ -1596,6 +2050,54 @@ class Importer(object):
         for callback in callbacks:
             callback()
 
+    def _on_load_module_bundle(self, msg):
+        if msg.is_dead:
+            return
+
+        # 0:entries 1:compressed, entry 3:source length
+        entries, compressed = msg.unpickle()
+        data = zlib_decompress(compressed)
+        callbacks = []
+        offset = 0
+
+        self._lock.acquire()
+        try:
+            for fullname, pkg_present, path, size, related in entries:
+                _v and self._log.debug('received %s in bundle', fullname)
+                source = None
+                if path is not None:
+                    source = data[offset:offset + size]
+                    offset += size
+                    if PY24:
+                        self._update_linecache('master:' + path, source)
+                self._cache[fullname] = (fullname, pkg_present, path, source,
+                                         related)
+                self._uncompressed.add(fullname)
+                callbacks.extend(self._callbacks.pop(fullname, []))
+        finally:
+            self._lock.release()
+
+        for callback in callbacks:
+            callback()
+
+    def _get_module_data(self, fullnames):
+        return b('%s\x00%d\x00%d' % (
+            '\n'.join(fullnames),
+            self._zdict_version,
+            self.avoided_get_module_count,
+        ))
+
+    def _is_refused_stdlib(self, fullname):
+        """
+        Return :data:`True` and count an avoided request if `fullname`, which
+        is not available locally, belongs to a standard library package the
+        master would refuse to serve.
+        """
+        if fullname.split('.', 1)[0] in self.stdlib_names:
+            self.avoided_get_module_count += 1
+            return True
+        return False
+
     def _request_module(self, fullname, callback):
         self._lock.acquire()
         try:
@@ -1611,7 +2113,8 @@ class Importer(object):
                                            fullname)
                     self._callbacks[fullname] = [callback]
                     self._context.send(
-                        Message(data=b(fullname), handle=GET_MODULE)
+                        Message(data=self._get_module_data([fullname]),
+                                handle=GET_MODULE)
                     )
         finally:
             self._lock.release()
@@ -1619,6 +2122,39 @@ class Importer(object):
         if present:
             callback()
 
+    def prefetch(self, fullnames):
+        """
+        Request each module in `fullnames` that is not already imported,
+        cached or requested using a single :data:`GET_MODULE` message, and
+        return without waiting for the replies. A later import of any of them
+        waits on the reply already in flight rather than sending a request of
+        its own.
+
+        :returns:
+            List of module names requested.
+        """
+        names = []
+        self._lock.acquire()
+        try:
+            for fullname in fullnames:
+                fullname = to_text(fullname)
+                if (fullname in sys.modules or fullname in self._cache or
+                        fullname in self._callbacks or
+                        is_blacklisted_import(self, fullname)):
+                    continue
+                self._callbacks[fullname] = []
+                names.append(fullname)
+
+            if names:
+                _v and self._log.debug('prefetching %s', ', '.join(names))
+                self._context.send(
+                    Message(data=self._get_module_data(names),
+                            handle=GET_MODULE)
+                )
+        finally:
+            self._lock.release()
+        return names
+
     def create_module(self, spec):
         """
         Return a module object for the given ModuleSpec.
@@ -1664,18 +2200,7 @@ class Importer(object):
         name = module.__spec__.name
         origin = module.__spec__.origin
         self._log.debug('Executing %s from %s', name, origin)
-        source = self.get_source(name)
-        try:
-            # Compile the source into a code object. Don't add any __future__
-            # flags and don't inherit any from this module.
-            # FIXME Should probably be exposed as get_code()
-            code = compile(source, origin, 'exec', flags=0, dont_inherit=True)
-        except SyntaxError:
-            # FIXME Why is this LOG, rather than self._log?
-            LOG.exception('while importing %r', name)
-            raise
-
-        exec(code, module.__dict__)
+        exec(self.get_code(name), module.__dict__)
 
     def load_module(self, fullname):
         """
@@ -1711,13 +2236,7 @@ class Importer(object):
             # 2.x requires __package__ to be exactly a string.
             mod.__package__, _ = encodings.utf_8.encode(mod.__package__)
 
-        source = self.get_source(fullname)
-        try:
-            code = compile(source, mod.__file__, 'exec', 0, 1)
-        except SyntaxError:
-            LOG.exception('while importing %r', fullname)
-            raise
-
+        code = self.get_code(fullname)
         if PY3:
             exec(code, vars(mod))
         else:
@@ -1738,17 +2257,125 @@ class Importer(object):
                 raise ModuleNotFoundError(self.absent_msg % (fullname,))
             return u'master:' + self._cache[fullname][2]
 
+    def get_source_bytes(self, fullname):
+        """
+        Return the undecoded source of a module received from the parent, or
+        :data:`None` if the parent could not supply it.
+        """
+        source = self._cache[fullname][3]
+        if source is None or fullname in self._uncompressed:
+            return source
+        return zlib.decompress(source)
+
     def get_source(self, fullname):
         if fullname in self._cache:
-            compressed = self._cache[fullname][3]
-            if compressed is None:
+            source = self.get_source_bytes(fullname)
+            if source is None:
                 raise ModuleNotFoundError(self.absent_msg % (fullname,))
 
-            source = zlib.decompress(self._cache[fullname][3])
             if PY3:
                 return to_text(source)
             return source
 
+    def set_code_cache_dir(self, path):
+        """
+        Keep code objects compiled by :meth:`get_code` in `path`, so later
+        interpreters of the same version receiving the same module skip
+        compiling it. The directory is created if missing, and the cache is
+        left disabled if it is not private to the current user.
+        """
+        import stat
+        try:
+            import hashlib
+        except ImportError:
+            self._log.warning('code cache requires hashlib, ignoring')
+            return
+
+        try:
+            os.mkdir(path, stat.S_IRWXU)
+        except OSError:
+            if sys.exc_info()[1].args[0] != errno.EEXIST:
+                self._log.warning('cannot create code cache %r', path)
+                return
+
+        st = os.lstat(path)
+        if ((not stat.S_ISDIR(st.st_mode)) or st.st_uid != os.geteuid() or
+                st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+            self._log.warning('code cache %r is not private, ignoring', path)
+            return
+
+        self._sha1 = hashlib.sha1
+        self.code_cache_dir = path
+
+    def _get_code_cache_path(self, filename, source):
+        # Code objects embed their filename, and marshal output is only
+        # readable by the interpreter version that wrote it.
+        digest = self._sha1(b(sys.version))
+        digest.update(b('\x00') + to_text(filename).encode('utf-8'))
+        digest.update(b('\x00') + source)
+        return os.path.join(self.code_cache_dir, digest.hexdigest() + '.code')
+
+    def _load_cached_code(self, path):
+        try:
+            fp = open(path, 'rb')
+            try:
+                return marshal.load(fp)
+            finally:
+                fp.close()
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def _store_cached_code(self, path, code):
+        tmp_path = '%s.%d.%d' % (path, os.getpid(), id(code))
+        try:
+            fp = open(tmp_path, 'wb')
+            try:
+                marshal.dump(code, fp)
+            finally:
+                fp.close()
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            self._log.debug('while writing %r: %s', path, sys.exc_info()[1])
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def get_code(self, fullname):
+        """
+        Return the code object for a module received from the parent, reusing
+        a copy from :attr:`code_cache_dir` if one is present.
+
+        Implements importlib.abc.InspectLoader.get_code().
+        """
+        filename = self.get_filename(fullname)
+        path = None
+        source = None
+        if self.code_cache_dir is not None and fullname in self._cache:
+            # Only decode the source if the cache misses.
+            source = self.get_source_bytes(fullname)
+        if source is None:
+            source = self.get_source(fullname)
+        else:
+            path = self._get_code_cache_path(filename, source)
+            code = self._load_cached_code(path)
+            if code is not None:
+                return code
+            if PY3:
+                source = to_text(source)
+
+        try:
+            # Compile the source into a code object. Don't add any __future__
+            # flags and don't inherit any from this module.
+            code = compile(source, filename, 'exec', 0, 1)
+        except SyntaxError:
+            LOG.exception('while importing %r', fullname)
+            raise
+
+        if path is not None:
+            self._store_cached_code(path, code)
+        return code
+
 
 class LogHandler(logging.Handler):
     """
@@ -1909,13 +2536,31 @@ class Stream(object):
 
         The default implementation reads :attr:`Protocol.read_size` bytes and
         passes the resulting bytestring to :meth:`Protocol.on_receive`. If the
-        bytestring is 0 bytes, invokes :meth:`on_disconnect` instead.
+        bytestring is 0 bytes, invokes :meth:`on_disconnect` instead. When the
+        protocol supplies :attr:`Protocol.get_read_buffer`, data is instead
+        read directly into the returned buffer and
+        :meth:`Protocol.on_receive_into` is invoked with the byte count.
         """
-        buf = self.receive_side.read(self.protocol.read_size)
+        try:
+            if self.protocol.get_read_buffer is not None:
+                buf = self.receive_side.readinto(
+                    self.protocol.get_read_buffer()
+                )
+            else:
+                buf = self.receive_side.read(self.protocol.read_size)
+        except OSError:
+            # An edge-triggered poller may report a side that a previous
+            # complete read already drained.
+            if sys.exc_info()[1].args[0] != errno.EAGAIN:
+                raise
+            self.receive_side.short_io = True
+            return
+
         if not buf:
             LOG.debug('%r: empty read, disconnecting', self.receive_side)
             return self.on_disconnect(broker)
-
+        if self.protocol.get_read_buffer is not None:
+            return self.protocol.on_receive_into(broker, buf)
         self.protocol.on_receive(broker, buf)
 
     def on_transmit(self, broker):
@@ -1981,6 +2626,11 @@ class Protocol(object):
     #: active protocol for the stream.
     read_size = CHUNK_SIZE
 
+    #: If not :data:`None`, a function returning a writeable buffer that
+    #: :class:`Stream` should read into directly, followed by a call to
+    #: `on_receive_into(broker, n)` with the number of bytes read.
+    get_read_buffer = None
+
     @classmethod
     def build_stream(cls, *args, **kwargs):
         stream = cls.stream_class()
@@ -2082,18 +2732,47 @@ class BufferedWriter(object):
     Implement buffered output while avoiding quadratic string operations. This
     is currently constructed by each protocol, in future it may become fixed
     for each stream instead.
+
+    In batched mode, writes made during one :class:`Broker` loop iteration are
+    coalesced and transmitted by :meth:`flush` using a single
+    :func:`os.writev` call once the iteration completes.
     """
+    #: If :data:`True`, coalesce pending writes using :func:`os.writev`.
+    #: Requires Python 3.
+    batched = hasattr(os, 'writev')
+
+    #: Maximum bytes to pass to a single :func:`os.writev` call. The final
+    #: buffer may exceed this.
+    max_batch_size = 4 * CHUNK_SIZE
+
     def __init__(self, broker, protocol):
         self._broker = broker
         self._protocol = protocol
         self._buf = collections.deque()
+        #: For each buffer in :attr:`_buf`, :data:`True` if it is followed by
+        #: another part of the same message.
+        self._more = collections.deque()
         self._len = 0
 
-    def write(self, s):
+    def write(self, s, more=False):
         """
         Transmit `s` immediately, falling back to enqueuing it and marking the
-        stream writeable if no OS buffer space is available.
-        """
+        stream writeable if no OS buffer space is available. In batched mode,
+        enqueue `s` and arrange for :meth:`flush` to run at the end of the
+        current broker loop iteration.
+
+        :param bool more:
+            If :data:`True`, `s` is not the last part of a message, and is not
+            counted by :attr:`Broker.writev_buffer_count`.
+        """
+        if self.batched:
+            if not self._len:
+                self._broker._flush_pending.append(self)
+            self._buf.append(s)
+            self._more.append(more)
+            self._len += len(s)
+            return
+
         if not self._len:
             # Modifying epoll/Kqueue state is expensive, as are needless broker
             # loops. Rather than wait for writeability, just write immediately,
@@ -2109,25 +2788,68 @@ class BufferedWriter(object):
 
             self._broker._start_transmit(self._protocol.stream)
         self._buf.append(s)
+        self._more.append(more)
         self._len += len(s)
 
-    def on_transmit(self, broker):
+    def flush(self, broker):
         """
-        Respond to stream writeability by retrying previously buffered
-        :meth:`write` calls.
+        Transmit buffered :meth:`write` calls made during the last broker loop
+        iteration, marking the stream writeable if any data remains.
         """
-        if self._buf:
+        stream = self._protocol.stream
+        if stream is None or stream.transmit_side.closed or not self._buf:
+            return
+        if self._transmit(broker) and self._buf:
+            broker._start_transmit(stream)
+
+    def _transmit(self, broker):
+        bufs = []
+        size = 0
+        for buf in self._buf:
+            bufs.append(buf)
+            size += len(buf)
+            if (not self.batched) or len(bufs) == IOV_MAX or \
+                    size >= self.max_batch_size:
+                break
+
+        try:
+            if len(bufs) == 1:
+                written = self._protocol.stream.transmit_side.write(bufs[0])
+            else:
+                written = self._protocol.stream.transmit_side.writev(bufs)
+                broker.writev_count += 1
+        except OSError:
+            # A batched flush may find the OS buffer still full from an
+            # earlier on_transmit(). Wait for writeability instead.
+            if sys.exc_info()[1].args[0] != errno.EAGAIN:
+                raise
+            self._protocol.stream.transmit_side.short_io = True
+            return True
+
+        if not written:
+            _v and LOG.debug('disconnected during write to %r', self)
+            self._protocol.stream.on_disconnect(broker)
+            return False
+
+        _vv and IOLOG.debug('transmitted %d bytes to %r', written, self)
+        self._len -= written
+        while written:
             buf = self._buf.popleft()
-            written = self._protocol.stream.transmit_side.write(buf)
-            if not written:
-                _v and LOG.debug('disconnected during write to %r', self)
-                self._protocol.stream.on_disconnect(broker)
-                return
-            elif written != len(buf):
+            if written < len(buf):
                 self._buf.appendleft(BufferType(buf, written))
+                break
+            written -= len(buf)
+            if not self._more.popleft() and len(bufs) > 1:
+                broker.writev_buffer_count += 1
+        return True
 
-            _vv and IOLOG.debug('transmitted %d bytes to %r', written, self)
-            self._len -= written
+    def on_transmit(self, broker):
+        """
+        Respond to stream writeability by retrying previously buffered
+        :meth:`write` calls.
+        """
+        if self._buf and not self._transmit(broker):
+            return
 
         if not self._buf:
             broker._stop_transmit(self._protocol.stream)
@@ -2162,6 +2884,13 @@ class Side(object):
     _fork_refs = weakref.WeakValueDictionary()
     closed = False
 
+    #: :data:`True` if the last :meth:`read`, :meth:`readinto`, :meth:`write`
+    #: or :meth:`writev` transferred fewer bytes than requested, meaning the
+    #: descriptor was drained or its buffer filled. Edge-triggered pollers use
+    #: this to learn when readiness has been consumed. :data:`None` until the
+    #: first transfer.
+    short_io = None
+
     def __init__(self, stream, fp, cloexec=True, keep_alive=True, blocking=False):
         #: The :class:`Stream` for which this is a read or write side.
         self.stream = stream
@@ -2228,8 +2957,26 @@ class Side(object):
         if disconnected:
             LOG.debug('%r: disconnected during read: %s', self, disconnected)
             return b('')
+        self.short_io = len(s) < n
         return s
 
+    def readinto(self, buf):
+        """
+        Like :meth:`read`, but read into the writeable buffer `buf` using
+        :func:`os.readv`, avoiding allocation of a temporary string.
+
+        :returns:
+            Number of bytes read, or 0 to indicate disconnection was detected.
+        """
+        if self.closed:
+            return 0
+        n, disconnected = io_op(os.readv, self.fd, (buf,))
+        if disconnected:
+            LOG.debug('%r: disconnected during read: %s', self, disconnected)
+            return 0
+        self.short_io = n < len(buf)
+        return n
+
     def write(self, s):
         """
         Write as much of the bytes from `s` as possible to the file descriptor,
@@ -2248,6 +2995,22 @@ class Side(object):
         if disconnected:
             LOG.debug('%r: disconnected during write: %s', self, disconnected)
             return None
+        self.short_io = written < len(s)
+        return written
+
+    def writev(self, bufs):
+        """
+        Like :meth:`write`, but write as much of the sequence of buffers
+        `bufs` as possible using a single :func:`os.writev` call.
+        """
+        if self.closed:
+            return None
+
+        written, disconnected = io_op(os.writev, self.fd, bufs)
+        if disconnected:
+            LOG.debug('%r: disconnected during write: %s', self, disconnected)
+            return None
+        self.short_io = written < sum(map(len, bufs))
         return written
 
 
@@ -2265,6 +3028,23 @@ class MitogenProtocol(Protocol):
     #: peer.
     on_message = None
 
+    #: If :data:`True`, read directly into a contiguous receive ring and set
+    #: :attr:`Message.data` of large received messages to a
+    #: :class:`memoryview` of it, rather than joining received strings.
+    #: Requires Python 3.
+    use_ring = PY3 and hasattr(os, 'readv')
+
+    #: Minimum size of the receive ring. A ring is reused until it lacks room
+    #: for the next read, after which any trailing partial frame is copied
+    #: into a fresh ring. The old ring is freed once every message referring
+    #: to it has been released.
+    ring_size = 2 * CHUNK_SIZE
+
+    #: Payloads smaller than this are copied out of the receive ring, since a
+    #: small message retaining an entire ring would waste memory, and copying
+    #: allows the ring to be reused.
+    min_view_size = CHUNK_SIZE // 4
+
     def __init__(self, router, remote_id, auth_id=None,
                  local_id=None, parent_ids=None):
         self._router = router
@@ -2283,8 +3063,21 @@ class MitogenProtocol(Protocol):
             auth_id in ([local_id] + parent_ids)
         )
         self.sent_modules = set(['mitogen', 'mitogen.core'])
+        #: :data:`ZDICT_VERSION` advertised by the remote in
+        #: :data:`GET_MODULE` requests, or 0 if it has advertised none.
+        self.zdict_version = 0
+        #: :attr:`Importer.avoided_get_module_count` as last reported by the
+        #: remote in a :data:`GET_MODULE` request.
+        self.avoided_get_module_count = 0
         self._input_buf = collections.deque()
         self._input_buf_len = 0
+        if not self.use_ring:
+            self.get_read_buffer = None
+        self._ring = None
+        self._ring_exported = False
+        self._ring_start = 0
+        self._ring_end = 0
+        self._ring_need = Message.HEADER_LEN
         self._writer = BufferedWriter(router.broker, self)
 
         #: Routing records the dst_id of every message arriving from this
@@ -2297,6 +3090,13 @@ class MitogenProtocol(Protocol):
         :class:`StreamError` on failure.
         """
         _vv and IOLOG.debug('%r.on_receive()', self)
+        if self.get_read_buffer is not None:
+            if self._ring is None or \
+                    len(self._ring) - self._ring_end < len(buf):
+                self._ring_reserve(len(buf))
+            self._ring[self._ring_end:self._ring_end + len(buf)] = buf
+            return self.on_receive_into(broker, len(buf))
+
         if self._input_buf and self._input_buf_len < 128:
             self._input_buf[0] += buf
         else:
@@ -2313,6 +3113,121 @@ class MitogenProtocol(Protocol):
         '%r'
     )
 
+    def _ring_reserve(self, n):
+        """
+        Ensure at least `n` bytes are free following any partial frame in the
+        receive ring. The ring is only rewritten in place if no message has
+        been handed a slice of it, otherwise the partial frame is copied to a
+        new ring.
+        """
+        live = self._ring_end - self._ring_start
+        size = max(self.ring_size, live + n)
+        if self._ring is not None and not self._ring_exported and \
+                size <= len(self._ring):
+            if live:
+                self._ring[:live] = self._ring_view[
+                    self._ring_start:self._ring_end
+                ].tobytes()
+        else:
+            ring = bytearray(size)
+            if live:
+                ring[:live] = self._ring_view[self._ring_start:self._ring_end]
+            self._ring = ring
+            self._ring_view = memoryview(ring)
+            self._ring_data_view = self._ring_view
+            if hasattr(self._ring_view, 'toreadonly'):  # Python 3.8+
+                self._ring_data_view = self._ring_view.toreadonly()
+            self._ring_exported = False
+        self._ring_start = 0
+        self._ring_end = live
+
+    def get_read_buffer(self):
+        """
+        Return a writeable :class:`memoryview` of up to :attr:`read_size`
+        bytes of free space in the receive ring.
+        """
+        free = 0
+        if self._ring is not None:
+            free = len(self._ring) - self._ring_end
+        if free < self.read_size and free < self._ring_need:
+            self._ring_reserve(self.read_size)
+        return self._ring_view[self._ring_end:self._ring_end + self.read_size]
+
+    def on_receive_into(self, broker, n):
+        """
+        Handle `n` bytes written to the buffer returned by
+        :meth:`get_read_buffer`, routing any complete messages.
+        """
+        _vv and IOLOG.debug('%r.on_receive_into(%d)', self, n)
+        self._ring_end += n
+        while self._receive_ring(broker):
+            pass
+
+        if self._ring is not None and self._ring_start == self._ring_end:
+            self._ring_need = Message.HEADER_LEN
+            if self._ring_exported:
+                self._ring = self._ring_view = self._ring_data_view = None
+            else:
+                self._ring_start = self._ring_end = 0
+
+    def _receive_ring(self, broker):
+        start = self._ring_start
+        avail = self._ring_end - start
+        if avail < Message.HEADER_LEN:
+            self._ring_need = Message.HEADER_LEN - avail
+            return False
+
+        (magic, dst_id, src_id, auth_id,
+         handle, reply_to, msg_len) = struct.unpack_from(
+            Message.HEADER_FMT, self._ring, start
+        )
+
+        if magic != Message.HEADER_MAGIC:
+            LOG.error(self.corrupt_msg, self.stream.name,
+                      self._ring_view[start:start + min(avail, 2048)].tobytes())
+            self.stream.on_disconnect(broker)
+            return False
+
+        if msg_len > self._router.max_message_size:
+            LOG.error('%r: Maximum message size exceeded (got %d, max %d)',
+                      self, msg_len, self._router.max_message_size)
+            self.stream.on_disconnect(broker)
+            return False
+
+        total_len = msg_len + Message.HEADER_LEN
+        if avail < total_len:
+            _vv and IOLOG.debug(
+                '%r: Input too short (want %d, got %d)',
+                self, msg_len, avail - Message.HEADER_LEN
+            )
+            self._ring_need = total_len - avail
+            if start + total_len > len(self._ring):
+                # The frame would wrap, so move it to a ring that fits it.
+                self._ring_reserve(self._ring_need)
+            return False
+
+        self._ring_start += total_len
+        if dst_id != mitogen.context_id:
+            frame = self._ring_data_view[start:start + total_len]
+            if msg_len < self.min_view_size:
+                frame = frame.tobytes()
+            if self._router._async_forward(frame, dst_id, src_id, auth_id,
+                                           self.stream):
+                if msg_len >= self.min_view_size:
+                    self._ring_exported = True
+                return True
+
+        data = self._ring_data_view[start + Message.HEADER_LEN:
+                                    start + total_len]
+        if msg_len < self.min_view_size:
+            data = data.tobytes()
+        else:
+            self._ring_exported = True
+        msg = Message(dst_id, src_id, auth_id, handle, reply_to, data,
+                      self._router)
+        self._router._async_route(msg, self.stream)
+        return True
+
     def _receive_one(self, broker):
         if self._input_buf_len < Message.HEADER_LEN:
             return False
@@ -2382,7 +3297,21 @@ class MitogenProtocol(Protocol):
 
     def _send(self, msg):
         _vv and IOLOG.debug('%r._send(%r)', self, msg)
-        self._writer.write(msg.pack())
+        if self._writer.batched and len(msg.data) >= self.min_view_size:
+            # Let writev() gather the header and a large body, rather than
+            # copying both into a new string.
+            self._writer.write(msg.pack_header(), more=True)
+            self._writer.write(msg.data)
+        else:
+            self._writer.write(msg.pack())
+
+    def _send_frame(self, frame):
+        """
+        Transmit an already encoded message frame received from another
+        stream. Must only be called from the :class:`Broker` thread.
+        """
+        _vv and IOLOG.debug('%r._send_frame(%d bytes)', self, len(frame))
+        self._writer.write(frame)
 
     def send(self, msg):
         """
@@ -2680,19 +3609,15 @@ class Latch(object):
 
     See :ref:`waking-sleeping-threads` for further discussion.
     """
+    __slots__ = ('closed', 'notify', '_lock', '_queue', '_sleeping',
+                 '_waking')
+
     #: The :class:`Poller` implementation to use. Instances are short lived so
     #: prefer :class:`mitogen.parent.PollPoller` if it's available, otherwise
     #: :class:`mitogen.core.Poller`. They don't need syscalls to create,
     #: configure, or destroy. Replaced during import of :mod:`mitogen.parent`.
     poller_class = Poller
 
-    #: If not :data:`None`, a function invoked as `notify(latch)` after a
-    #: successful call to :meth:`put`. The function is invoked on the
-    #: :meth:`put` caller's thread, which may be the :class:`Broker` thread,
-    #: therefore it must not block. Used by :class:`mitogen.select.Select` to
-    #: efficiently implement waiting on multiple event sources.
-    notify = None
-
     # The _cls_ prefixes here are to make it crystal clear in the code which
     # state mutation isn't covered by :attr:`_lock`.
 
@@ -2708,6 +3633,13 @@ class Latch(object):
 
     def __init__(self):
         self.closed = False
+        #: If not :data:`None`, a function invoked as `notify(latch)` after a
+        #: successful call to :meth:`put`. The function is invoked on the
+        #: :meth:`put` caller's thread, which may be the :class:`Broker`
+        #: thread, therefore it must not block. Used by
+        #: :class:`mitogen.select.Select` to efficiently implement waiting on
+        #: multiple event sources.
+        self.notify = None
         self._lock = threading.Lock()
         #: List of unconsumed enqueued items.
         self._queue = []
@@ -2952,7 +3884,9 @@ class Waker(Protocol):
 
     .. _UNIX self-pipe trick: https://cr.yp.to/docs/selfpipe.html
     """
-    read_size = 1
+    # Rarely more than one byte is pending, but reading them all in one short
+    # read lets edge-triggered pollers skip re-arming the pipe.
+    read_size = 128
     broker_ident = None
 
     @classmethod
@@ -3181,7 +4115,7 @@ class Router(object):
         if msg.is_dead:
             return
 
-        target_id_s, _, name = bytes_partition(msg.data, b(':'))
+        target_id_s, _, name = bytes_partition(BytesType(msg.data), b(':'))
         target_id = int(target_id_s, 10)
         LOG.error('%r: deleting route to %s (%d)',
                   self, to_text(name), target_id)
@@ -3538,6 +4472,54 @@ class Router(object):
 
         out_stream.protocol._send(msg)
 
+    def _async_forward(self, frame, dst_id, src_id, auth_id, in_stream):
+        """
+        Forward the encoded frame `frame` received on `in_stream` to another
+        stream, performing the same verification as :meth:`_async_route`
+        using only header fields, so no :class:`Message` is constructed for
+        messages that merely pass through this context.
+
+        Must only be called from the :class:`Broker` thread.
+
+        :returns:
+            :data:`True` if the frame was forwarded. :data:`False` if it must
+            be passed to :meth:`_async_route`, either because it is refused,
+            cannot be routed, or `in_stream` has an
+            :attr:`MitogenProtocol.on_message` hook.
+        """
+        protocol = in_stream.protocol
+        if protocol.on_message is not None:
+            return False
+
+        parent_stream = self._stream_by_id.get(mitogen.parent_id)
+        src_stream = self._stream_by_id.get(src_id, parent_stream)
+        if in_stream != self._stream_by_id.get(auth_id, parent_stream) or \
+                (src_id != auth_id and in_stream != src_stream):
+            return False
+
+        out_stream = self._stream_by_id.get(dst_id)
+        if (not out_stream) and parent_stream != src_stream:
+            out_stream = parent_stream
+        if out_stream is None or out_stream is in_stream:
+            return False
+
+        if self.unidirectional and not (protocol.is_privileged or
+                                        out_stream.protocol.is_privileged):
+            return False
+
+        protocol.egress_ids.add(dst_id)
+        if protocol.auth_id is not None and protocol.auth_id != auth_id:
+            # Restamp auth_id, as in _async_route().
+            header = struct.pack('>L', protocol.auth_id)
+            out_stream.protocol._send_frame(frame[:10])
+            out_stream.protocol._send_frame(header)
+            frame = frame[14:]
+
+        _vv and IOLOG.debug('%r._async_forward(%d -> %d via %r)',
+                            self, src_id, dst_id, out_stream)
+        out_stream.protocol._send_frame(frame)
+        return True
+
     def route(self, msg):
         """
         Arrange for the :class:`Message` `msg` to be delivered to its
@@ -3575,14 +4557,27 @@ class Broker(object):
     #: before force-disconnecting them during :meth:`shutdown`.
     shutdown_timeout = 3.0
 
+    #: Count of :func:`os.writev` calls made by :class:`BufferedWriter`.
+    writev_count = 0
+
+    #: Count of buffers fully transmitted by those :func:`os.writev` calls.
+    #: Each would otherwise have needed its own system call. A message
+    #: written as a separate header and body counts once.
+    writev_buffer_count = 0
+
     def __init__(self, poller_class=None, activate_compat=True):
         self._alive = True
         self._exitted = False
+        #: :class:`BufferedWriter` instances with writes pending
+        #: :meth:`BufferedWriter.flush` at the end of this loop iteration.
+        self._flush_pending = []
         self._waker = Waker.build_stream(self)
         #: Arrange for `func(\*args, \**kwargs)` to be executed on the broker
         #: thread, or immediately if the current thread is the broker thread.
         #: Safe to call from any thread.
         self.defer = self._waker.protocol.defer
+        if poller_class is not None:
+            self.poller_class = poller_class
         self.poller = self.poller_class()
         self.poller.start_receive(
             self._waker.receive_side.fd,
@@ -3712,12 +4707,25 @@ class Broker(object):
             self._call(side.stream, func)
         if timer_to is not None:
             self.timers.expire()
+        self._flush_writers()
+
+    def _flush_writers(self):
+        """
+        Invoke :meth:`BufferedWriter.flush` for each writer that was written
+        to since the last call.
+        """
+        while self._flush_pending:
+            writers = self._flush_pending
+            self._flush_pending = []
+            for writer in writers:
+                self._call(writer._protocol.stream, writer.flush)
 
     def _broker_exit(self):
         """
         Forcefully call :meth:`Stream.on_disconnect` on any streams that failed
         to shut down gracefully, then discard the :class:`Poller`.
         """
+        self._flush_writers()
         for _, (side, _) in self.poller.readers + self.poller.writers:
             LOG.debug('%r: force disconnecting %r', self, side)
             side.stream.on_disconnect(self)
@@ -3733,6 +4741,7 @@ class Broker(object):
         """
         for _, (side, _) in self.poller.readers + self.poller.writers:
             self._call(side.stream, side.stream.on_shutdown)
+        self._flush_writers()
 
         deadline = now() + self.shutdown_timeout
         while self.keep_alive() and now() < deadline:
@@ -4007,6 +5016,8 @@ class ExternalContext(object):
 
     def _setup_master(self):
         Router.max_message_size = self.config['max_message_size']
+        if self.config.get('tlv_codec'):
+            Message.codec = TlvCodec
         if self.config['profiling']:
             enable_profiling()
         self.broker = Broker(activate_compat=False)
@@ -4083,6 +5094,7 @@ class ExternalContext(object):
                 core_src,
                 self.config.get('whitelist', ()),
                 self.config.get('blacklist', ()),
+                self.config.get('stdlib_names', ()),
             )
 
         self.importer = importer
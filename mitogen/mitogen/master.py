@@ -37,12 +37,15 @@ contexts.
 
 import dis
 import errno
+import hashlib
 import inspect
 import itertools
 import logging
+import marshal
 import os
 import pkgutil
 import re
+import stat
 import string
 import sys
 import threading
@@ -90,13 +93,11 @@ from mitogen.core import any
 from mitogen.core import b
 from mitogen.core import IOLOG
 from mitogen.core import LOG
-from mitogen.core import next
 from mitogen.core import str_partition
 from mitogen.core import str_rpartition
 from mitogen.core import to_text
 
 imap = getattr(itertools, 'imap', map)
-izip = getattr(itertools, 'izip', zip)
 
 RLOG = logging.getLogger('mitogen.ctx')
 
@@ -158,6 +159,21 @@ def is_stdlib_name(modname):
 _STDLIB_PATHS = _stdlib_paths()
 
 
+def stdlib_names():
+    """
+    Return a sorted list of the top-level names of modules and packages found
+    in the standard library directories, or built into the interpreter.
+    """
+    paths = []
+    for path in _STDLIB_PATHS:
+        if path:
+            paths.extend([path, os.path.join(path, 'lib-dynload')])
+    names = set(sys.builtin_module_names)
+    names.update(name for _, name, _ in pkgutil.iter_modules(paths))
+    names.discard('__main__')
+    return sorted(names)
+
+
 def is_stdlib_path(path):
     return any(
         os.path.commonprefix((libpath, path)) == libpath
@@ -167,6 +183,128 @@ def is_stdlib_path(path):
     )
 
 
+class DirectoryCache(object):
+    """
+    Cache directory listings, keyed by the directory's modification time, so
+    repeatedly enumerating the same package directories during module lookup
+    costs a single :func:`os.stat` per directory rather than a fresh listing
+    and a stat of every entry. Shared by :func:`get_child_modules` and the
+    :class:`FinderMethod` implementations that probe the filesystem.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        #: Map of directory path to `(mtime, entries)`.
+        self._cache = {}
+        #: Number of listings served from the cache.
+        self.hits = 0
+        #: Number of listings read from disk.
+        self.misses = 0
+
+    def _scan(self, path):
+        entries = {}
+        try:
+            if hasattr(os, 'scandir'):
+                for entry in os.scandir(path):
+                    try:
+                        entries[entry.name] = entry.is_dir()
+                    except OSError:
+                        entries[entry.name] = False
+            else:
+                for name in os.listdir(path):
+                    entries[name] = os.path.isdir(os.path.join(path, name))
+        except OSError:
+            pass
+        return entries
+
+    def listdir(self, path):
+        """
+        Return a dict mapping the names of entries within the directory at
+        `path` to :data:`True` if the entry is itself a directory.
+
+        :returns:
+            Dict as described above, or :data:`None` if `path` is not a
+            directory.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+
+        mtime = getattr(st, 'st_mtime_ns', st.st_mtime)
+        self._lock.acquire()
+        try:
+            cached = self._cache.get(path)
+            if cached and cached[0] == mtime:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        finally:
+            self._lock.release()
+
+        entries = self._scan(path)
+        self._lock.acquire()
+        try:
+            self._cache[path] = (mtime, entries)
+        finally:
+            self._lock.release()
+        return entries
+
+    def _is_package_dir(self, path):
+        entries = self.listdir(path) or ()
+        return any(inspect.getmodulename(name) == '__init__'
+                   for name in entries)
+
+    def iter_modules(self, path):
+        """
+        Equivalent to :func:`pkgutil.iter_modules` for a single directory,
+        using cached listings for it and any subpackage directories.
+
+        :returns:
+            List of `(name, is_pkg)` tuples, or :data:`None` if `path` is not
+            a directory.
+        """
+        entries = self.listdir(path)
+        if entries is None:
+            return None
+
+        seen = set()
+        result = []
+        for filename in sorted(entries):
+            modname = inspect.getmodulename(filename)
+            if modname == '__init__' or modname in seen:
+                continue
+
+            is_pkg = False
+            if not modname and entries[filename] and '.' not in filename:
+                modname = filename
+                is_pkg = self._is_package_dir(os.path.join(path, filename))
+                if not is_pkg:
+                    continue
+
+            if modname and '.' not in modname:
+                seen.add(modname)
+                result.append((to_text(modname), is_pkg))
+        return result
+
+    def has_candidate(self, path, modname):
+        """
+        Return :data:`False` only if `path` is a directory that certainly
+        contains no module or package named `modname`.
+        """
+        entries = self.listdir(path)
+        if entries is None:
+            return True
+        return modname in entries or any(
+            inspect.getmodulename(name) == modname
+            for name in entries
+        )
+
+
+_dir_cache = DirectoryCache()
+
+
 def get_child_modules(path, fullname):
     """
     Return the suffixes of submodules directly neated beneath of the package
@@ -184,6 +322,9 @@ def get_child_modules(path, fullname):
     """
     mod_path = os.path.dirname(path)
     if mod_path != '':
+        modules = _dir_cache.iter_modules(mod_path)
+        if modules is not None:
+            return [name for name, _ in modules]
         return [to_text(name) for _, name, _ in pkgutil.iter_modules([mod_path])]
     else:
         # we loaded some weird package in memory, so we'll see if it has a custom loader we can use
@@ -299,32 +440,21 @@ def scan_code_imports(co):
         * `namelist`: for `ImportFrom`, the list of names to be imported from
           `modname`.
     """
-    opit = iter_opcodes(co)
-    opit, opit2, opit3 = itertools.tee(opit, 3)
-
-    try:
-        next(opit2)
-        next(opit3)
-        next(opit3)
-    except StopIteration:
-        return
-
+    # Single pass, remembering the two preceding instructions.
+    op1 = arg1 = op2 = arg2 = None
     if sys.version_info >= (2, 5):
-        for oparg1, oparg2, (op3, arg3) in izip(opit, opit2, opit3):
-            if op3 == IMPORT_NAME:
-                op2, arg2 = oparg2
-                op1, arg1 = oparg1
-                if op1 == op2 == LOAD_CONST:
-                    yield (co.co_consts[arg1],
-                           co.co_names[arg3],
-                           co.co_consts[arg2] or ())
+        for op3, arg3 in iter_opcodes(co):
+            if op3 == IMPORT_NAME and op1 == op2 == LOAD_CONST:
+                yield (co.co_consts[arg1],
+                       co.co_names[arg3],
+                       co.co_consts[arg2] or ())
+            op1, arg1, op2, arg2 = op2, arg2, op3, arg3
     else:
         # Python 2.4 did not yet have 'level', so stack format differs.
-        for oparg1, (op2, arg2) in izip(opit, opit2):
-            if op2 == IMPORT_NAME:
-                op1, arg1 = oparg1
-                if op1 == LOAD_CONST:
-                    yield (-1, co.co_names[arg2], co.co_consts[arg1] or ())
+        for op2, arg2 in iter_opcodes(co):
+            if op2 == IMPORT_NAME and op1 == LOAD_CONST:
+                yield (-1, co.co_names[arg2], co.co_consts[arg1] or ())
+            op1, arg1 = op2, arg2
 
 
 class ThreadWatcher(object):
@@ -442,7 +572,8 @@ class LogForwarder(object):
                       self, msg.src_id)
             return
 
-        name, level_s, s = msg.data.decode('utf-8', 'replace').split('\x00', 2)
+        data = mitogen.core.BytesType(msg.data)
+        name, level_s, s = data.decode('utf-8', 'replace').split('\x00', 2)
 
         logger_name = '%s.[%s]' % (name, context.name)
         logger = self._cache.get(logger_name)
@@ -526,6 +657,47 @@ class DefectivePython3xMainMethod(FinderMethod):
         return path, source, False
 
 
+class SysModulesSpecMethod(FinderMethod):
+    """
+    Fast path for modules already imported by the master: read the source
+    file named by the :data:`__spec__` attribute of the entry in
+    :data:`sys.modules`, skipping the loader lookups done by
+    :class:`PkgutilMethod`. Anything unusual is left to the other methods.
+    """
+    def find(self, fullname):
+        """
+        Find `fullname` using ``sys.modules[fullname].__spec__``.
+        """
+        module = sys.modules.get(fullname)
+        if not isinstance(module, types.ModuleType):
+            return None
+
+        spec = getattr(module, '__spec__', None)
+        if spec is None or spec.name != fullname:
+            return None
+
+        if getattr(module, '__name__', None) != fullname:
+            return None
+
+        if not (spec.has_location and spec.origin and
+                os.path.splitext(spec.origin)[1] == '.py'):
+            return None
+
+        try:
+            fp = open(spec.origin, 'rb')
+        except IOError:
+            e = sys.exc_info()[1]
+            LOG.debug('%r: open(%r) failed: %s', self, spec.origin, e)
+            return None
+
+        try:
+            source = fp.read()
+        finally:
+            fp.close()
+
+        return spec.origin, source, spec.submodule_search_locations is not None
+
+
 class PkgutilMethod(FinderMethod):
     """
     Attempt to fetch source code via pkgutil. In an ideal world, this would
@@ -774,6 +946,15 @@ class ParentImpEnumerationMethod(FinderMethod):
         return path, source, is_pkg
 
     def _find_one_component(self, modname, search_path):
+        if search_path is not None:
+            search_path = [
+                path for path in search_path
+                if _dir_cache.has_candidate(path, modname)
+            ]
+            if not search_path:
+                LOG.debug('%r: %r absent from search path', self, modname)
+                return None
+
         try:
             #fp, path, (suffix, _, kind) = imp.find_module(modname, search_path)
             # FIXME The imp module was removed in Python 3.12.
@@ -912,6 +1093,134 @@ class ParentSpecEnumerationMethod(ParentImpEnumerationMethod):
                          % (self.__class__.__name__, fullname))
 
 
+class ImportGraph(object):
+    """
+    Index of the modules each module imports, and of the modules reachable
+    from each module by following those imports.
+
+    Module names are interned as integers, and each module's direct imports
+    are stored as a tuple of integers, alongside the path, modification time
+    and size of the file they were scanned from. Transitive closures are
+    computed once and memoised. When a file changes, only that module's
+    imports are discarded, along with any closure that reached it.
+    """
+    def __init__(self):
+        #: Module name -> integer ID.
+        self._id_by_name = {}
+        #: Integer ID -> module name.
+        self._names = []
+        #: ID -> tuple of IDs imported by the module.
+        self._edges = {}
+        #: ID -> `(path, stat)` the edges were scanned from.
+        self._stamps = {}
+        #: ID -> frozenset of IDs reachable from the module, excluding itself.
+        self._closures = {}
+
+    def __repr__(self):
+        return 'ImportGraph(%d modules)' % (len(self._edges),)
+
+    def _intern(self, name):
+        i = self._id_by_name.get(name)
+        if i is None:
+            i = len(self._names)
+            self._id_by_name[name] = i
+            self._names.append(name)
+        return i
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return None
+        return st.st_mtime, st.st_size
+
+    def _is_stale_id(self, i):
+        path, stat = self._stamps[i]
+        return path is not None and self._stat(path) != stat
+
+    def is_stale(self, name):
+        """
+        Return :data:`True` if imports were recorded for `name`, but the file
+        they were scanned from has since changed.
+        """
+        i = self._id_by_name.get(name)
+        return i in self._stamps and self._is_stale_id(i)
+
+    def discard(self, name):
+        """
+        Forget the imports recorded for `name`, and every closure that
+        reached it.
+        """
+        i = self._id_by_name.get(name)
+        if i is None:
+            return
+        self._edges.pop(i, None)
+        self._stamps.pop(i, None)
+        for j, closure in list(self._closures.items()):
+            if j == i or i in closure:
+                del self._closures[j]
+
+    def get(self, name):
+        """
+        Return the list of names recorded by :meth:`add` for `name`, or
+        :data:`None` if none were recorded.
+        """
+        edges = self._edges.get(self._id_by_name.get(name))
+        if edges is not None:
+            return [self._names[j] for j in edges]
+
+    def add(self, name, path, names):
+        """
+        Record that the module `name`, scanned from the file `path`, imports
+        each module in `names`.
+        """
+        edges = tuple(self._intern(n) for n in names)
+        i = self._intern(name)
+        if self._edges.get(i) != edges:
+            self.discard(name)
+            self._edges[i] = edges
+        self._stamps[i] = (path, self._stat(path))
+
+    def _is_valid_closure(self, closure):
+        for j in closure:
+            if j not in self._stamps or self._is_stale_id(j):
+                return False
+        return True
+
+    def closure(self, name, get_imports):
+        """
+        Return a sorted list of module names reachable from `name`, excluding
+        `name` itself.
+
+        :param get_imports:
+            Function called with a module name for every module visited, that
+            returns its list of direct imports, usually after consulting
+            :meth:`get` and scanning the module with :meth:`add` if needed.
+        """
+        start = self._intern(name)
+        closure = self._closures.get(start)
+        if closure is not None and self._is_valid_closure(closure):
+            return sorted(self._names[j] for j in closure)
+
+        seen = set([start])
+        queue = [start]
+        for i in queue:
+            memo = self._closures.get(i)
+            if i != start and memo is not None \
+                    and self._is_valid_closure(memo):
+                seen.update(memo)
+                continue
+            for imported in get_imports(self._names[i]):
+                j = self._intern(imported)
+                if j not in seen:
+                    seen.add(j)
+                    queue.append(j)
+
+        seen.discard(start)
+        self._closures[start] = frozenset(seen)
+        return sorted(self._names[j] for j in seen)
+
+
 class ModuleFinder(object):
     """
     Given the name of a loaded module, make a best-effort attempt at finding
@@ -924,7 +1233,11 @@ class ModuleFinder(object):
         self._found_cache = {}
 
         #: Avoid repeated dependency scanning, which is expensive.
-        self._related_cache = {}
+        self._import_graph = ImportGraph()
+
+        #: Names installed by :meth:`add_source_override`, whose source must
+        #: never be looked up again.
+        self._overridden = set()
 
     def __repr__(self):
         return 'ModuleFinder()'
@@ -947,9 +1260,12 @@ class ModuleFinder(object):
             :data:`True` if the module is a package.
         """
         self._found_cache[fullname] = (path, source, is_pkg)
+        self._overridden.add(fullname)
+        self._import_graph.discard(fullname)
 
     get_module_methods = [
         DefectivePython3xMainMethod(),
+        SysModulesSpecMethod(),
         PkgutilMethod(),
         SysModulesMethod(),
         ParentSpecEnumerationMethod(),
@@ -1018,12 +1334,19 @@ class ModuleFinder(object):
             for which source code can be retrieved
         :type fullname: str
         """
-        related = self._related_cache.get(fullname)
+        graph = self._import_graph
+        if graph.is_stale(fullname):
+            graph.discard(fullname)
+            if fullname not in self._overridden:
+                self._found_cache.pop(fullname, None)
+
+        related = graph.get(fullname)
         if related is not None:
             return related
 
         modpath, src, _ = self.get_module_source(fullname)
         if src is None:
+            graph.add(fullname, modpath, [])
             return []
 
         maybe_names = list(self.generate_parent_names(fullname))
@@ -1044,7 +1367,7 @@ class ModuleFinder(object):
                 for name in namelist
             )
 
-        return self._related_cache.setdefault(fullname, sorted(
+        related = sorted(
             set(
                 mitogen.core.to_text(name)
                 for name in maybe_names
@@ -1052,7 +1375,9 @@ class ModuleFinder(object):
                 and not is_stdlib_name(name)
                 and u'six.moves' not in name  # TODO: crap
             )
-        ))
+        )
+        graph.add(fullname, modpath, related)
+        return related
 
     def find_related(self, fullname):
         """
@@ -1066,20 +1391,62 @@ class ModuleFinder(object):
             for which source code can be retrieved
         :type fullname: str
         """
-        stack = [fullname]
-        found = set()
+        return self._import_graph.closure(fullname, self.find_related_imports)
 
-        while stack:
-            name = stack.pop(0)
-            names = self.find_related_imports(name)
-            stack.extend(set(names).difference(set(found).union(stack)))
-            found.update(names)
 
-        found.discard(fullname)
-        return sorted(found)
+class LruCache(object):
+    """
+    Mapping holding at most `size` items, discarding the least recently used
+    item to make room for a new one. Safe to use from any thread.
+    """
+    def __init__(self, size):
+        #: Maximum number of items.
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = {}
+        #: Keys, least recently used first.
+        self._order = []
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        self._lock.acquire()
+        try:
+            return iter(list(self._order))
+        finally:
+            self._lock.release()
+
+    def get(self, key, default=None):
+        self._lock.acquire()
+        try:
+            try:
+                value = self._items[key]
+            except KeyError:
+                return default
+            self._order.remove(key)
+            self._order.append(key)
+            return value
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        self._lock.acquire()
+        try:
+            if key in self._items:
+                self._order.remove(key)
+            elif len(self._order) >= self.size:
+                del self._items[self._order.pop(0)]
+            self._items[key] = value
+            self._order.append(key)
+        finally:
+            self._lock.release()
 
 
 class ModuleResponder(object):
+    #: Number of LOAD_MODULE_BUNDLE payloads kept for reuse.
+    bundle_cache_size = 64
+
     def __init__(self, router):
         self._log = logging.getLogger('mitogen.responder')
         self._router = router
@@ -1093,6 +1460,14 @@ class ModuleResponder(object):
 
         #: Number of GET_MODULE messages received.
         self.get_module_count = 0
+        #: Number of modules requested by GET_MODULE messages naming more
+        #: than one module, as sent by :meth:`mitogen.core.Importer.prefetch`.
+        self.prefetch_module_count = 0
+        #: Number of GET_MODULE requests children report not sending, since
+        #: the module was in the stdlib names from :meth:`get_stdlib_names`.
+        #: Children report it with their next request, so this undercounts:
+        #: requests avoided after a child's final GET_MODULE are not seen.
+        self.avoided_get_module_count = 0
         #: Total time spent in uncached GET_MODULE.
         self.get_module_secs = 0.0
         #: Total time spent minifying modules.
@@ -1103,6 +1478,43 @@ class ModuleResponder(object):
         self.good_load_module_size = 0
         #: Number of negative LOAD_MODULE messages sent.
         self.bad_load_module_count = 0
+        #: Number of LOAD_MODULE_BUNDLE messages sent.
+        self.load_module_bundle_count = 0
+        #: Number of GET_MODULE messages answered by the builder thread, since
+        #: some module they needed was not yet built.
+        self.deferred_get_module_count = 0
+
+        #: Serializes building of module tuples and payloads, which happens
+        #: on the builder thread, or threads calling :meth:`warm`.
+        self._build_lock = threading.Lock()
+        #: Latch of functions run by :attr:`_build_thread`, both created on
+        #: first use.
+        self._build_latch = None
+        self._build_thread = None
+
+        #: If :data:`True`, a module and the related modules sent with it are
+        #: packed into one :data:`mitogen.core.LOAD_MODULE_BUNDLE` message,
+        #: compressed as a single stream.
+        self.bundle_modules = True
+        #: `(tuple of module names, zdict?)` -> LOAD_MODULE_BUNDLE payload.
+        #: A new key may appear for every combination of modules children
+        #: already hold, so only the most recently used are kept.
+        self._bundle_cache = LruCache(self.bundle_cache_size)
+        #: fullname -> tuple compressed using :data:`mitogen.core.ZDICT`.
+        #: Like :attr:`_cache`, it is bounded by the number of modules.
+        self._zdict_cache = {}
+
+        #: Number of modules whose tuple was read from :attr:`cache_dir`.
+        self.module_cache_hit_count = 0
+        #: Number of modules built because :attr:`cache_dir` had no valid
+        #: entry for them.
+        self.module_cache_miss_count = 0
+
+        #: If not :data:`None`, directory where built module tuples are
+        #: persisted, so later processes can serve modules without
+        #: recompiling, scanning and compressing them again. Defaults to the
+        #: value of the ``MITOGEN_MODULE_CACHE`` environment variable.
+        self.cache_dir = os.environ.get('MITOGEN_MODULE_CACHE') or None
 
         router.add_handler(
             fn=self._on_get_module,
@@ -1112,6 +1524,18 @@ class ModuleResponder(object):
     def __repr__(self):
         return 'ModuleResponder'
 
+    _stdlib_names = None
+
+    def get_stdlib_names(self):
+        """
+        Return the names children receive as
+        :attr:`mitogen.core.Importer.stdlib_names`, since modules found beneath
+        them are refused by :meth:`_build_tuple`. Computed on first use.
+        """
+        if self._stdlib_names is None:
+            self._stdlib_names = stdlib_names()
+        return self._stdlib_names
+
     def add_source_override(self, fullname, path, source, is_pkg):
         """
         See :meth:`ModuleFinder.add_source_override`.
@@ -1157,6 +1581,126 @@ class ModuleResponder(object):
 
     minify_safe_re = re.compile(b(r'\s+#\s*!mitogen:\s*minify_safe'))
 
+    #: Incremented whenever the layout of :attr:`cache_dir` entries changes.
+    cache_format = 2
+
+    def _get_cache_path(self, fullname, path):
+        """
+        Return the :attr:`cache_dir` file for `fullname` found at `path`. The
+        name covers everything besides source files that influences the built
+        tuple, including where `fullname` currently resolves to, so an entry
+        is never served for a module now found elsewhere.
+        """
+        key = repr((
+            self.cache_format,
+            mitogen.__version__,
+            sys.version,
+            sys.executable,
+            sorted(self.blacklist),
+            sorted(self.whitelist),
+            to_text(fullname),
+            to_text(path),
+        ))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.cache')
+
+    def _stat_sources(self, paths):
+        """
+        Return a list of `(path, mtime, size)` for each path in `paths`.
+        """
+        stats = []
+        for path in paths:
+            st = os.stat(path)
+            stats.append((path, st.st_mtime, st.st_size))
+        return stats
+
+    def _use_cache(self, fullname):
+        """
+        Return :data:`True` if `fullname` may be read from or written to
+        :attr:`cache_dir`. The directory is created if missing, and ignored
+        unless it is owned by the current user and not writeable by others,
+        since entries read from it are served to children. Overridden modules
+        are never cached, so their override always wins.
+        """
+        if not self.cache_dir or fullname == '__main__':
+            return False
+        if fullname in self._finder._overridden:
+            return False
+
+        try:
+            os.makedirs(self.cache_dir, int('0700', 8))
+        except OSError:
+            if sys.exc_info()[1].args[0] != errno.EEXIST:
+                self._log.warning('cannot create module cache %r',
+                                  self.cache_dir)
+                return False
+
+        st = os.lstat(self.cache_dir)
+        if ((not stat.S_ISDIR(st.st_mode)) or st.st_uid != os.geteuid() or
+                st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+            self._log.warning('module cache %r is not private, ignoring',
+                              self.cache_dir)
+            return False
+        return True
+
+    def _load_cached_tuple(self, fullname):
+        """
+        Return the tuple for `fullname` stored in :attr:`cache_dir`, or
+        :data:`None` if it is missing, unreadable, or any source file it was
+        built from has since changed. Entries are :mod:`marshal` data, so
+        reading one never runs code.
+        """
+        path, _, _ = self._finder.get_module_source(fullname)
+        if not path:
+            return None
+
+        cache_path = self._get_cache_path(fullname, path)
+        try:
+            fp = open(cache_path, 'rb')
+            try:
+                stats, tup = marshal.load(fp)
+            finally:
+                fp.close()
+            if self._stat_sources([p for p, _, _ in stats]) != stats:
+                return None
+            fullname, pkg_present, path, compressed, related = tup
+        except Exception:
+            return None
+        return (fullname, pkg_present, path,
+                mitogen.core.Blob(compressed), related)
+
+    def _store_cached_tuple(self, tup):
+        """
+        Persist `tup` to :attr:`cache_dir`, recording the path, modification
+        time and size of the module and every related module, so that a
+        change to any of them invalidates the entry. Sources that do not exist
+        on disk, such as overrides, are not cached.
+        """
+        fullname, pkg_present, path, compressed, related = tup
+        paths = [path]
+        for name in related:
+            rpath, _, _ = self._finder.get_module_source(name)
+            if rpath:
+                paths.append(rpath)
+
+        cache_path = self._get_cache_path(fullname, path)
+        tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+        try:
+            stats = self._stat_sources(paths)
+            fp = open(tmp_path, 'wb')
+            try:
+                marshal.dump(
+                    (stats, (fullname, pkg_present, path,
+                             mitogen.core.BytesType(compressed), related)),
+                    fp
+                )
+            finally:
+                fp.close()
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError):
+            self._log.debug('cannot cache %r in %r', fullname, self.cache_dir,
+                            exc_info=True)
+
     def _build_tuple(self, fullname):
         if fullname in self._cache:
             return self._cache[fullname]
@@ -1164,10 +1708,20 @@ class ModuleResponder(object):
         if mitogen.core.is_blacklisted_import(self, fullname):
             raise ImportError('blacklisted')
 
+        use_cache = self._use_cache(fullname)
+        if use_cache:
+            tup = self._load_cached_tuple(fullname)
+            if tup is not None:
+                self.module_cache_hit_count += 1
+                self._cache[fullname] = tup
+                return tup
+            self.module_cache_miss_count += 1
+
         path, source, is_pkg = self._finder.get_module_source(fullname)
         if path and is_stdlib_path(path):
-            # Prevent loading of 2.x<->3.x stdlib modules! This costs one
-            # RTT per hit, so a client-side solution is also required.
+            # Prevent loading of 2.x<->3.x stdlib modules! Children refuse
+            # names in get_stdlib_names() themselves, so this is only reached
+            # for stdlib modules not found by it.
             self._log.debug('refusing to serve stdlib module %r', fullname)
             tup = self._make_negative_response(fullname)
             self._cache[fullname] = tup
@@ -1211,25 +1765,142 @@ class ModuleResponder(object):
             related
         )
         self._cache[fullname] = tup
+        if use_cache:
+            self._store_cached_tuple(tup)
         return tup
 
-    def _send_load_module(self, stream, fullname):
-        if fullname not in stream.protocol.sent_modules:
-            tup = self._build_tuple(fullname)
+    def _get_zdict_tuple(self, tup):
+        """
+        Return `tup` with its source recompressed using
+        :data:`mitogen.core.ZDICT`.
+        """
+        zdict_tup = self._zdict_cache.get(tup[0])
+        if zdict_tup is None:
+            compressed = mitogen.parent.zlib_compress(
+                zlib.decompress(tup[3]), zdict=True
+            )
+            zdict_tup = tup[:3] + (mitogen.core.Blob(compressed),) + tup[4:]
+            self._zdict_cache[tup[0]] = zdict_tup
+        return zdict_tup
+
+    def _get_tuple(self, fullname, build):
+        """
+        Return the tuple for `fullname`, building it if `build` is
+        :data:`True`, otherwise returning :data:`None` when it is not yet
+        built.
+        """
+        tup = self._cache.get(fullname)
+        if tup is None and build:
+            self._build_lock.acquire()
+            try:
+                tup = self._build_tuple(fullname)
+            finally:
+                self._build_lock.release()
+        return tup
+
+    def _get_bundle(self, tups, zdict, build):
+        names = tuple(tup[0] for tup in tups)
+        payload = self._bundle_cache.get((names, zdict))
+        if payload is None and build:
+            self._build_lock.acquire()
+            try:
+                payload = self._bundle_cache.get((names, zdict))
+                if payload is None:
+                    sources = [tup[3] and zlib.decompress(tup[3])
+                               for tup in tups]
+                    payload = mitogen.parent.pack_module_bundle(
+                        tups, sources, zdict
+                    )
+                    self._bundle_cache[(names, zdict)] = payload
+            finally:
+                self._build_lock.release()
+        return payload
+
+    def _get_zdict(self, tup, build):
+        zdict_tup = self._zdict_cache.get(tup[0])
+        if zdict_tup is None and build:
+            self._build_lock.acquire()
+            try:
+                zdict_tup = self._get_zdict_tuple(tup)
+            finally:
+                self._build_lock.release()
+        return zdict_tup
+
+    def _plan(self, fullname, sent_modules, zdict, build):
+        """
+        Return a list of `(handle, tups, payload)` describing the messages
+        that deliver `fullname`, and any related modules absent from
+        `sent_modules` whose parents are present.
+
+        :param bool build:
+            If :data:`False`, return :data:`None` rather than build any tuple
+            or payload that is not already cached. The broker thread never
+            builds, so a slow module cannot stall IO for every stream.
+        """
+        tup = self._get_tuple(fullname, build)
+        if tup is None:
+            return None
+
+        names = []
+        for name in tup[4]:  # related
+            parent, _, _ = str_partition(name, '.')
+            if parent != fullname and parent not in sent_modules \
+                    and parent not in names:
+                # Parent hasn't been sent, so don't load submodule yet.
+                continue
+            if name not in sent_modules and name not in names:
+                names.append(name)
+        names.append(fullname)
+
+        tups = []
+        for name in names:
+            tup = self._get_tuple(name, build)
+            if tup is None:
+                return None
+            tups.append(tup)
+
+        if self.bundle_modules and len(tups) > 1:
+            payload = self._get_bundle(tups, zdict, build)
+            if payload is None:
+                return None
+            return [(mitogen.core.LOAD_MODULE_BUNDLE, tups, payload)]
+
+        plan = []
+        for tup in tups:
+            payload = tup
+            if tup[3] is not None and zdict:
+                payload = self._get_zdict(tup, build)
+                if payload is None:
+                    return None
+            plan.append((mitogen.core.LOAD_MODULE, [tup], payload))
+        return plan
+
+    def _send_plan(self, stream, plan):
+        for handle, tups, payload in plan:
             msg = mitogen.core.Message.pickled(
-                tup,
+                payload,
                 dst_id=stream.protocol.remote_id,
-                handle=mitogen.core.LOAD_MODULE,
+                handle=handle,
             )
-            self._log.debug('sending %s (%.2f KiB) to %s',
-                            fullname, len(msg.data) / 1024.0, stream.name)
             self._router._async_route(msg)
-            stream.protocol.sent_modules.add(fullname)
-            if tup[2] is not None:
-                self.good_load_module_count += 1
+            stream.protocol.sent_modules.update(tup[0] for tup in tups)
+            if handle == mitogen.core.LOAD_MODULE_BUNDLE:
+                self._log.debug('sending bundle of %d modules (%.2f KiB) '
+                                'to %s', len(tups), len(msg.data) / 1024.0,
+                                stream.name)
+                self.load_module_bundle_count += 1
                 self.good_load_module_size += len(msg.data)
             else:
-                self.bad_load_module_count += 1
+                self._log.debug('sending %s (%.2f KiB) to %s', tups[0][0],
+                                len(msg.data) / 1024.0, stream.name)
+                if tups[0][2] is not None:
+                    self.good_load_module_size += len(msg.data)
+
+            for tup in tups:
+                if tup[2] is not None:
+                    self.good_load_module_count += 1
+                else:
+                    self.bad_load_module_count += 1
 
     def _send_module_load_failed(self, stream, fullname):
         self.bad_load_module_count += 1
@@ -1241,23 +1912,104 @@ class ModuleResponder(object):
             )
         )
 
-    def _send_module_and_related(self, stream, fullname):
+    def _send_module_and_related(self, stream, fullname, build=True):
+        """
+        Send `fullname` and its related modules to `stream`, or a negative
+        reply if that fails.
+
+        :returns:
+            :data:`False` if `build` is :data:`False` and something must be
+            built first, otherwise :data:`True`.
+        """
         if fullname in stream.protocol.sent_modules:
-            return
+            return True
 
         try:
-            tup = self._build_tuple(fullname)
-            for name in tup[4]:  # related
-                parent, _, _ = str_partition(name, '.')
-                if parent != fullname and parent not in stream.protocol.sent_modules:
-                    # Parent hasn't been sent, so don't load submodule yet.
-                    continue
-
-                self._send_load_module(stream, name)
-            self._send_load_module(stream, fullname)
+            plan = self._plan(fullname, stream.protocol.sent_modules,
+                              mitogen.parent.uses_zdict(stream), build)
+            if plan is None:
+                return False
+            self._send_plan(stream, plan)
         except Exception:
             LOG.debug('While importing %r', fullname, exc_info=True)
             self._send_module_load_failed(stream, fullname)
+        return True
+
+    def _start_builder(self):
+        self._build_latch = mitogen.core.Latch()
+        self._build_thread = threading.Thread(
+            name='mitogen.master.ModuleResponder',
+            target=self._builder_main,
+        )
+        self._build_thread.daemon = True
+        self._build_thread.start()
+        mitogen.core.listen(self._router.broker, 'shutdown',
+                            self._build_latch.close)
+        mitogen.core.listen(self._router.broker, 'exit',
+                            self._build_thread.join)
+
+    def _builder_main(self):
+        while True:
+            try:
+                func = self._build_latch.get()
+            except mitogen.core.LatchError:
+                return
+            try:
+                func()
+            except Exception:
+                LOG.exception('%r: module build failed', self)
+
+    def _build_and_send(self, stream, fullnames, sent_modules, zdict, after):
+        """
+        Run on the builder thread: build everything needed to send
+        `fullnames` to `stream`, then have the broker thread send it.
+        """
+        t0 = mitogen.core.now()
+        failed = set()
+        for fullname in fullnames:
+            if fullname in sent_modules:
+                continue
+            try:
+                plan = self._plan(fullname, sent_modules, zdict, build=True)
+            except Exception:
+                LOG.debug('While importing %r', fullname, exc_info=True)
+                failed.add(fullname)
+                continue
+            for _, tups, _ in plan:
+                sent_modules.update(tup[0] for tup in tups)
+        self.get_module_secs += mitogen.core.now() - t0
+        self._router.broker.defer(self._send_built, stream, fullnames,
+                                  failed, after)
+
+    def _send_built(self, stream, fullnames, failed, after):
+        if self._router.stream_by_id(stream.protocol.remote_id) is not stream:
+            self._log.debug('%s disconnected before its modules were built',
+                            stream.name)
+            return
+        self._send_or_defer(stream, fullnames, failed, after)
+
+    def _send_or_defer(self, stream, fullnames, failed=(), after=None):
+        """
+        Run on the broker thread: send each of `fullnames` and its related
+        modules to `stream`, or a negative reply for those in `failed`,
+        calling `after` with each name once it is sent. Modules not yet built,
+        and those following them, are handed to the builder thread, which
+        calls this again once they are built.
+
+        :returns:
+            :data:`False` if the builder thread was needed.
+        """
+        for i, fullname in enumerate(fullnames):
+            if fullname in failed:
+                if fullname not in stream.protocol.sent_modules:
+                    self._send_module_load_failed(stream, fullname)
+            elif not self._send_module_and_related(stream, fullname,
+                                                   build=False):
+                self._defer_build(stream, fullnames[i:], after)
+                return False
+            if after is not None:
+                after(fullname)
+        return True
 
     def _on_get_module(self, msg):
         if msg.is_dead:
@@ -1267,19 +2019,62 @@ class ModuleResponder(object):
         if stream is None:
             return
 
-        fullname = msg.data.decode()
-        self._log.debug('%s requested module %s', stream.name, fullname)
+        fullnames, zdict_version, avoided = \
+            mitogen.parent.parse_get_module(msg.data)
+        stream.protocol.zdict_version = zdict_version
+        self.avoided_get_module_count += \
+            mitogen.parent.note_avoided_get_module(stream, avoided)
+        self._log.debug('%s requested module %s',
+                        stream.name, ', '.join(fullnames))
         self.get_module_count += 1
-        if fullname in stream.protocol.sent_modules:
-            LOG.warning('_on_get_module(): dup request for %r from %r',
-                        fullname, stream)
+        if len(fullnames) > 1:
+            self.prefetch_module_count += len(fullnames)
 
         t0 = mitogen.core.now()
         try:
-            self._send_module_and_related(stream, fullname)
+            for fullname in fullnames:
+                if fullname in stream.protocol.sent_modules:
+                    LOG.warning('_on_get_module(): dup request for %r from %r',
+                                fullname, stream)
+            if not self._send_or_defer(stream, fullnames):
+                self.deferred_get_module_count += 1
         finally:
             self.get_module_secs += mitogen.core.now() - t0
 
+    def _defer_build(self, stream, fullnames, after):
+        if self._build_latch is None:
+            self._start_builder()
+        self._build_latch.put(lambda: self._build_and_send(
+            stream, fullnames, set(stream.protocol.sent_modules),
+            mitogen.parent.uses_zdict(stream), after,
+        ))
+
+    def warm(self, fullnames):
+        """
+        Build the tuples for `fullnames` and their related modules, so the
+        first request for them needs no compilation, scanning or compression.
+        Bundles are still built on first use, by the builder thread. May be
+        called from any thread except the broker thread, and is slow.
+
+        :returns:
+            Number of module tuples built or found in cache.
+        """
+        seen = set()
+        names = list(fullnames)
+        for name in names:
+            if name in seen:
+                continue
+            try:
+                tup = self._get_tuple(name, build=True)
+                if tup[3] is not None and mitogen.core.ZDICT_SUPPORTED:
+                    self._get_zdict(tup, build=True)
+            except Exception:
+                LOG.debug('%r: cannot warm %r', self, name, exc_info=True)
+                continue
+            seen.add(name)
+            names.extend(tup[4])
+        return len(seen)
+
     def _send_forward_module(self, stream, context, fullname):
         if stream.protocol.remote_id != context.context_id:
             stream.protocol._send(
@@ -1310,9 +2105,12 @@ class ModuleResponder(object):
                       '%r', self, path[0], context)
             return
 
-        for fullname in reversed(path):
-            self._send_module_and_related(stream, fullname)
-            self._send_forward_module(stream, context, fullname)
+        self._send_or_defer(
+            stream, list(reversed(path)),
+            after=lambda fullname: self._send_forward_module(
+                stream, context, fullname
+            ),
+        )
 
     def _forward_modules(self, context, fullnames):
         IOLOG.debug('%r._forward_modules(%r, %r)', self, context, fullnames)
@@ -1320,7 +2118,22 @@ class ModuleResponder(object):
             self._forward_one_module(context, mitogen.core.to_text(fullname))
 
     def forward_modules(self, context, fullnames):
-        self._router.broker.defer(self._forward_modules, context, fullnames)
+        """
+        Arrange for `fullnames` to be sent to `context` without waiting for it
+        to request them. When called from a thread other than the broker
+        thread, their tuples are built in the calling thread first. Anything
+        else is built by the builder thread.
+        """
+        broker = self._router.broker
+        if mitogen.core.threading__current_thread() is not broker._thread:
+            names = []
+            for fullname in fullnames:
+                fullname = mitogen.core.to_text(fullname)
+                while fullname:
+                    names.append(fullname)
+                    fullname, _, _ = str_rpartition(fullname, u'.')
+            self.warm(names)
+        broker.defer(self._forward_modules, context, fullnames)
 
 
 class Broker(mitogen.core.Broker):
@@ -1343,18 +2156,23 @@ class Broker(mitogen.core.Broker):
         intended as a fail-safe and to simplify the API for new users. In
         particular, alternative Python implementations may not be able to
         support watching the main thread.
+
+    :param type poller_class:
+        If not :data:`None`, the :class:`mitogen.core.Poller` subclass to use
+        instead of :attr:`poller_class`, for example
+        :class:`mitogen.parent.EdgeEpollPoller`.
     """
     shutdown_timeout = 5.0
     _watcher = None
     poller_class = mitogen.parent.PREFERRED_POLLER
 
-    def __init__(self, install_watcher=True):
+    def __init__(self, install_watcher=True, poller_class=None):
         if install_watcher:
             self._watcher = ThreadWatcher.watch(
                 target=mitogen.core.threading__current_thread(),
                 on_join=self.shutdown,
             )
-        super(Broker, self).__init__()
+        super(Broker, self).__init__(poller_class=poller_class)
         self.timers = mitogen.parent.TimerList()
 
     def shutdown(self):
@@ -1443,13 +2261,15 @@ class Router(mitogen.parent.Router):
                 '(%(minify_ms)d ms minify time), '
                 '%(bad_load_module_count)d negative responses. '
                 'Sent %(good_load_module_size_kb).01f kb total, '
-                '%(good_load_module_size_avg).01f kb avg.'
+                '%(good_load_module_size_avg).01f kb avg. '
+                '%(writev_saved_count)d write calls saved by '
+                '%(writev_count)d vectored writes.'
             % dct
         )
 
     def get_stats(self):
         """
-        Return performance data for the module responder.
+        Return performance data for the module responder and broker.
 
         :returns:
 
@@ -1459,6 +2279,15 @@ class Router(mitogen.parent.Router):
               :data:`mitogen.core.GET_MODULE` messages received.
             * `get_module_secs`: Floating point total seconds spent servicing
               :data:`mitogen.core.GET_MODULE` requests.
+            * `prefetch_module_count`: Integer count of modules requested by
+              :data:`mitogen.core.GET_MODULE` messages naming more than one
+              module.
+            * `avoided_get_module_count`: Integer count of
+              :data:`mitogen.core.GET_MODULE` requests children reported not
+              sending for standard library modules, as of their latest
+              request. This is a lower bound, since a child reports its count
+              only by piggybacking it on its next request, and requests it
+              avoids after its last one are never reported.
             * `good_load_module_count`: Integer count of successful
               :data:`mitogen.core.LOAD_MODULE` messages sent.
             * `good_load_module_size`: Integer total bytes sent in
@@ -1467,14 +2296,42 @@ class Router(mitogen.parent.Router):
               :data:`mitogen.core.LOAD_MODULE` messages sent.
             * `minify_secs`: CPU seconds spent minifying modules marked
                minify-safe.
+            * `load_module_bundle_count`: Integer count of
+              :data:`mitogen.core.LOAD_MODULE_BUNDLE` messages sent. Modules
+              they carried are included in the counts above.
+            * `deferred_get_module_count`: Integer count of
+              :data:`mitogen.core.GET_MODULE` messages answered after building
+              modules on the builder thread, rather than from cache on the
+              broker thread.
+            * `module_cache_hit_count`: Integer count of modules served from
+              the persistent :attr:`ModuleResponder.cache_dir`.
+            * `module_cache_miss_count`: Integer count of modules that had to
+              be built because the persistent cache had no valid entry.
+            * `writev_count`: Integer count of :func:`os.writev` calls made
+              by batched :class:`mitogen.core.BufferedWriter` instances.
+            * `writev_saved_count`: Integer count of write system calls saved
+              by coalescing buffers into those calls.
         """
         return {
             'get_module_count': self.responder.get_module_count,
             'get_module_secs': self.responder.get_module_secs,
+            'prefetch_module_count': self.responder.prefetch_module_count,
+            'avoided_get_module_count':
+                self.responder.avoided_get_module_count,
             'good_load_module_count': self.responder.good_load_module_count,
             'good_load_module_size': self.responder.good_load_module_size,
             'bad_load_module_count': self.responder.bad_load_module_count,
+            'load_module_bundle_count':
+                self.responder.load_module_bundle_count,
+            'deferred_get_module_count':
+                self.responder.deferred_get_module_count,
+            'module_cache_hit_count': self.responder.module_cache_hit_count,
+            'module_cache_miss_count': self.responder.module_cache_miss_count,
             'minify_secs': self.responder.minify_secs,
+            'writev_count': self.broker.writev_count,
+            'writev_saved_count': max(0,
+                self.broker.writev_buffer_count - self.broker.writev_count
+            ),
         }
 
     def enable_debug(self):
@@ -1091,6 +1091,155 @@ class EpollPoller(mitogen.core.Poller):
                     yield data
 
 
+class EdgeEpollPoller(mitogen.core.Poller):
+    """
+    Poller based on the Linux :linux:man7:`epoll` interface in edge-triggered
+    mode. Each FD is registered once for both directions when it first
+    becomes of interest, and stays registered until it is of interest in
+    neither direction. Rather than modifying the kernel registration on every
+    :meth:`start_transmit` and :meth:`stop_transmit` like
+    :class:`EpollPoller`, readiness is tracked in userspace:
+
+    * An edge reported by the kernel marks the FD ready in that direction,
+      whether or not the direction is currently of interest.
+    * An FD stays ready until a read or write on its
+      :class:`mitogen.core.Side` is short (see
+      :attr:`mitogen.core.Side.short_io`), meaning the kernel buffer was
+      drained or filled, and another edge will be reported once that
+      changes. A ready FD is yielded again by the next :meth:`poll` without
+      any system call other than a non-blocking :func:`select.epoll.poll`.
+    * :meth:`start_transmit` after a short write waits for the next edge;
+      after a complete write it yields the FD immediately.
+
+    This relies on :class:`mitogen.core.Broker` registering `(side, func)`
+    tuples, and on readers treating :data:`errno.EAGAIN` as a short read like
+    :meth:`mitogen.core.Stream.on_receive` does. Any other `data`, or a side
+    that has not yet transferred any data, is re-armed after every event,
+    behaving like a level-triggered poller. Events are collected when
+    :meth:`poll` is called and interest is checked again before each is
+    yielded, so no generation counter is needed.
+    """
+    SUPPORTED = hasattr(select, 'epoll') and hasattr(select, 'EPOLLET')
+    _inmask = SUPPORTED and select.EPOLLIN | select.EPOLLHUP | select.EPOLLERR
+    _outmask = SUPPORTED and (select.EPOLLOUT | select.EPOLLHUP |
+                              select.EPOLLERR)
+    _mask = SUPPORTED and select.EPOLLIN | select.EPOLLOUT | select.EPOLLET
+
+    def __init__(self):
+        super(EdgeEpollPoller, self).__init__()
+        self._epoll = select.epoll(32)
+        self._registered = set()
+        self._readable = set()
+        self._writable = set()
+
+    def close(self):
+        super(EdgeEpollPoller, self).close()
+        self._epoll.close()
+
+    @property
+    def readers(self):
+        return list(self._rfds.items())
+
+    @property
+    def writers(self):
+        return list(self._wfds.items())
+
+    def _control(self, fd):
+        mitogen.core._vv and IOLOG.debug('%r._control(%r)', self, fd)
+        if fd in self._registered:
+            self._epoll.modify(fd, self._mask)
+        else:
+            self._epoll.register(fd, self._mask)
+            self._registered.add(fd)
+
+    def _is_short(self, data):
+        try:
+            return data[0].short_io
+        except (TypeError, IndexError, AttributeError):
+            return None
+
+    def _start(self, fd, data, fds, ready):
+        fds[fd] = data
+        if fd not in self._registered:
+            self._control(fd)
+        elif self._is_short(data):
+            ready.discard(fd)
+
+    def _stop(self, fd, fds):
+        fds.pop(fd, None)
+        if fd in self._registered and fd not in self._rfds and \
+                fd not in self._wfds:
+            self._registered.discard(fd)
+            self._readable.discard(fd)
+            self._writable.discard(fd)
+            self._epoll.unregister(fd)
+
+    def start_receive(self, fd, data=None):
+        mitogen.core._vv and IOLOG.debug('%r.start_receive(%r, %r)',
+            self, fd, data)
+        self._start(fd, data or fd, self._rfds, self._readable)
+
+    def stop_receive(self, fd):
+        mitogen.core._vv and IOLOG.debug('%r.stop_receive(%r)', self, fd)
+        self._stop(fd, self._rfds)
+
+    def start_transmit(self, fd, data=None):
+        mitogen.core._vv and IOLOG.debug('%r.start_transmit(%r, %r)',
+            self, fd, data)
+        self._start(fd, data or fd, self._wfds, self._writable)
+
+    def stop_transmit(self, fd):
+        mitogen.core._vv and IOLOG.debug('%r.stop_transmit(%r)', self, fd)
+        self._stop(fd, self._wfds)
+
+    def _yield_ready(self, ready, fds, rearm):
+        for fd in [fd for fd in ready if fd in fds]:
+            data = fds.get(fd)
+            if fd not in ready or data is None:
+                continue
+            yield data
+            short = self._is_short(data)
+            if short is None:
+                ready.discard(fd)
+                rearm.add(fd)
+            elif short and fds.get(fd) is data:
+                ready.discard(fd)
+
+    def _poll(self):
+        rearm = set()
+        for data in self._yield_ready(self._readable, self._rfds, rearm):
+            mitogen.core._vv and IOLOG.debug('%r: POLLIN: %r', self, data)
+            yield data
+        for data in self._yield_ready(self._writable, self._wfds, rearm):
+            mitogen.core._vv and IOLOG.debug('%r: POLLOUT: %r', self, data)
+            yield data
+        for fd in rearm:
+            if fd in self._registered:
+                self._control(fd)
+
+    def _has_ready(self):
+        for ready, fds in ((self._readable, self._rfds),
+                           (self._writable, self._wfds)):
+            for fd in ready:
+                if fd in fds:
+                    return True
+        return False
+
+    def poll(self, timeout=None):
+        mitogen.core._vv and IOLOG.debug('%r.poll(%r)', self, timeout)
+        if self._has_ready():
+            timeout = 0
+        elif timeout is None:
+            timeout = -1
+        events, _ = mitogen.core.io_op(self._epoll.poll, timeout, 32)
+        for fd, event in events:
+            if event & self._inmask:
+                self._readable.add(fd)
+            if event & self._outmask:
+                self._writable.add(fd)
+        return self._poll()
+
+
 POLLERS = (EpollPoller, KqueuePoller, PollPoller, mitogen.core.Poller)
 PREFERRED_POLLER = next(cls for cls in POLLERS if cls.SUPPORTED)
 
@@ -1496,7 +1645,9 @@ class Connection(object):
             'log_level': get_log_level(),
             'whitelist': self._router.get_module_whitelist(),
             'blacklist': self._router.get_module_blacklist(),
+            'stdlib_names': self._router.get_stdlib_names(),
             'max_message_size': self.options.max_message_size,
+            'tlv_codec': mitogen.core.Message.codec is mitogen.core.TlvCodec,
             'version': mitogen.__version__,
         }
 
@@ -2225,7 +2376,9 @@ class RouteMonitor(object):
         if msg.is_dead:
             return
 
-        target_id_s, _, target_name = bytes_partition(msg.data, b(':'))
+        target_id_s, _, target_name = bytes_partition(
+            mitogen.core.BytesType(msg.data), b(':')
+        )
         target_name = target_name.decode()
         target_id = int(target_id_s)
         self.router.context_by_id(target_id).name = target_name
@@ -2252,7 +2405,7 @@ class RouteMonitor(object):
         if msg.is_dead:
             return
 
-        target_id = int(msg.data)
+        target_id = int(mitogen.core.BytesType(msg.data))
         registered_stream = self.router.stream_by_id(target_id)
         if registered_stream is None:
             return
@@ -2405,6 +2558,11 @@ class Router(mitogen.core.Router):
             return self.responder.whitelist
         return self.importer.master_whitelist
 
+    def get_stdlib_names(self):
+        if mitogen.context_id == 0:
+            return self.responder.get_stdlib_names()
+        return sorted(self.importer.stdlib_names)
+
     def allocate_id(self):
         return self.id_allocator.allocate()
 
@@ -2693,6 +2851,87 @@ class PopenProcess(Process):
         self.proc.send_signal(sig)
 
 
+def zlib_compress(data, zdict=False):
+    """
+    Compress `data` at level 9, using :data:`mitogen.core.ZDICT` as a preset
+    dictionary if `zdict` is :data:`True`.
+    """
+    if not zdict:
+        return zlib.compress(data, 9)
+    obj = zlib.compressobj(9, zdict=mitogen.core.ZDICT)
+    return obj.compress(data) + obj.flush()
+
+
+def uses_zdict(stream):
+    """
+    Return :data:`True` if module sources sent on `stream` should be
+    compressed using :data:`mitogen.core.ZDICT`.
+    """
+    return (mitogen.core.ZDICT_SUPPORTED and
+            stream.protocol.zdict_version == mitogen.core.ZDICT_VERSION)
+
+
+def parse_get_module(data):
+    """
+    Return `(fullnames, zdict_version, avoided_count)` from the body of a
+    :data:`mitogen.core.GET_MODULE` message, where `fullnames` is the list of
+    requested module names. More than one name is present when the request
+    was sent by :meth:`mitogen.core.Importer.prefetch`.
+    """
+    names, _, rest = bytes_partition(
+        mitogen.core.BytesType(data), b('\x00')
+    )
+    version, _, avoided = bytes_partition(rest, b('\x00'))
+    return (
+        names.decode('utf-8').split(u'\n'),
+        int(version or 0),
+        int(avoided or 0),
+    )
+
+
+def note_avoided_get_module(stream, count):
+    """
+    Record `count`, the :attr:`mitogen.core.Importer.avoided_get_module_count`
+    reported in a request received on `stream`, and return how much it grew
+    since the previous request.
+    """
+    if not count:
+        return 0
+    delta = max(0, count - stream.protocol.avoided_get_module_count)
+    stream.protocol.avoided_get_module_count = count
+    return delta
+
+
+def pack_module_bundle(tups, sources, zdict=False):
+    """
+    Return the `(entries, compressed)` payload of a
+    :data:`mitogen.core.LOAD_MODULE_BUNDLE` message.
+
+    :param list tups:
+        Module tuples as sent in :data:`mitogen.core.LOAD_MODULE`, in the
+        order the child should install them.
+    :param list sources:
+        Undecoded source of each module in `tups`, or :data:`None` for
+        negative responses.
+    :param bool zdict:
+        If :data:`True`, compress using :data:`mitogen.core.ZDICT`.
+    :returns:
+        `entries` is a list of `(fullname, pkg_present, path, size, related)`
+        tuples, where `size` is the length of the module's source within the
+        single :mod:`zlib` stream `compressed`.
+    """
+    entries = []
+    present = []
+    for tup, source in zip(tups, sources):
+        size = 0
+        if tup[2] is not None:
+            size = len(source)
+            present.append(source)
+        entries.append((tup[0], tup[1], tup[2], size, tup[4]))
+    compressed = zlib_compress(b('').join(present), zdict)
+    return entries, mitogen.core.Blob(compressed)
+
+
 class ModuleForwarder(object):
     """
     Respond to :data:`mitogen.core.GET_MODULE` requests in a child by
@@ -2723,7 +2962,9 @@ class ModuleForwarder(object):
         if msg.is_dead:
             return
 
-        context_id_s, _, fullname = bytes_partition(msg.data, b('\x00'))
+        context_id_s, _, fullname = bytes_partition(
+            mitogen.core.BytesType(msg.data), b('\x00')
+        )
         fullname = mitogen.core.to_text(fullname)
         context_id = int(context_id_s)
         stream = self.router.stream_by_id(context_id)
@@ -2751,8 +2992,22 @@ class ModuleForwarder(object):
         if msg.is_dead:
             return
 
-        fullname = msg.data.decode('utf-8')
-        LOG.debug('%r: %s requested by context %d', self, fullname, msg.src_id)
+        fullnames, zdict_version, avoided = parse_get_module(msg.data)
+        LOG.debug('%r: %s requested by context %d',
+                  self, ', '.join(fullnames), msg.src_id)
+        stream = self.router.stream_by_id(msg.src_id)
+        if stream is not None:
+            stream.protocol.zdict_version = zdict_version
+            # Fold the child's count into ours, so the master hears of it.
+            self.importer.avoided_get_module_count += \
+                note_avoided_get_module(stream, avoided)
+        if len(fullnames) > 1:
+            # Keep the batch intact on its way to the master.
+            self.importer.prefetch(fullnames)
+        for fullname in fullnames:
+            self._request_module(msg, fullname)
+
+    def _request_module(self, msg, fullname):
         callback = lambda: self._on_cache_callback(msg, fullname)
         self.importer._request_module(fullname, callback)
 
@@ -2763,23 +3018,41 @@ class ModuleForwarder(object):
 
     def _send_module_and_related(self, stream, fullname):
         tup = self.importer._cache[fullname]
+        tups = []
         for related in tup[4]:
             rtup = self.importer._cache.get(related)
             if rtup:
-                self._send_one_module(stream, rtup)
+                tups.append(rtup)
             else:
                 LOG.debug('%r: %s not in cache (for %s)',
                           self, related, fullname)
+        tups.append(tup)
 
-        self._send_one_module(stream, tup)
+        sent_modules = stream.protocol.sent_modules
+        tups = [t for t in tups if t[0] not in sent_modules]
+        for t in tups:
+            sent_modules.add(t[0])
+
+        if len(tups) == 1 and tups[0][0] not in self.importer._uncompressed:
+            self._send_one_module(stream, tups[0])
+        elif tups:
+            self._send_bundle(stream, tups)
 
     def _send_one_module(self, stream, tup):
-        if tup[0] not in stream.protocol.sent_modules:
-            stream.protocol.sent_modules.add(tup[0])
-            self.router._async_route(
-                mitogen.core.Message.pickled(
-                    tup,
-                    dst_id=stream.protocol.remote_id,
-                    handle=mitogen.core.LOAD_MODULE,
-                )
+        self.router._async_route(
+            mitogen.core.Message.pickled(
+                tup,
+                dst_id=stream.protocol.remote_id,
+                handle=mitogen.core.LOAD_MODULE,
             )
+        )
+
+    def _send_bundle(self, stream, tups):
+        sources = [self.importer.get_source_bytes(tup[0]) for tup in tups]
+        self.router._async_route(
+            mitogen.core.Message.pickled(
+                pack_module_bundle(tups, sources, uses_zdict(stream)),
+                dst_id=stream.protocol.remote_id,
+                handle=mitogen.core.LOAD_MODULE_BUNDLE,
+            )
+        )
@@ -36,6 +36,7 @@ import pwd
 import stat
 import sys
 import threading
+import zlib
 
 import mitogen.core
 import mitogen.select
@@ -660,15 +661,71 @@ class Pool(object):
         )
 
 
+class FileJob(object):
+    """
+    A transfer in progress by :class:`FileService`.
+    """
+    def __init__(self, sender, fp, size, priority=1, raw=False):
+        #: :class:`mitogen.core.Sender` receiving the file's chunks.
+        self.sender = sender
+        #: If :data:`True`, chunks are sent as raw message data, otherwise as
+        #: pickled :class:`mitogen.core.Blob`.
+        self.raw = raw
+        #: File being read.
+        self.fp = fp
+        #: Bytes not yet sent, according to the size at :meth:`fetch` time.
+        self.remaining = size
+        #: Positive integer share of the stream given to the transfer.
+        self.priority = priority
+        #: Chunks the transfer may send before its round-robin turn ends.
+        self.credit = priority
+        #: Bytes of the transfer sent and acknowledged.
+        self.sent = 0
+        self.acked = 0
+        #: List of [(end offset, send time)] for unacknowledged chunks.
+        self.send_times = []
+        #: List of [(end offset, buffer)] for raw chunks not yet acknowledged,
+        #: whose buffers may still be queued for transmission.
+        self.busy_buffers = []
+
+    @property
+    def key(self):
+        """
+        `(context ID, handle)` of the receiver, identifying the transfer in
+        :meth:`FileService.acknowledge` and :meth:`FileService.abort`.
+        """
+        return (self.sender.context.context_id, self.sender.dst_handle)
+
+
 class FileStreamState(object):
-    def __init__(self):
-        #: List of [(Sender, file object)]
+    def __init__(self, window):
+        #: List of :class:`FileJob` with bytes left to send.
         self.jobs = []
-        self.completing = {}
+        #: Mapping of :attr:`FileJob.key` -> :class:`FileJob` for every
+        #: transfer with bytes left to send or awaiting acknowledgement.
+        self.job_by_key = {}
+        #: Set of target context IDs whose disconnect is being listened for.
+        self.target_ids = set()
         #: In-flight byte count.
         self.unacked = 0
         #: Lock.
         self.lock = threading.Lock()
+        #: Maximum in-flight byte count.
+        self.window = window
+        #: Total bytes sent and acknowledged on the stream.
+        self.sent = 0
+        self.acked = 0
+        #: Smallest round-trip time observed, or :data:`None`.
+        self.min_rtt = None
+        #: Start time of the current delivery rate measurement, and
+        #: :attr:`acked` at that time.
+        self.interval_start = None
+        self.interval_acked = 0
+        #: :data:`True` if the window was not filled during the current
+        #: measurement, since no more data was pending.
+        self.app_limited = False
+        #: List of acknowledged buffers available to read raw chunks into.
+        self.free_buffers = []
 
 
 class PushFileService(Service):
@@ -737,13 +794,15 @@ class PushFileService(Service):
     @arg_spec({
         'context': mitogen.core.Context,
         'paths': list,
-        # 'modules': list, TODO, modules was passed into this func but it's not used yet
     })
-    def propagate_paths_and_modules(self, context, paths, overridden_sources=None, extra_sys_paths=None):
+    def propagate_paths_and_modules(self, context, paths, modules=None, overridden_sources=None, extra_sys_paths=None):
         """
         One size fits all method to ensure a target context has been preloaded
         with a set of small files and Python modules.
 
+        :param list modules:
+            Optional list of Python module names to forward to the context
+            ahead of it requesting them.
         :param dict overridden_sources:
             Optional dict containing source code to override path's source code
         :param extra_sys_paths:
@@ -756,19 +815,22 @@ class PushFileService(Service):
             if overridden_sources is not None and path in overridden_sources:
                 overridden_source = overridden_sources[path]
             self.propagate_to(context, mitogen.core.to_text(path), overridden_source)
-        # self.router.responder.forward_modules(context, modules) TODO
 
-        # NOTE: could possibly be handled by the above TODO, but not sure how forward_modules works enough
-        #       to know for sure, so for now going to pass the sys paths themselves and have `propagate_to`
-        #       load them up in sys.path for later import
+        # NOTE: the sys paths themselves are loaded into our own sys.path, so
+        #       the responder can find modules beneath them for later import
         # ensure we don't add to sys.path the same path we've already seen
-        for extra_path in extra_sys_paths:
+        for extra_path in extra_sys_paths or ():
             # store extra paths in cached set for O(1) lookup
             if extra_path not in self._extra_sys_paths:
                 # not sure if it matters but we could prepend to sys.path instead if we need to
                 sys.path.append(extra_path)
                 self._extra_sys_paths.add(extra_path)
 
+        # Only a master's ModuleResponder can push modules unrequested.
+        forward_modules = getattr(self.router.responder, 'forward_modules', None)
+        if modules and forward_modules:
+            forward_modules(context, modules)
+
     @expose(policy=AllowParents())
     @arg_spec({
         'context': mitogen.core.Context,
@@ -848,13 +910,15 @@ class FileService(Service):
     chunks to fill that assumed pipe, then responding to delivery
     acknowledgements from the receiver by scheduling new chunks.
 
-    Transfers proceed one-at-a-time per stream. When multiple contexts exist on
-    a stream (e.g. one is the SSH account, another is a sudo account, and a
-    third is a proxied SSH connection), each request is satisfied in turn
-    before subsequent requests start flowing. This ensures when a stream is
-    contended, priority is given to completing individual transfers rather than
-    potentially aborting many partial transfers, causing the bandwidth to be
-    wasted.
+    When multiple transfers are pending on a stream (e.g. one context is the
+    SSH account, another is a sudo account, and a third is a proxied SSH
+    connection), :attr:`schedule` chooses which sends the next chunk. By
+    default each takes turns sending as many chunks as its priority, so a
+    large transfer does not hold up small ones queued behind it. The
+    :data:`SCHEDULE_FIFO` policy instead satisfies each request in turn
+    before subsequent requests start flowing, giving priority to completing
+    individual transfers rather than potentially aborting many partial
+    transfers if the stream is interrupted.
 
     Theory of operation:
         1. Trusted context (i.e. WorkerProcess) calls register(), making a
@@ -863,11 +927,17 @@ class FileService(Service):
            chunks, then calls fetch(path, recv.to_sender()), to set up the
            transfer.
         3. fetch() replies to the call with the file's metadata, then
-           schedules an initial burst up to the window size limit (1MiB).
+           schedules an initial burst up to the stream's window size (1MiB
+           for a new stream).
         4. Chunks begin to arrive in the requestee, which calls acknowledge()
-           for each 128KiB received.
-        5. The acknowledge() call arrives at FileService, which scheduled a new
-           chunk to refill the drained window back to the size limit.
+           for each 256KiB received, or 10ms after the first unacknowledged
+           chunk arrived, whichever comes first, and once more at the end.
+        5. The acknowledge() call arrives at FileService, which schedules new
+           chunks to refill the drained window back to the size limit.
+           Acknowledgements are timed to measure the stream's round-trip time
+           and delivery rate, from which the window is resized to a multiple
+           of the bandwidth-delay product, much like TCP receive buffer
+           auto-tuning.
         6. When the last chunk has been pumped for a single transfer,
            Sender.close() is called causing the receive loop in
            target.py::_get_file() to exit, allowing that code to compare the
@@ -890,11 +960,69 @@ class FileService(Service):
     """
     unregistered_msg = 'Path %r is not registered with FileService.'
     context_mismatch_msg = 'sender= kwarg context must match requestee context'
+    bad_priority_msg = 'priority= kwarg must be a positive integer, not %r'
+    bad_offset_msg = 'offset= kwarg must be a non-negative integer, not %r'
 
-    #: Burst size. With 1MiB and 10ms RTT max throughput is 100MiB/sec, which
-    #: is 5x what SSH can handle on a 2011 era 2.4Ghz Core i5.
+    #: Initial burst size. With 1MiB and 10ms RTT max throughput is
+    #: 100MiB/sec, which is 5x what SSH can handle on a 2011 era 2.4Ghz Core
+    #: i5, but only 10MiB/sec at 100ms RTT.
     window_size_bytes = 1048576
 
+    #: If :data:`True`, resize each stream's window to :attr:`window_gain`
+    #: times its measured bandwidth-delay product, between
+    #: :attr:`min_window_size_bytes` and :attr:`max_window_size_bytes`.
+    #: Otherwise the window is fixed at :attr:`window_size_bytes`.
+    adaptive_window = True
+
+    #: Smallest window an adaptive stream shrinks to. Must exceed
+    #: :attr:`ack_size_bytes`, or each batch of chunks waits for the
+    #: receiver's :attr:`ack_interval` to expire.
+    min_window_size_bytes = 524288
+
+    #: Largest window an adaptive stream grows to, bounding the data buffered
+    #: in RAM for each stream.
+    max_window_size_bytes = 33554432
+
+    #: Multiple of the bandwidth-delay product kept in flight. Above 1, the
+    #: window keeps growing until queueing raises the round-trip time.
+    window_gain = 2
+
+    #: Send pending transfers one at a time, in the order they were
+    #: requested.
+    SCHEDULE_FIFO = 'fifo'
+    #: Let pending transfers take turns, each sending as many chunks per turn
+    #: as its priority.
+    SCHEDULE_ROUND_ROBIN = 'round_robin'
+    #: Send the pending transfer with the highest priority, then the fewest
+    #: bytes remaining, first.
+    SCHEDULE_SHORTEST_FIRST = 'shortest_first'
+
+    #: Policy choosing which pending transfer on a stream sends the next
+    #: chunk, one of the ``SCHEDULE_*`` constants.
+    schedule = SCHEDULE_ROUND_ROBIN
+
+    #: In :meth:`get`, acknowledge received bytes once this many are
+    #: unacknowledged, rather than sending one :meth:`acknowledge` call per
+    #: chunk.
+    ack_size_bytes = 262144
+
+    #: In :meth:`get`, seconds after the first unacknowledged chunk arrived
+    #: when received bytes are acknowledged regardless of
+    #: :attr:`ack_size_bytes`, so a transfer never stalls on a window smaller
+    #: than it.
+    ack_interval = 0.01
+
+    #: In :meth:`get`, ask for chunks as raw message data rather than pickled
+    #: :class:`mitogen.core.Blob`. On Python 3, pickle protocol 2 encodes
+    #: bytes via a latin-1 :class:`str`, costing more CPU than the transfer
+    #: itself.
+    raw_chunks = True
+
+    #: If :data:`True`, read raw chunks into buffers reused once their
+    #: chunks are acknowledged, rather than allocating a new string per chunk.
+    #: Requires Python 3, where messages may hold a :class:`memoryview`.
+    reuse_buffers = mitogen.core.PY3
+
     def __init__(self, router):
         super(FileService, self).__init__(router)
         #: Set of registered paths.
@@ -903,6 +1031,9 @@ class FileService(Service):
         self._prefixes = set()
         #: Mapping of Stream->FileStreamState.
         self._state_by_stream = {}
+        #: Mapping of path->(size, mtime, crc32) for :meth:`checksum`.
+        self._checksums = {}
+        self._checksums_lock = threading.Lock()
 
     def _name_or_none(self, func, n, attr):
         try:
@@ -965,9 +1096,9 @@ class FileService(Service):
         for stream, state in self._state_by_stream.items():
             state.lock.acquire()
             try:
-                for sender, fp in reversed(state.jobs):
-                    sender.close()
-                    fp.close()
+                for job in reversed(state.jobs):
+                    job.sender.close()
+                    job.fp.close()
                     state.jobs.pop()
             finally:
                 state.lock.release()
@@ -986,24 +1117,165 @@ class FileService(Service):
     def _schedule_pending_unlocked(self, state):
         """
         Consider the pending transfers for a stream, pumping new chunks while
-        the unacknowledged byte count is below :attr:`window_size_bytes`. Must
-        be called with the FileStreamState lock held.
+        the unacknowledged byte count is below the stream's window. Must be
+        called with the FileStreamState lock held.
 
         :param FileStreamState state:
             Stream to schedule chunks for.
         """
-        while state.jobs and state.unacked < self.window_size_bytes:
-            sender, fp = state.jobs[0]
-            s = fp.read(self.IO_SIZE)
+        while state.jobs and state.unacked < state.window:
+            job = self._next_job_unlocked(state)
+            if job.raw and self.reuse_buffers:
+                s = self._read_buffer_unlocked(state, job)
+            else:
+                s = job.fp.read(self.IO_SIZE)
             if s:
+                job.remaining -= len(s)
+                job.credit -= 1
+                job.sent += len(s)
+                job.send_times.append((job.sent, mitogen.core.now()))
                 state.unacked += len(s)
-                sender.send(mitogen.core.Blob(s))
+                state.sent += len(s)
+                if job.raw:
+                    job.sender.context.send(mitogen.core.Message(
+                        data=s,
+                        handle=job.sender.dst_handle,
+                    ))
+                else:
+                    job.sender.send(mitogen.core.Blob(s))
             else:
                 # File is done. Cause the target's receive loop to exit by
                 # closing the sender, close the file, and remove the job entry.
-                sender.close()
-                fp.close()
-                state.jobs.pop(0)
+                job.sender.close()
+                job.fp.close()
+                state.jobs.remove(job)
+                if job.acked == job.sent:
+                    del state.job_by_key[job.key]
+
+        if not state.jobs:
+            state.app_limited = True
+
+    def _read_buffer_unlocked(self, state, job):
+        """
+        Read the next chunk of `job` into a buffer no longer in use by an
+        earlier chunk, returning a view of the bytes read. Must be called with
+        the FileStreamState lock held.
+        """
+        if state.free_buffers:
+            buf = state.free_buffers.pop()
+        else:
+            buf = bytearray(self.IO_SIZE)
+        n = job.fp.readinto(buf)
+        if not n:
+            state.free_buffers.append(buf)
+            return None
+        job.busy_buffers.append((job.sent + n, buf))
+        return memoryview(buf)[:n]
+
+    def _release_buffers_unlocked(self, state, job):
+        """
+        Make buffers of acknowledged raw chunks of `job` available for reuse.
+        A chunk its target has received was written to the stream, so its
+        buffer is no longer queued. Must be called with the FileStreamState
+        lock held.
+        """
+        while job.busy_buffers and job.busy_buffers[0][0] <= job.acked:
+            state.free_buffers.append(job.busy_buffers.pop(0)[1])
+
+    def _forget_job_unlocked(self, state, job):
+        """
+        Stop a transfer whose target failed or disconnected, crediting any
+        bytes it sent that will never be acknowledged. Its buffers are not
+        reused, since they may still be queued for transmission. Must be
+        called with the FileStreamState lock held.
+        """
+        if job in state.jobs:
+            job.fp.close()
+            state.jobs.remove(job)
+        state.job_by_key.pop(job.key, None)
+        state.unacked -= job.sent - job.acked
+        job.acked = job.sent
+        job.send_times = []
+        job.busy_buffers = []
+
+    def _on_target_disconnect(self, state, context_id):
+        """
+        Respond to disconnection of a target by forgetting its transfers.
+        """
+        state.lock.acquire()
+        try:
+            state.target_ids.discard(context_id)
+            for key, job in list(state.job_by_key.items()):
+                if key[0] == context_id:
+                    LOG.debug('%r: forgetting transfer to disconnected %r',
+                              self, job.sender.context)
+                    self._forget_job_unlocked(state, job)
+            self._schedule_pending_unlocked(state)
+        finally:
+            state.lock.release()
+
+    def _next_job_unlocked(self, state):
+        """
+        Return the :class:`FileJob` that should send the next chunk on a
+        stream, according to :attr:`schedule`. Must be called with the
+        FileStreamState lock held.
+        """
+        if self.schedule == self.SCHEDULE_SHORTEST_FIRST:
+            _, _, i = min([
+                (-job.priority, job.remaining, i)
+                for i, job in enumerate(state.jobs)
+            ])
+            return state.jobs[i]
+
+        job = state.jobs[0]
+        if self.schedule == self.SCHEDULE_ROUND_ROBIN and job.credit <= 0:
+            job.credit = job.priority
+            state.jobs.append(state.jobs.pop(0))
+            job = state.jobs[0]
+        return job
+
+    def _update_window_unlocked(self, state, job, size):
+        """
+        Account for `size` newly acknowledged bytes of `job`, and at most once
+        per round-trip, resize the window of an adaptive stream from the rate
+        at which bytes were acknowledged since the last resize. Must be called
+        with the FileStreamState lock held.
+        """
+        now = mitogen.core.now()
+        state.acked += size
+        job.acked += size
+        rtt = None
+        while job.send_times and job.send_times[0][0] <= job.acked:
+            rtt = now - job.send_times.pop(0)[1]
+        if rtt is not None and (state.min_rtt is None or rtt < state.min_rtt):
+            state.min_rtt = rtt
+
+        if not self.adaptive_window or state.min_rtt is None:
+            return
+
+        if state.interval_start is None:
+            state.interval_start = now
+            state.interval_acked = state.acked
+            state.app_limited = False
+            return
+
+        elapsed = now - state.interval_start
+        if elapsed < state.min_rtt or elapsed <= 0:
+            return
+
+        rate = (state.acked - state.interval_acked) / elapsed
+        window = int(self.window_gain * rate * state.min_rtt)
+        window = max(self.min_window_size_bytes,
+                     min(self.max_window_size_bytes, window))
+        if window > state.window or not state.app_limited:
+            LOG.debug('%r: window %d -> %d bytes (rtt %.2fms, %.2fMiB/s)',
+                      self, state.window, window, 1000 * state.min_rtt,
+                      rate / 1048576.0)
+            state.window = window
+
+        state.interval_start = now
+        state.interval_acked = state.acked
+        state.app_limited = False
 
     def _prefix_is_authorized(self, path):
         """
@@ -1023,13 +1295,21 @@ class FileService(Service):
             path = os.path.dirname(path)
         return False
 
+    def _is_authorized(self, path, msg):
+        return (
+            (path in self._paths) or
+            self._prefix_is_authorized(path) or
+            mitogen.core._has_parent_authority(msg.auth_id)
+        )
+
     @expose(policy=AllowAny())
     @no_reply()
     @arg_spec({
         'path': mitogen.core.FsPathTypes,
         'sender': mitogen.core.Sender,
     })
-    def fetch(self, path, sender, msg):
+    def fetch(self, path, sender, msg, priority=1, raw=False, offset=0,
+              if_range=None):
         """
         Start a transfer for a registered path.
 
@@ -1037,6 +1317,20 @@ class FileService(Service):
             File path.
         :param mitogen.core.Sender sender:
             Sender to receive file data.
+        :param int priority:
+            Positive integer share of the stream given to this transfer
+            relative to others pending on it, as used by :attr:`schedule`.
+        :param bool raw:
+            If :data:`True`, send each chunk as the unpickled data of its
+            message, otherwise as a pickled :class:`mitogen.core.Blob`.
+        :param int offset:
+            Byte offset to start sending from, to resume an interrupted
+            transfer.
+        :param tuple if_range:
+            If not :data:`None`, `(size, mtime)` of the file when the bytes
+            before `offset` were received. Much like HTTP's ``If-Range``
+            header, if the file no longer matches, `offset` is ignored and the
+            whole file is sent.
         :returns:
             Dict containing the file metadata:
 
@@ -1046,14 +1340,11 @@ class FileService(Service):
             * ``group``: Owner group name on host machine.
             * ``mtime``: Floating point modification time.
             * ``ctime``: Floating point change time.
+            * ``offset``: Byte offset the transfer started from.
         :raises Error:
             Unregistered path, or Sender did not match requestee context.
         """
-        if (
-            (path not in self._paths) and
-            (not self._prefix_is_authorized(path)) and
-            (not mitogen.core._has_parent_authority(msg.auth_id))
-        ):
+        if not self._is_authorized(path, msg):
             msg.reply(mitogen.core.CallError(
                 Error(self.unregistered_msg % (path,))
             ))
@@ -1065,6 +1356,20 @@ class FileService(Service):
             ))
             return
 
+        if not (isinstance(priority, mitogen.core.integer_types) and
+                priority > 0):
+            msg.reply(mitogen.core.CallError(
+                Error(self.bad_priority_msg % (priority,))
+            ))
+            return
+
+        if not (isinstance(offset, mitogen.core.integer_types) and
+                offset >= 0):
+            msg.reply(mitogen.core.CallError(
+                Error(self.bad_offset_msg % (offset,))
+            ))
+            return
+
         LOG.debug('Serving %r', path)
 
         # Response must arrive first so requestee can begin receive loop,
@@ -1073,7 +1378,16 @@ class FileService(Service):
         # ~10Mbit/sec over a 100ms link.
         try:
             fp = open(path, 'rb', self.IO_SIZE)
-            msg.reply(self._generate_stat(path))
+            st = self._generate_stat(path)
+            if offset > st['size'] or (
+                if_range is not None and
+                tuple(if_range) != (st['size'], st['mtime'])
+            ):
+                LOG.debug('%r: %r changed, resending from start', self, path)
+                offset = 0
+            fp.seek(offset)
+            st[u'offset'] = offset
+            msg.reply(st)
         except IOError:
             msg.reply(mitogen.core.CallError(
                 sys.exc_info()[1]
@@ -1081,40 +1395,167 @@ class FileService(Service):
             return
 
         stream = self.router.stream_by_id(sender.context.context_id)
-        state = self._state_by_stream.setdefault(stream, FileStreamState())
+        state = self._state_by_stream.setdefault(
+            stream, FileStreamState(self.window_size_bytes)
+        )
         state.lock.acquire()
         try:
-            state.jobs.append((sender, fp))
+            if not state.jobs:
+                # Don't measure delivery rate across an idle period.
+                state.interval_start = None
+            job = FileJob(sender, fp, st['size'] - offset, priority, bool(raw))
+            state.jobs.append(job)
+            state.job_by_key[job.key] = job
+            if sender.context.context_id not in state.target_ids:
+                state.target_ids.add(sender.context.context_id)
+                mitogen.core.listen(sender.context, 'disconnect',
+                    lambda context_id=sender.context.context_id:
+                        self._on_target_disconnect(state, context_id))
             self._schedule_pending_unlocked(state)
         finally:
             state.lock.release()
 
+    @expose(policy=AllowAny())
+    @arg_spec({
+        'path': mitogen.core.FsPathTypes,
+    })
+    def checksum(self, path, msg):
+        """
+        Return the CRC-32 of a registered path, allowing a target to verify a
+        file it received across one or more :meth:`fetch` calls. Results are
+        cached until the file's size or modification time changes, so a file
+        sent to many targets is read once.
+
+        :param str path:
+            File path.
+        :returns:
+            Dict containing ``size``, ``mtime`` and ``crc32``, the file's
+            unsigned CRC-32.
+        :raises Error:
+            Unregistered path.
+        """
+        if not self._is_authorized(path, msg):
+            raise Error(self.unregistered_msg % (path,))
+
+        st = self._generate_stat(path)
+        key = (st['size'], st['mtime'])
+        self._checksums_lock.acquire()
+        try:
+            cached = self._checksums.get(path)
+        finally:
+            self._checksums_lock.release()
+
+        if cached and cached[:2] == key:
+            crc = cached[2]
+        else:
+            crc = 0
+            fp = open(path, 'rb')
+            try:
+                while True:
+                    s = fp.read(mitogen.core.CHUNK_SIZE)
+                    if not s:
+                        break
+                    crc = zlib.crc32(s, crc)
+            finally:
+                fp.close()
+            crc &= 0xffffffff
+            self._checksums_lock.acquire()
+            try:
+                self._checksums[path] = key + (crc,)
+            finally:
+                self._checksums_lock.release()
+
+        return {
+            u'size': st['size'],
+            u'mtime': st['mtime'],
+            u'crc32': crc,
+        }
+
     @expose(policy=AllowAny())
     @no_reply()
     @arg_spec({
         'size': int,
+        'handle': int,
     })
     @no_reply()
-    def acknowledge(self, size, msg):
+    def acknowledge(self, size, handle, msg):
         """
-        Acknowledge bytes received by a transfer target, scheduling new chunks
-        to keep the window full. This should be called for every chunk received
-        by the target.
+        Acknowledge bytes received by the transfer whose receiver is `handle`
+        in the calling context, scheduling new chunks to keep the window full.
+        The target may acknowledge several chunks in one call.
         """
         stream = self.router.stream_by_id(msg.src_id)
         state = self._state_by_stream[stream]
         state.lock.acquire()
         try:
-            if state.unacked < size:
+            job = state.job_by_key.get((msg.src_id, handle))
+            if job is None:
+                LOG.debug('%r.acknowledge(src_id %d): no transfer to handle '
+                          '%d', self, msg.src_id, handle)
+                return
+            if job.sent - job.acked < size:
                 LOG.error('%r.acknowledge(src_id %d): unacked=%d < size %d',
-                          self, msg.src_id, state.unacked, size)
-            state.unacked -= min(state.unacked, size)
+                          self, msg.src_id, job.sent - job.acked, size)
+                size = job.sent - job.acked
+            state.unacked -= size
+            self._update_window_unlocked(state, job, size)
+            self._release_buffers_unlocked(state, job)
+            if job.acked == job.sent and job not in state.jobs:
+                del state.job_by_key[job.key]
             self._schedule_pending_unlocked(state)
         finally:
             state.lock.release()
 
+    @expose(policy=AllowAny())
+    @no_reply()
+    @arg_spec({
+        'handle': int,
+    })
+    def abort(self, handle, msg):
+        """
+        Stop the transfer whose receiver is `handle` in the calling context,
+        after the target failed to receive it. Bytes it has in flight will
+        never be acknowledged, so are credited back to the stream's window.
+        """
+        stream = self.router.stream_by_id(msg.src_id)
+        state = self._state_by_stream.get(stream)
+        if state is None:
+            return
+        state.lock.acquire()
+        try:
+            job = state.job_by_key.get((msg.src_id, handle))
+            if job is not None:
+                LOG.debug('%r: target aborted transfer to %r', self,
+                          job.sender)
+                self._forget_job_unlocked(state, job)
+                self._schedule_pending_unlocked(state)
+        finally:
+            state.lock.release()
+
+    @classmethod
+    def _notify(cls, context, method_name, **kwargs):
+        # Sent without a reply handle, as closing the Receiver returned by
+        # call_service_async() raises KeyError if a dead message for it was
+        # already delivered after the context disconnected.
+        tup = (cls.name(), mitogen.core.to_text(method_name),
+               mitogen.core.Kwargs(kwargs))
+        context.send(
+            mitogen.core.Message.pickled(tup, handle=mitogen.core.CALL_SERVICE)
+        )
+
     @classmethod
-    def get(cls, context, path, out_fp):
+    def _acknowledge(cls, context, recv, size):
+        cls._notify(context, 'acknowledge', size=size, handle=recv.handle)
+
+    @classmethod
+    def _abort(cls, context, recv):
+        handle = recv.handle
+        recv.close()
+        cls._notify(context, 'abort', handle=handle)
+
+    @classmethod
+    def get(cls, context, path, out_fp, priority=None, offset=0,
+            if_range=None, on_metadata=None):
         """
         Streamily download a file from the connection multiplexer process in
         the controller.
@@ -1126,35 +1567,92 @@ class FileService(Service):
             FileService registered name of the input file.
         :param bytes out_path:
             Name of the output path on the local disk.
+        :param int priority:
+            If not :data:`None`, passed to :meth:`fetch`.
+        :param int offset:
+            If nonzero, resume an interrupted transfer by asking :meth:`fetch`
+            to start at this offset. `out_fp` must be seekable and positioned
+            at `offset`. If the file changed since, `out_fp` is rewound and
+            truncated before the whole file is received.
+        :param tuple if_range:
+            Passed to :meth:`fetch` with `offset`.
+        :param on_metadata:
+            If not :data:`None`, called with the metadata dictionary returned
+            by :meth:`fetch` before any data is written to `out_fp`.
         :returns:
             Tuple of (`ok`, `metadata`), where `ok` is :data:`True` on success,
-            or :data:`False` if the transfer was interrupted and the output
-            should be discarded.
+            or :data:`False` if the transfer was interrupted. The output may be
+            kept and the transfer resumed from its end.
 
             `metadata` is a dictionary of file metadata as documented in
             :meth:`fetch`.
         """
         LOG.debug('get_file(): fetching %r from %r', path, context)
         t0 = mitogen.core.now()
-        recv = mitogen.core.Receiver(router=context.router)
+        recv = mitogen.core.Receiver(router=context.router, respondent=context)
+        kwargs = {}
+        if priority is not None:
+            kwargs['priority'] = priority
+        if cls.raw_chunks:
+            kwargs['raw'] = True
+        if offset:
+            kwargs['offset'] = offset
+            kwargs['if_range'] = if_range
         metadata = context.call_service(
             service_name=cls.name(),
             method_name='fetch',
             path=path,
             sender=recv.to_sender(),
+            **kwargs
         )
 
-        received_bytes = 0
-        for chunk in recv:
-            s = chunk.unpickle()
-            LOG.debug('get_file(%r): received %d bytes', path, len(s))
-            context.call_service_async(
-                service_name=cls.name(),
-                method_name='acknowledge',
-                size=len(s),
-            ).close()
-            out_fp.write(s)
-            received_bytes += len(s)
+        if on_metadata is not None:
+            on_metadata(metadata)
+
+        received_bytes = metadata['offset']
+        if received_bytes != offset:
+            LOG.debug('get_file(%r): cannot resume at %d, restarting',
+                      path, offset)
+            out_fp.seek(received_bytes)
+            out_fp.truncate()
+        unacked = 0
+        deadline = None
+        try:
+            while True:
+                timeout = None
+                if unacked:
+                    timeout = max(0, deadline - mitogen.core.now())
+                try:
+                    chunk = recv.get(timeout=timeout)
+                except mitogen.core.TimeoutError:
+                    cls._acknowledge(context, recv, unacked)
+                    unacked = 0
+                    continue
+                except mitogen.core.ChannelError:
+                    break
+
+                if cls.raw_chunks:
+                    s = chunk.data
+                else:
+                    s = chunk.unpickle()
+                LOG.debug('get_file(%r): received %d bytes', path, len(s))
+                out_fp.write(s)
+                received_bytes += len(s)
+                if not unacked:
+                    deadline = mitogen.core.now() + cls.ack_interval
+                unacked += len(s)
+                if (unacked >= cls.ack_size_bytes or
+                        mitogen.core.now() >= deadline):
+                    cls._acknowledge(context, recv, unacked)
+                    unacked = 0
+        except:
+            # Let the service forget the transfer, rather than wait forever
+            # for its remaining bytes to be acknowledged.
+            cls._abort(context, recv)
+            raise
+
+        if unacked:
+            cls._acknowledge(context, recv, unacked)
 
         ok = received_bytes == metadata['size']
         if received_bytes < metadata['size']:
@@ -0,0 +1,158 @@
+import os
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import testlib
+
+import ansible_mitogen.affinity
+import ansible_mitogen.assignment
+
+
+NAMES = ['host%d.example.com' % (i,) for i in range(400)]
+
+
+class StableHashTest(testlib.TestCase):
+    func = staticmethod(ansible_mitogen.assignment.stable_hash)
+
+    def test_known_value(self):
+        # Must not vary with PYTHONHASHSEED or interpreter version.
+        self.assertEqual(0xaaf4c61ddcc5e8a2, self.func(u'hello'))
+
+    def test_bytes_and_text_equal(self):
+        self.assertEqual(self.func(b'host1'), self.func(u'host1'))
+
+
+class HashPolicyTest(testlib.TestCase):
+    klass = ansible_mitogen.assignment.HashPolicy
+
+    def test_stable_between_instances(self):
+        a = self.klass(8)
+        b = self.klass(8)
+        self.assertEqual([a.choose(name) for name in NAMES],
+                         [b.choose(name) for name in NAMES])
+
+    def test_candidates_unique(self):
+        policy = self.klass(8)
+        self.assertEqual(list(range(8)),
+                         sorted(policy.candidates(u'host1')))
+
+    def test_spread(self):
+        policy = self.klass(4)
+        counts = [0] * 4
+        for name in NAMES:
+            counts[policy.choose(name)] += 1
+        for count in counts:
+            self.assertTrue(50 < count < 150, counts)
+
+    def test_few_moved_when_mux_added(self):
+        a = self.klass(8)
+        b = self.klass(9)
+        moved = sum(1 for name in NAMES if a.choose(name) != b.choose(name))
+        self.assertTrue(moved < len(NAMES) / 4, moved)
+
+
+@unittest.skipIf(
+    reason='shared memory locks unavailable',
+    condition=ansible_mitogen.affinity._sem_init is None,
+)
+class RecordTest(testlib.TestCase):
+    klass = ansible_mitogen.assignment.HashPolicy
+
+    def test_names_counted_once(self):
+        policy = self.klass(2)
+        index = policy.choose(u'host1')
+        policy.choose(u'host1')
+        self.assertEqual(1, policy.dump()[index]['names'])
+        self.assertEqual(0, policy.dump()[1 - index]['names'])
+
+    def test_publish(self):
+        policy = self.klass(2)
+        policy.publish(index=1, streams=3, pending_bytes=1234)
+        self.assertEqual([
+            {'index': 0, 'names': 0, 'streams': 0, 'pending_bytes': 0},
+            {'index': 1, 'names': 0, 'streams': 3, 'pending_bytes': 1234},
+        ], policy.dump())
+
+    def test_shared_with_child(self):
+        policy = self.klass(2)
+        index = policy.choose(u'host1')
+        pid = os.fork()
+        if not pid:
+            policy.publish(index=index, streams=7, pending_bytes=0)
+            os._exit(int(policy.choose(u'host2') == policy.choose(u'host2')))
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(1, os.WEXITSTATUS(status))
+        self.assertEqual(7, policy.dump()[index]['streams'])
+        self.assertEqual(2, sum(dct['names'] for dct in policy.dump()))
+
+
+@unittest.skipIf(
+    reason='shared memory locks unavailable',
+    condition=ansible_mitogen.affinity._sem_init is None,
+)
+class LoadPolicyTest(testlib.TestCase):
+    klass = ansible_mitogen.assignment.LoadPolicy
+
+    def test_avoids_loaded_mux(self):
+        policy = self.klass(4)
+        first, second = list(policy.candidates(u'host1'))[:2]
+        policy.publish(index=first, streams=10, pending_bytes=0)
+        self.assertEqual(second, policy.choose(u'host1'))
+
+    def test_pending_bytes_count_as_load(self):
+        policy = self.klass(4)
+        first, second = list(policy.candidates(u'host1'))[:2]
+        policy.publish(index=first, streams=0, pending_bytes=8 * 1048576)
+        self.assertEqual(second, policy.choose(u'host1'))
+
+    def test_assignment_sticky(self):
+        policy = self.klass(4)
+        index = policy.choose(u'host1')
+        policy.publish(index=index, streams=100, pending_bytes=0)
+        self.assertEqual(index, policy.choose(u'host1'))
+
+    def test_balances_names(self):
+        policy = self.klass(4)
+        counts = [0] * 4
+        for name in NAMES:
+            counts[policy.choose(name)] += 1
+        self.assertTrue(max(counts) - min(counts) <= 10, counts)
+
+
+class GetPolicyTest(testlib.TestCase):
+    func = staticmethod(ansible_mitogen.assignment.get_policy)
+
+    def test_default(self):
+        with mock.patch.dict(os.environ, clear=False):
+            os.environ.pop('MITOGEN_MUX_ASSIGNMENT', None)
+            policy = self.func(2)
+        self.assertEqual(ansible_mitogen.assignment.HashPolicy,
+                         type(policy))
+
+    def test_unknown(self):
+        with mock.patch.dict(os.environ, {'MITOGEN_MUX_ASSIGNMENT': 'x'}):
+            policy = self.func(2)
+        self.assertEqual(ansible_mitogen.assignment.HashPolicy,
+                         type(policy))
+
+    @unittest.skipIf(
+        reason='shared memory locks unavailable',
+        condition=ansible_mitogen.affinity._sem_init is None,
+    )
+    def test_load(self):
+        with mock.patch.dict(os.environ, {'MITOGEN_MUX_ASSIGNMENT': 'load'}):
+            policy = self.func(2)
+        self.assertEqual(ansible_mitogen.assignment.LoadPolicy,
+                         type(policy))
+
+    def test_load_not_shared(self):
+        with mock.patch.dict(os.environ, {'MITOGEN_MUX_ASSIGNMENT': 'load'}):
+            policy = self.func(2, shared=False)
+        self.assertEqual(ansible_mitogen.assignment.HashPolicy,
+                         type(policy))
+        self.assertIsNone(policy.state)
+        self.assertEqual([], policy.dump())
@@ -0,0 +1,179 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import testlib
+
+import mitogen.core
+import ansible_mitogen.process
+
+
+class DaemonDirTest(testlib.TestCase):
+    func = staticmethod(ansible_mitogen.process.get_daemon_dir)
+
+    def setUp(self):
+        super(DaemonDirTest, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp(prefix='mitogen_daemon_dir_')
+        self.path = os.path.join(self.tmp_dir, 'mux')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(DaemonDirTest, self).tearDown()
+
+    def call(self, path):
+        with mock.patch.dict(os.environ, {'MITOGEN_MUX_DAEMON': path}):
+            return self.func()
+
+    def test_disabled(self):
+        self.assertEqual(None, self.call(''))
+
+    def test_created_private(self):
+        self.assertEqual(self.path, self.call(self.path))
+        self.assertEqual(int('0700', 8), os.stat(self.path).st_mode & 511)
+
+    def test_not_private(self):
+        os.mkdir(self.path)
+        os.chmod(self.path, int('0777', 8))
+        self.assertEqual(None, self.call(self.path))
+
+    def test_not_directory(self):
+        os.symlink(self.tmp_dir, self.path)
+        self.assertEqual(None, self.call(self.path))
+
+
+class DaemonTagTest(testlib.TestCase):
+    func = staticmethod(ansible_mitogen.process.get_daemon_tag)
+
+    def test_stable(self):
+        self.assertEqual(self.func(), self.func())
+
+    def test_env_changes_tag(self):
+        tag = self.func()
+        with mock.patch.dict(os.environ, {'MITOGEN_POOL_SIZE': '3'}):
+            self.assertNotEqual(tag, self.func())
+        with mock.patch.dict(os.environ, {'ANSIBLE_STRATEGY': 'linear'}):
+            self.assertNotEqual(tag, self.func())
+
+    def test_unrelated_env_ignored(self):
+        tag = self.func()
+        with mock.patch.dict(os.environ, {'TERM_PROGRAM_VERSION': '1'}):
+            self.assertEqual(tag, self.func())
+
+
+class StopMuxDaemonsTest(testlib.TestCase):
+    func = staticmethod(ansible_mitogen.process.stop_mux_daemons)
+
+    def setUp(self):
+        super(StopMuxDaemonsTest, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp(prefix='mitogen_stop_mux_')
+        self.sock_path = os.path.join(self.tmp_dir, 'mux-x-0.sock')
+        self.pid_path = os.path.join(self.tmp_dir, 'mux-x-0.pid')
+        self.sock = None
+
+    def tearDown(self):
+        if self.sock is not None:
+            self.sock.close()
+        shutil.rmtree(self.tmp_dir)
+        super(StopMuxDaemonsTest, self).tearDown()
+
+    def listen(self):
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.bind(self.sock_path)
+        self.sock.listen(1)
+
+    def write_pid(self, s):
+        with open(self.pid_path, 'w') as fp:
+            fp.write(s)
+
+    def test_stale_socket(self):
+        self.write_pid(str(os.getpid()))
+        self.assertEqual(0, self.func(self.tmp_dir))
+        self.assertFalse(os.path.exists(self.pid_path))
+
+    def test_garbage_pid(self):
+        self.listen()
+        self.write_pid('garbage')
+        self.assertEqual(0, self.func(self.tmp_dir))
+
+    def test_exitted_pid(self):
+        self.listen()
+        pid = os.fork()
+        if not pid:
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.write_pid(str(pid))
+        self.assertEqual(0, self.func(self.tmp_dir))
+
+
+class PersistentMuxTest(testlib.TestCase):
+    no_zombie_check = True
+
+    def setUp(self):
+        super(PersistentMuxTest, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp(prefix='mitogen_mux_daemon_')
+        self.daemon_dir = os.path.join(self.tmp_dir, 'mux')
+        self.env = mock.patch.dict(os.environ, {
+            'MITOGEN_MUX_DAEMON': self.daemon_dir,
+            'MITOGEN_CPU_COUNT': '1',
+        })
+        self.env.start()
+
+    def tearDown(self):
+        ansible_mitogen.process.stop_mux_daemons(self.daemon_dir)
+        self.env.stop()
+        shutil.rmtree(self.tmp_dir)
+        super(PersistentMuxTest, self).tearDown()
+
+    def start_model(self):
+        model = ansible_mitogen.process.ClassicWorkerModel(
+            _init_logging=False
+        )
+        model._test_reset()
+        return model._muxes[0]
+
+    def wait_exit(self, mux, timeout=10.0):
+        # The PID file is removed last.
+        deadline = mitogen.core.now() + timeout
+        while os.path.exists(mux.pid_path) and mitogen.core.now() < deadline:
+            time.sleep(0.1)
+        return not os.path.exists(mux.pid_path)
+
+    def test_start_and_reuse(self):
+        mux = self.start_model()
+        self.assertTrue(mux.daemon)
+        self.assertTrue(os.path.exists(mux.path))
+        self.assertEqual(mux.pid, mux._read_pid())
+        self.assertNotEqual(os.getpid(), mux.pid)
+        self.assertEqual([], mux.model.get_mux_load())
+
+        mux2 = self.start_model()
+        self.assertEqual(mux.path, mux2.path)
+        self.assertEqual(mux.pid, mux2.pid)
+
+    def test_new_config_new_mux(self):
+        mux = self.start_model()
+        with mock.patch.dict(os.environ, {'MITOGEN_POOL_SIZE': '4'}):
+            mux2 = self.start_model()
+        self.assertNotEqual(mux.path, mux2.path)
+        self.assertNotEqual(mux.pid, mux2.pid)
+
+    def test_stop(self):
+        mux = self.start_model()
+        self.assertEqual(1, ansible_mitogen.process.stop_mux_daemons(
+            self.daemon_dir
+        ))
+        self.assertTrue(self.wait_exit(mux))
+        self.assertFalse(os.path.exists(mux.path))
+
+    def test_idle_exit(self):
+        klass = ansible_mitogen.process.MuxProcess
+        with mock.patch.object(klass, 'idle_timeout', 1):
+            mux = self.start_model()
+        self.assertTrue(self.wait_exit(mux))
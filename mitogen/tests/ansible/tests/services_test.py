@@ -0,0 +1,121 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import testlib
+
+import mitogen.core
+import ansible_mitogen.services
+
+
+class FakeContext(mitogen.core.Context):
+    def call(self, fn, *args, **kwargs):
+        return {}
+
+
+class BrokerShardTest(testlib.TestCase):
+    klass = ansible_mitogen.services.ContextService
+
+    def setUp(self):
+        super(BrokerShardTest, self).setUp()
+        self.context_ids = iter(range(100, 200))
+        self.router = mock.Mock()
+        self.router.fork.side_effect = self.new_context
+        self.router.local.side_effect = self.new_context
+        self.service = self.klass(self.router)
+        self.service.broker_shards = 2
+        self.service._candidate_temp_dirs = []
+
+    def new_context(self, name=None, **kwargs):
+        return FakeContext(self.router, next(self.context_ids), name)
+
+    def connect(self, via=None):
+        spec = {'method': 'local', 'kwargs': {}}
+        return self.service._connect(key=object(), spec=spec, via=via)
+
+    def test_shards_started_once(self):
+        shards = set(self.service._get_shard() for _ in range(4))
+        self.assertEqual(2, len(shards))
+        self.assertEqual(2, self.router.fork.call_count)
+
+    def test_least_loaded(self):
+        shard0 = self.service._get_shard()
+        shard1 = self.service._get_shard()
+        self.assertNotEqual(shard0, shard1)
+        self.assertEqual(shard0, self.service._get_shard())
+        self.service._put_shard(shard0)
+        self.service._put_shard(shard0)
+        self.assertEqual(shard0, self.service._get_shard())
+
+    def test_connect_via_shard(self):
+        response = self.connect()
+        context = response['context']
+        _, kwargs = self.router.local.call_args
+        shard = kwargs['via']
+        self.assertIn(shard, self.service._shards)
+        self.assertEqual(shard, response['shard'])
+        self.assertEqual(shard, self.service._shard_by_context[context])
+        self.assertEqual(1, self.service._load_by_shard[shard])
+
+        # Children of a connection stay on its shard, and count towards it.
+        child = self.connect(via=context)
+        _, kwargs = self.router.local.call_args
+        self.assertEqual(context, kwargs['via'])
+        self.assertEqual(shard, child['shard'])
+        self.assertEqual(2, self.service._load_by_shard[shard])
+
+        mitogen.core.fire(child['context'], 'disconnect')
+        self.assertEqual(1, self.service._load_by_shard[shard])
+
+    def test_connect_unsharded(self):
+        self.service.broker_shards = 0
+        response = self.connect()
+        self.assertEqual(None, response['shard'])
+        self.assertEqual(None, self.connect(via=response['context'])['shard'])
+        self.assertEqual(0, self.router.fork.call_count)
+
+    def test_context_disconnect(self):
+        context = self.connect()['context']
+        shard = self.service._shard_by_context[context]
+        mitogen.core.fire(context, 'disconnect')
+        self.assertEqual(0, self.service._load_by_shard[shard])
+        self.assertNotIn(context, self.service._shard_by_context)
+
+    def test_shard_disconnect(self):
+        shard0 = self.service._get_shard()
+        mitogen.core.fire(shard0, 'disconnect')
+        self.assertNotIn(shard0, self.service._shards)
+        self.assertNotIn(shard0, self.service._load_by_shard)
+
+        # Replaced on next use.
+        self.service._get_shard()
+        self.assertEqual(3, self.router.fork.call_count)
+        self.assertEqual(2, len(self.service._shards))
+
+    def test_shards_keep_exitting(self):
+        start_shards = self.service._start_shards
+
+        def start_shards_then_exit():
+            start_shards()
+            for shard in list(self.service._shards):
+                mitogen.core.fire(shard, 'disconnect')
+
+        self.service._start_shards = start_shards_then_exit
+        e = self.assertRaises(ansible_mitogen.services.Error,
+                              self.service._get_shard)
+        self.assertEqual(e.args[0], self.klass.shards_exitted_msg % (
+            self.klass.max_shard_attempts,
+        ))
+        self.assertEqual(2 * self.klass.max_shard_attempts,
+                         self.router.fork.call_count)
+
+    def test_fork_outside_lock(self):
+        def fork(name):
+            self.assertTrue(self.service._lock.acquire(False))
+            self.service._lock.release()
+            return self.new_context(name)
+
+        self.router.fork.side_effect = fork
+        self.service._get_shard()
+        self.assertEqual(2, self.router.fork.call_count)
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 import os.path
+import stat
 import subprocess
 import tempfile
 import unittest
@@ -9,6 +10,9 @@ try:
 except ImportError:
     import mock
 
+import mitogen.core
+import mitogen.service
+
 import ansible_mitogen.target
 import testlib
 
@@ -108,3 +112,174 @@ class IsGoodTempDirTest(unittest.TestCase):
         os_access.return_value = False
         with NamedTemporaryDirectory() as temp_path:
             self.assertFalse(self.func(temp_path))
+
+
+class TransferFileTest(testlib.RouterMixin, testlib.TestCase):
+    # Like Connection.fetch_file(), run in the master against the FileService
+    # of a child.
+    func = staticmethod(ansible_mitogen.target.transfer_file)
+
+    def setUp(self):
+        super(TransferFileTest, self).setUp()
+        self.tmpdir = tempfile.mkdtemp(prefix='transfer_file_test')
+        self.in_path = os.path.join(self.tmpdir, 'in')
+        self.out_path = os.path.join(self.tmpdir, 'out')
+        self.data = os.urandom(3 * mitogen.core.CHUNK_SIZE + 1000)
+        with open(self.in_path, 'wb') as fp:
+            fp.write(self.data)
+        self.context = self.router.local()
+        self.old_good_temp_dir = ansible_mitogen.target.good_temp_dir
+        ansible_mitogen.target.good_temp_dir = self.tmpdir
+        self.partial_dir = ansible_mitogen.target._get_partial_dir()
+
+    def tearDown(self):
+        ansible_mitogen.target.good_temp_dir = self.old_good_temp_dir
+        subprocess.check_call(['rm', '-rf', self.tmpdir])
+        super(TransferFileTest, self).tearDown()
+
+    def transfer(self):
+        self.func(self.context, self.in_path, self.out_path)
+
+    def read_out(self):
+        with open(self.out_path, 'rb') as fp:
+            return fp.read()
+
+    def partial_path(self, mtime=None, token='test'):
+        st = os.stat(self.in_path)
+        if mtime is None:
+            mtime = float(st.st_mtime)
+        return '%s%d-%r-%s%s' % (
+            ansible_mitogen.target._get_partial_prefix(self.partial_dir,
+                                                       self.in_path,
+                                                       self.out_path),
+            st.st_size, mtime, token, ansible_mitogen.target.PARTIAL_SUFFIX,
+        )
+
+    def write_partial(self, data, mtime=None):
+        path = self.partial_path(mtime)
+        with open(path, 'wb') as fp:
+            fp.write(data)
+        return path
+
+    def leftovers(self):
+        return sorted(
+            name for name in os.listdir(self.tmpdir)
+            if name not in ('in', 'out', 'mitogen_partial')
+        ) + sorted(os.listdir(self.partial_dir))
+
+    def assertKeptPartial(self):
+        leftovers = self.leftovers()
+        self.assertEqual(1, len(leftovers))
+        stem = os.path.basename(self.partial_path(token=''))
+        self.assertTrue(leftovers[0].startswith(stem[:-len('.partial')]))
+        self.assertTrue(leftovers[0].endswith('.partial'))
+        return os.path.join(self.partial_dir, leftovers[0])
+
+    def test_transfer(self):
+        self.transfer()
+        self.assertEqual(self.data, self.read_out())
+        self.assertEqual([], self.leftovers())
+
+    def test_resume(self):
+        offset = mitogen.core.CHUNK_SIZE + 10
+        self.write_partial(self.data[:offset])
+        with mock.patch.object(mitogen.service.FileService, 'get',
+                               wraps=mitogen.service.FileService.get) as get:
+            self.transfer()
+        self.assertEqual(offset, get.call_args[1]['offset'])
+        self.assertEqual(self.data, self.read_out())
+        self.assertEqual([], self.leftovers())
+
+    def test_resume_changed(self):
+        self.write_partial(self.data[:1000], mtime=1.0)
+        self.transfer()
+        self.assertEqual(self.data, self.read_out())
+        self.assertEqual([], self.leftovers())
+
+    def test_resume_corrupt(self):
+        self.write_partial(b'x' * 1000)
+        e = self.assertRaises(IOError, self.transfer)
+        self.assertIn('failed verification', str(e))
+        self.assertFalse(os.path.exists(self.out_path))
+        self.assertEqual([], self.leftovers())
+
+    def test_interrupted_kept(self):
+        get = mitogen.service.FileService.get
+
+        def interrupted_get(context, path, out_fp, **kwargs):
+            ok, metadata = get(context, path, out_fp, **kwargs)
+            return False, metadata
+
+        with mock.patch.object(mitogen.service.FileService, 'get',
+                               side_effect=interrupted_get):
+            self.assertRaises(IOError, self.transfer)
+        self.assertFalse(os.path.exists(self.out_path))
+        self.assertKeptPartial()
+
+        self.transfer()
+        self.assertEqual(self.data, self.read_out())
+        self.assertEqual([], self.leftovers())
+
+    def test_disconnected_resumes(self):
+        self.data = os.urandom(32 * mitogen.core.CHUNK_SIZE)
+        with open(self.in_path, 'wb') as fp:
+            fp.write(self.data)
+
+        disconnected = []
+        write = ansible_mitogen.target.Crc32Writer.write
+
+        def disconnecting_write(writer, s):
+            # The file must already have its resumable name, as a process
+            # whose parent disconnects may be killed at any moment.
+            self.assertKeptPartial()
+            if not disconnected:
+                stream = self.router.stream_by_id(self.context.context_id)
+                latch = mitogen.core.Latch()
+                mitogen.core.listen(stream, 'disconnect', latch.put)
+                self.router.disconnect_stream(stream)
+                latch.get()
+                disconnected.append(True)
+            write(writer, s)
+
+        with mock.patch.object(ansible_mitogen.target.Crc32Writer, 'write',
+                               disconnecting_write):
+            self.assertRaises(IOError, self.transfer)
+        self.assertFalse(os.path.exists(self.out_path))
+        size = os.path.getsize(self.assertKeptPartial())
+        self.assertTrue(0 < size < len(self.data))
+
+        self.context = self.router.local()
+        with mock.patch.object(mitogen.service.FileService, 'get',
+                               wraps=mitogen.service.FileService.get) as get:
+            self.transfer()
+        self.assertEqual(size, get.call_args[1]['offset'])
+        self.assertEqual(self.data, self.read_out())
+        self.assertEqual([], self.leftovers())
+
+    def test_cross_device_copied(self):
+        fstat = os.fstat
+
+        def other_device_fstat(fd):
+            st = list(fstat(fd))
+            st[stat.ST_DEV] += 1
+            return os.stat_result(st)
+
+        copy_to_dir = ansible_mitogen.target._copy_to_dir
+        with mock.patch.object(ansible_mitogen.target, '_copy_to_dir',
+                               wraps=copy_to_dir) as copy:
+            with mock.patch('os.fstat', side_effect=other_device_fstat):
+                self.transfer()
+        self.assertEqual(1, copy.call_count)
+        self.assertEqual(self.data, self.read_out())
+        self.assertEqual([], self.leftovers())
+
+    def test_expired_deleted(self):
+        path = self.write_partial(self.data[:1000])
+        old = os.path.getmtime(path) - ansible_mitogen.target.PARTIAL_MAX_AGE
+        os.utime(path, (old - 1, old - 1))
+        with mock.patch.object(mitogen.service.FileService, 'get',
+                               wraps=mitogen.service.FileService.get) as get:
+            self.transfer()
+        self.assertEqual(0, get.call_args[1]['offset'])
+        self.assertEqual(self.data, self.read_out())
+        self.assertEqual([], self.leftovers())
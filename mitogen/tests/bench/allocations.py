@@ -0,0 +1,76 @@
+"""
+Measure memory allocated per object, and per RPC roundtrip, for the objects
+created on the hot path using tracemalloc. Dict-backed subclasses stand in for
+the layout used before Message, Sender and Latch gained __slots__.
+"""
+
+import tracemalloc
+
+import mitogen
+import mitogen.core
+
+N = 20000
+
+
+class DictMessage(mitogen.core.Message):
+    pass
+
+
+class DictSender(mitogen.core.Sender):
+    pass
+
+
+class DictLatch(mitogen.core.Latch):
+    pass
+
+
+def do_nothing():
+    pass
+
+
+def measure(func):
+    """
+    Return `(bytes, blocks)` still allocated per call after calling `func()`
+    :data:`N` times and keeping the results alive.
+    """
+    keep = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for x in range(N):
+        keep.append(func())
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    count = sum(stat.count_diff for stat in stats)
+    return size / float(N), count / float(N)
+
+
+def report(name, func, dict_func=None):
+    size, count = measure(func)
+    line = '%-28s %7.1f bytes %5.2f blocks' % (name, size, count)
+    if dict_func is not None:
+        dsize, dcount = measure(dict_func)
+        line += '   (dict-backed: %7.1f bytes %5.2f blocks)' % (dsize, dcount)
+    print(line)
+
+
+@mitogen.main()
+def main(router):
+    context = router.myself()
+    report('Message()', mitogen.core.Message, DictMessage)
+    report('Message.pickled()',
+           lambda: mitogen.core.Message.pickled(None),
+           lambda: DictMessage.pickled(None))
+    report('Sender()',
+           lambda: mitogen.core.Sender(context, 1000),
+           lambda: DictSender(context, 1000))
+    report('Latch()', mitogen.core.Latch, DictLatch)
+
+    child = router.fork()
+    child.call(do_nothing)
+    t0 = mitogen.core.now()
+    report('reply Message per call()',
+           lambda: child.call_async(do_nothing).get())
+    print('%d roundtrips in %.2fs' % (N, mitogen.core.now() - t0))
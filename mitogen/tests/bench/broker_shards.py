@@ -0,0 +1,88 @@
+"""
+Measure CPU seconds spent per GiB by a connection multiplexer and a broker
+shard forked from it during 256 MiB FileService transfers to a local() target
+connected directly, connected via the shard but served by the multiplexer, and
+connected via and served by the shard.
+"""
+
+import os
+import resource
+import tempfile
+
+import mitogen
+import mitogen.core
+import mitogen.service
+
+SIZE = 1048576 * 256
+GiB = 1024.0 * 1048576
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def transfer(context, path):
+    fp = open('/dev/null', 'wb')
+    try:
+        mitogen.service.FileService.get(context, path, fp)
+    finally:
+        fp.close()
+
+
+def make_file(size):
+    fp = tempfile.NamedTemporaryFile()
+    s = os.urandom(1048576 * 16)
+    n = 0
+    while n < size:
+        fp.write(s)
+        n += len(s)
+    fp.flush()
+    return fp
+
+
+def measure(router, shard, name, context, service_context, path):
+    t0 = mitogen.core.now()
+    cpu0 = cpu_time()
+    shard_cpu0 = shard.call(cpu_time)
+    context.call(transfer, service_context, path)
+    shard_cpu1 = shard.call(cpu_time)
+    cpu1 = cpu_time()
+    t1 = mitogen.core.now()
+    print(
+        '%-15s mux %5.2f CPU s/GiB, shard %5.2f CPU s/GiB, %7.2f MiB/s' % (
+            name,
+            (cpu1 - cpu0) / (SIZE / GiB),
+            (shard_cpu1 - shard_cpu0) / (SIZE / GiB),
+            SIZE / 1048576.0 / (t1 - t0),
+        )
+    )
+
+
+@mitogen.main()
+def main(router):
+    bigfile = make_file(SIZE)
+    file_service = mitogen.service.FileService(router)
+    file_service.register(bigfile.name)
+    pool = mitogen.service.Pool(router, [file_service])
+    try:
+        shard = router.fork(name='shard.0')
+        shard.call_service(
+            service_name=mitogen.service.FileService.name(),
+            method_name='register',
+            path=bigfile.name,
+        )
+
+        context = router.local()
+        measure(router, shard, 'direct', context, router.myself(),
+                bigfile.name)
+        context.shutdown(wait=True)
+
+        context = router.local(via=shard)
+        measure(router, shard, 'shard, mux', context, router.myself(),
+                bigfile.name)
+        measure(router, shard, 'shard, shard', context, shard, bigfile.name)
+        context.shutdown(wait=True)
+    finally:
+        pool.stop()
+        bigfile.close()
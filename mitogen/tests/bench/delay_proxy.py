@@ -0,0 +1,79 @@
+"""
+Run a command with its stdin and stdout relayed through this process, data
+in each direction being delayed by a fixed number of seconds, to simulate a
+high latency link. Used as the python_path of a local() context:
+
+    router.local(python_path=[
+        sys.executable, 'delay_proxy.py', '0.05', sys.executable,
+    ])
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+def relay(in_fd, out_fd, close, delay):
+    lock = threading.Condition()
+    queue = []
+
+    def reader():
+        while True:
+            s = os.read(in_fd, 65536)
+            lock.acquire()
+            try:
+                queue.append((time.time() + delay, s))
+                lock.notify()
+            finally:
+                lock.release()
+            if not s:
+                return
+
+    def writer():
+        while True:
+            lock.acquire()
+            try:
+                while not queue:
+                    lock.wait()
+                deadline, s = queue.pop(0)
+            finally:
+                lock.release()
+
+            remaining = deadline - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+            if not s:
+                close()
+                return
+            while s:
+                s = s[os.write(out_fd, s):]
+
+    threads = [
+        threading.Thread(target=reader),
+        threading.Thread(target=writer),
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    return threads
+
+
+def main():
+    delay = float(sys.argv[1])
+    proc = subprocess.Popen(
+        args=sys.argv[2:],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    relay(sys.stdin.fileno(), proc.stdin.fileno(), proc.stdin.close, delay)
+    threads = relay(proc.stdout.fileno(), sys.stdout.fileno(),
+                    sys.stdout.close, delay)
+    for thread in threads:
+        thread.join()
+    sys.exit(proc.wait())
+
+
+if __name__ == '__main__':
+    main()
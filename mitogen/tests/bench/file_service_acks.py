@@ -0,0 +1,82 @@
+"""
+Count the CALL_SERVICE messages handled by the service pool, each waking a
+pool thread, per MiB fetched with FileService.get(), acknowledging every chunk
+as before, and with FileService.ack_size_bytes batching.
+"""
+
+import os
+import sys
+import tempfile
+
+import mitogen
+import mitogen.core
+import mitogen.service
+
+SIZE = 1048576 * 128
+
+#: Simulated round-trip times in seconds, delay_proxy.py adding half to each
+#: direction.
+RTTS = [0.0, 0.01]
+
+DELAY_PROXY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'delay_proxy.py')
+
+
+class CountingPool(mitogen.service.Pool):
+    calls = 0
+
+    def _on_service_call(self, event):
+        self.calls += 1
+        return super(CountingPool, self)._on_service_call(event)
+
+
+def transfer(context, path, ack_size_bytes):
+    mitogen.service.FileService.ack_size_bytes = ack_size_bytes
+    fp = open('/dev/null', 'wb')
+    try:
+        mitogen.service.FileService.get(context, path, fp)
+    finally:
+        fp.close()
+
+
+def make_file(size):
+    fp = tempfile.NamedTemporaryFile()
+    s = os.urandom(1048576 * 16)
+    n = 0
+    while n < size:
+        fp.write(s)
+        n += len(s)
+    fp.flush()
+    return fp
+
+
+@mitogen.main()
+def main(router):
+    bigfile = make_file(SIZE)
+    file_service = mitogen.service.FileService(router)
+    file_service.register(bigfile.name)
+    pool = CountingPool(router, [file_service])
+    try:
+        for rtt in RTTS:
+            for ack_size_bytes in 1, file_service.ack_size_bytes:
+                context = router.local(python_path=[
+                    sys.executable, DELAY_PROXY, str(rtt / 2), sys.executable,
+                ])
+                pool.calls = 0
+                t0 = mitogen.core.now()
+                context.call(transfer, router.myself(), bigfile.name,
+                             ack_size_bytes)
+                t1 = mitogen.core.now()
+                calls = pool.calls - 1  # fetch()
+                print(
+                    'rtt=%3dms ack every %7d bytes: %6.2f CALL_SERVICE/MiB, '
+                    '%6.2f MiB/s' % (
+                        1000 * rtt, ack_size_bytes,
+                        calls / (SIZE / 1048576.0),
+                        SIZE / 1048576.0 / (t1 - t0),
+                    )
+                )
+                context.shutdown(wait=True)
+    finally:
+        pool.stop()
+        bigfile.close()
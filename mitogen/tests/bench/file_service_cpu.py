@@ -0,0 +1,73 @@
+"""
+Measure CPU seconds spent per GiB by the controller and the target during
+1 GiB FileService transfers over local(), with chunks sent as pickled Blobs
+read into fresh strings, and as raw messages read into reused buffers.
+"""
+
+import os
+import resource
+import tempfile
+
+import mitogen
+import mitogen.core
+import mitogen.service
+
+SIZE = 1048576 * 1024
+GiB = 1024.0 * 1048576
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def transfer(context, path, raw):
+    mitogen.service.FileService.raw_chunks = raw
+    fp = open('/dev/null', 'wb')
+    t0 = cpu_time()
+    try:
+        mitogen.service.FileService.get(context, path, fp)
+    finally:
+        fp.close()
+    return cpu_time() - t0
+
+
+def make_file(size):
+    fp = tempfile.NamedTemporaryFile()
+    s = os.urandom(1048576 * 16)
+    n = 0
+    while n < size:
+        fp.write(s)
+        n += len(s)
+    fp.flush()
+    return fp
+
+
+@mitogen.main()
+def main(router):
+    bigfile = make_file(SIZE)
+    file_service = mitogen.service.FileService(router)
+    file_service.register(bigfile.name)
+    pool = mitogen.service.Pool(router, [file_service])
+    try:
+        for raw in False, True:
+            context = router.local()
+            t0 = mitogen.core.now()
+            cpu0 = cpu_time()
+            target_cpu = context.call(transfer, router.myself(),
+                                      bigfile.name, raw)
+            cpu1 = cpu_time()
+            t1 = mitogen.core.now()
+            print(
+                '%-7s controller %5.2f CPU s/GiB, target %5.2f CPU s/GiB, '
+                '%6.2f MiB/s' % (
+                    raw and 'raw' or 'pickled',
+                    (cpu1 - cpu0) / (SIZE / GiB),
+                    target_cpu / (SIZE / GiB),
+                    SIZE / 1048576.0 / (t1 - t0),
+                )
+            )
+            context.shutdown(wait=True)
+    finally:
+        pool.stop()
+        bigfile.close()
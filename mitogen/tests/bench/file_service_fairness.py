@@ -0,0 +1,93 @@
+"""
+Measure how long small FileService transfers take while a large transfer is
+in progress on the same stream, under each FileService.schedule policy. The
+small files are fetched by children of the context fetching the large file,
+so all transfers share its stream.
+"""
+
+import os
+import tempfile
+import time
+
+import mitogen
+import mitogen.core
+import mitogen.service
+
+BIG_SIZE = 1048576 * 256
+SMALL_SIZE = 65536
+SMALL_COUNT = 16
+
+SCHEDULES = [
+    mitogen.service.FileService.SCHEDULE_FIFO,
+    mitogen.service.FileService.SCHEDULE_ROUND_ROBIN,
+    mitogen.service.FileService.SCHEDULE_SHORTEST_FIRST,
+]
+
+
+def transfer(context, path):
+    fp = open('/dev/null', 'wb')
+    t0 = mitogen.core.now()
+    mitogen.service.FileService.get(context, path, fp)
+    fp.close()
+    return mitogen.core.now() - t0
+
+
+def make_file(size):
+    fp = tempfile.NamedTemporaryFile()
+    s = os.urandom(min(size, 1048576 * 16))
+    n = 0
+    while n < size:
+        fp.write(s)
+        n += len(s)
+    fp.flush()
+    return fp
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def run(router, file_service, big, small, parent, children):
+    big_recv = parent.call_async(transfer, router.myself(), big.name)
+    # Let the large transfer fill the window before the small ones queue.
+    time.sleep(0.2)
+    recvs = [
+        child.call_async(transfer, router.myself(), small.name)
+        for child in children
+    ]
+    latencies = [recv.get().unpickle() for recv in recvs]
+    big_duration = big_recv.get().unpickle()
+    print(
+        '%-16s small p50 %8.1fms  p99 %8.1fms  max %8.1fms  '
+        'large %6.2fs' % (
+            file_service.schedule,
+            1000 * percentile(latencies, 50),
+            1000 * percentile(latencies, 99),
+            1000 * max(latencies),
+            big_duration,
+        )
+    )
+
+
+@mitogen.main()
+def main(router):
+    big = make_file(BIG_SIZE)
+    small = make_file(SMALL_SIZE)
+
+    file_service = mitogen.service.FileService(router)
+    file_service.register(big.name)
+    file_service.register(small.name)
+    pool = mitogen.service.Pool(router, [file_service])
+    try:
+        parent = router.local()
+        children = [router.local(via=parent) for _ in range(SMALL_COUNT)]
+        print('%d x %dKiB transfers during one %dMiB transfer' % (
+            SMALL_COUNT, SMALL_SIZE / 1024, BIG_SIZE / 1048576))
+        for schedule in SCHEDULES:
+            file_service.schedule = schedule
+            run(router, file_service, big, small, parent, children)
+    finally:
+        pool.stop()
+        big.close()
+        small.close()
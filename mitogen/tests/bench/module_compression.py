@@ -0,0 +1,114 @@
+"""
+Print the bytes on the wire needed to deliver the module_utils used by common
+Ansible modules, sent as one LOAD_MODULE message per module or as a single
+LOAD_MODULE_BUNDLE, with and without the mitogen.core.ZDICT preset dictionary.
+"""
+
+import os
+import sys
+
+import mitogen.core
+import mitogen.parent
+
+import ansible_mitogen.module_finder
+
+try:
+    import ansible.modules
+    import ansible.module_utils
+except ImportError:
+    sys.stderr.write('ansible is required\n')
+    sys.exit(1)
+
+if not mitogen.core.ZDICT_SUPPORTED:
+    sys.stderr.write('Python 3.3 or newer is required\n')
+    sys.exit(1)
+
+MODULES = [
+    'command',
+    'copy',
+    'file',
+    'lineinfile',
+    'service',
+    'stat',
+    'uri',
+    'user',
+]
+
+MODULES_DIR = os.path.dirname(ansible.modules.__file__)
+MODULE_UTILS_DIR = os.path.dirname(ansible.module_utils.__file__)
+
+
+def on_wire(obj, handle):
+    msg = mitogen.core.Message.pickled(obj, handle=handle)
+    return mitogen.core.Message.HEADER_LEN + len(msg.data)
+
+
+def per_module_size(tups, sources, zdict):
+    return sum(
+        on_wire(tup[:3] + (mitogen.parent.zlib_compress(source, zdict),) +
+                tup[4:], mitogen.core.LOAD_MODULE)
+        for tup, source in zip(tups, sources)
+    )
+
+
+def bundle_size(tups, sources, zdict):
+    return on_wire(mitogen.parent.pack_module_bundle(tups, sources, zdict),
+                   mitogen.core.LOAD_MODULE_BUNDLE)
+
+
+def load(name):
+    resolved = ansible_mitogen.module_finder.scan(
+        module_name='ansible.modules.' + name,
+        module_path=os.path.join(MODULES_DIR, name + '.py'),
+        search_path=(MODULE_UTILS_DIR,),
+    )
+    tups = []
+    sources = []
+    for fullname, path, is_pkg in resolved:
+        fp = open(path, 'rb')
+        try:
+            sources.append(fp.read())
+        finally:
+            fp.close()
+        tups.append((fullname, is_pkg and [] or None, path, None, []))
+    return tups, sources
+
+
+def main():
+    print('ZDICT version %d, %d bytes' % (
+        mitogen.core.ZDICT_VERSION,
+        len(mitogen.core.ZDICT),
+    ))
+    print('')
+    print(
+        '%-12s %4s '
+        '  Per-module  '
+        '  +zdict        '
+        '  Bundle  '
+        '  +zdict       ' % ('module', 'deps')
+    )
+
+    for name in MODULES:
+        tups, sources = load(name)
+        per_module = per_module_size(tups, sources, False)
+        per_module_zdict = per_module_size(tups, sources, True)
+        bundle = bundle_size(tups, sources, False)
+        bundle_zdict = bundle_size(tups, sources, True)
+        print(
+            '%-12s %4d '
+            '%8.1fKiB  %8.1fKiB %5.1f%%  '
+            '%8.1fKiB  %8.1fKiB %5.1f%%' % (
+                name,
+                len(tups),
+                per_module / 1024.0,
+                per_module_zdict / 1024.0,
+                100 * per_module_zdict / float(per_module),
+                bundle / 1024.0,
+                bundle_zdict / 1024.0,
+                100 * bundle_zdict / float(bundle),
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Time how long ModuleFinder takes to resolve every module in the
+ansible.module_utils and ansible_collections.kubernetes.core trees, with and
+without the sys.modules __spec__ fast path, and how long get_child_modules()
+takes to list every package with pkgutil, a cold DirectoryCache and a warm one.
+"""
+
+import os
+import pkgutil
+import sys
+
+import mitogen.core
+import mitogen.master
+
+TREES = [
+    'ansible.module_utils',
+    'ansible_collections.kubernetes.core',
+]
+
+
+class NoSpecModuleFinder(mitogen.master.ModuleFinder):
+    get_module_methods = [
+        method
+        for method in mitogen.master.ModuleFinder.get_module_methods
+        if not isinstance(method, mitogen.master.SysModulesSpecMethod)
+    ]
+
+
+def walk(pkg):
+    """
+    Import every module beneath `pkg`, returning a list of names that
+    imported successfully, and a list of (name, __file__) for packages.
+    """
+    names = [pkg.__name__]
+    packages = []
+    if getattr(pkg, '__file__', None):
+        packages.append((pkg.__name__, pkg.__file__))
+    for root in pkg.__path__:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(dirnames)
+            rel = os.path.relpath(dirpath, root)
+            prefix = pkg.__name__
+            if rel != '.':
+                prefix += '.' + rel.replace(os.sep, '.')
+            for filename in sorted(filenames):
+                if not filename.endswith('.py'):
+                    continue
+                if filename == '__init__.py':
+                    fullname = prefix
+                else:
+                    fullname = '%s.%s' % (prefix, filename[:-3])
+                if fullname == pkg.__name__:
+                    continue
+                try:
+                    __import__(fullname)
+                except Exception:
+                    continue
+                names.append(fullname)
+                if filename == '__init__.py':
+                    path = os.path.join(dirpath, filename)
+                    packages.append((fullname, path))
+    return names, packages
+
+
+def time_finder(klass, names):
+    finder = klass()
+    t0 = mitogen.core.now()
+    for name in names:
+        finder.get_module_source(name)
+        finder.find_related(name)
+    return mitogen.core.now() - t0
+
+
+def time_pkgutil(packages):
+    t0 = mitogen.core.now()
+    for _, path in packages:
+        list(pkgutil.iter_modules([os.path.dirname(path)]))
+    return mitogen.core.now() - t0
+
+
+def time_child_modules(packages):
+    t0 = mitogen.core.now()
+    for fullname, path in packages:
+        mitogen.master.get_child_modules(path, fullname)
+    return mitogen.core.now() - t0
+
+
+def run(tree):
+    try:
+        __import__(tree)
+    except ImportError:
+        sys.stderr.write('%s is not installed, skipping\n' % (tree,))
+        return
+
+    names, packages = walk(sys.modules[tree])
+    print('%s: %d modules, %d packages' % (tree, len(names), len(packages)))
+    print('  find_related(), without spec fast path  %8.1fms' % (
+        1000 * time_finder(NoSpecModuleFinder, names),))
+    print('  find_related(), with spec fast path     %8.1fms' % (
+        1000 * time_finder(mitogen.master.ModuleFinder, names),))
+    print('  get_child_modules(), pkgutil            %8.1fms' % (
+        1000 * time_pkgutil(packages),))
+    mitogen.master._dir_cache = mitogen.master.DirectoryCache()
+    print('  get_child_modules(), cold DirectoryCache %7.1fms' % (
+        1000 * time_child_modules(packages),))
+    print('  get_child_modules(), warm DirectoryCache %7.1fms' % (
+        1000 * time_child_modules(packages),))
+
+
+def main():
+    for tree in TREES:
+        run(tree)
+
+
+if __name__ == '__main__':
+    main()
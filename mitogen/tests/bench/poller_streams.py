@@ -0,0 +1,83 @@
+"""
+Compare throughput of EpollPoller and EdgeEpollPoller when a master broker
+serves many streams from many threads, and count epoll_ctl() calls made by
+each.
+"""
+
+import sys
+import threading
+
+import mitogen.core
+import mitogen.master
+import mitogen.parent
+import mitogen.utils
+
+STREAMS = 32
+THREADS = 32
+CALLS = 100
+SIZES = [256, 65536, 1048576]
+
+
+def echo(s):
+    return s
+
+
+def count_control(poller):
+    counts = [0]
+    real = poller._control
+
+    def _control(*args):
+        counts[0] += 1
+        return real(*args)
+
+    poller._control = _control
+    return counts
+
+
+def run(poller_class, size):
+    broker = mitogen.master.Broker(poller_class=poller_class)
+    router = mitogen.master.Router(broker)
+    try:
+        contexts = [router.fork() for _ in range(STREAMS)]
+        for context in contexts:
+            context.call(echo, None)
+
+        counts = broker.defer_sync(lambda: count_control(broker.poller))
+        s = mitogen.core.b('x') * size
+
+        def worker(n):
+            for x in range(CALLS):
+                contexts[(n + x) % STREAMS].call(echo, s)
+
+        threads = [threading.Thread(target=worker, args=(n,))
+                   for n in range(THREADS)]
+        t0 = mitogen.core.now()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = mitogen.core.now() - t0
+
+        calls = THREADS * CALLS
+        print('%-16s %6d bytes %8.0f calls/s %8.1f MiB/s %8d epoll_ctl' % (
+            poller_class.__name__, size, calls / duration,
+            2 * calls * size / duration / 1048576, counts[0],
+        ))
+    finally:
+        broker.shutdown()
+        broker.join()
+
+
+def main():
+    mitogen.utils.log_to_file()
+    for size in SIZES:
+        for poller_class in (mitogen.parent.EpollPoller,
+                             mitogen.parent.EdgeEpollPoller):
+            if not poller_class.SUPPORTED:
+                sys.stderr.write('%s unsupported\n' % (poller_class,))
+                continue
+            run(poller_class, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare encode and decode times of pickle and mitogen.core.TlvCodec for
+typical CALL_FUNCTION and reply payloads.
+"""
+
+import timeit
+
+import mitogen.core
+
+N = 20000
+
+Kwargs = mitogen.core.Kwargs
+
+JSON_ARGS = (
+    u'{"_raw_params": "uptime", "_uses_shell": false, "argv": null, '
+    u'"chdir": null, "creates": null, "removes": null, "stdin": null, '
+    u'"_ansible_check_mode": false, "_ansible_no_log": false, '
+    u'"_ansible_debug": false, "_ansible_diff": false, '
+    u'"_ansible_verbosity": 0, "_ansible_module_name": "command", '
+    u'"_ansible_tmpdir": null, "_ansible_remote_tmp": "~/.ansible/tmp"}'
+)
+
+RUN_MODULE_KWARGS = {
+    u'runner_name': u'NewStyleRunner',
+    u'module': u'command',
+    u'path': u'/usr/lib/python3/dist-packages/ansible/modules/command.py',
+    u'json_args': JSON_ARGS,
+    u'env': {},
+    u'interpreter_fixup': {},
+    u'module_map': {
+        'builtin': [u'ansible.module_utils.basic'],
+        'custom': [],
+    },
+    u'py_module_name': u'ansible.modules.command',
+    u'good_temp_dir': u'/tmp',
+    u'cwd': None,
+    u'extra_env': None,
+    u'emulate_tty': True,
+    u'service_context': mitogen.core.Context(None, 0),
+}
+
+PAYLOADS = [
+    ('run_module() call', (
+        None, u'ansible_mitogen.target', None, u'run_module', (),
+        Kwargs({'kwargs': RUN_MODULE_KWARGS})
+    )),
+    ('exec_command() call', (
+        None, u'ansible_mitogen.target', None, u'exec_command', (),
+        Kwargs({'args': b'uptime', 'in_data': b'', 'chdir': u'/root',
+                'shell': None, 'emulate_tty': True})
+    )),
+    ('exec_command() reply', (
+        0, b' 12:00:00 up 10 days,  3:04,  1 user,  load average: 0.00\n',
+        b''
+    )),
+    ('run_module() reply', {
+        u'rc': 0, u'stdout': JSON_ARGS, u'stderr': u'',
+    }),
+    ('CallError reply', mitogen.core.CallError(u'builtins.ValueError: x')),
+]
+
+
+def measure(func):
+    return min(timeit.repeat(func, number=N, repeat=5)) / N * 1e6
+
+
+def main():
+    msg = mitogen.core.Message()
+    print('%-22s %-7s %6s %10s %10s' % (
+        'payload', 'codec', 'bytes', 'encode', 'decode'))
+    for name, obj in PAYLOADS:
+        for codec in None, mitogen.core.TlvCodec:
+            mitogen.core.Message.codec = codec
+            data = mitogen.core.Message.pickled(obj).data
+            if data[:1] == mitogen.core.TlvCodec.MAGIC:
+                codec_name = 'tlv'
+            else:
+                codec_name = 'pickle'
+
+            def decode():
+                msg.data = data
+                msg._unpickled = msg._no_unpickled
+                msg.unpickle(throw=False)
+
+            print('%-22s %-7s %6d %8.2fus %8.2fus' % (
+                name, codec_name, len(data),
+                measure(lambda: mitogen.core.Message.pickled(obj)),
+                measure(decode),
+            ))
+    mitogen.core.Message.codec = None
+
+
+if __name__ == '__main__':
+    main()
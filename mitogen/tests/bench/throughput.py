@@ -1,6 +1,8 @@
-# Verify throughput over sudo and SSH at various compression levels.
+# Verify throughput over sudo and SSH at various compression levels, and of
+# FileService window policies over local() contexts with simulated latency.
 
 import os
+import sys
 import tempfile
 
 import mitogen
@@ -41,6 +43,37 @@ def run_test(router, fp, s, context):
     ))
 
 
+#: Simulated round-trip times in seconds, delay_proxy.py adding half to each
+#: direction.
+SWEEP_RTTS = [0.0, 0.01, 0.05, 0.1]
+SWEEP_SIZE = 1048576 * 64
+
+DELAY_PROXY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'delay_proxy.py')
+
+
+def sweep_latency(router, file_service):
+    sweepfile = tempfile.NamedTemporaryFile()
+    fill_with_random(sweepfile, SWEEP_SIZE)
+    sweepfile.flush()
+    file_service.register(sweepfile.name)
+    try:
+        for rtt in SWEEP_RTTS:
+            for adaptive in False, True:
+                file_service.adaptive_window = adaptive
+                context = router.local(python_path=[
+                    sys.executable, DELAY_PROXY, str(rtt / 2), sys.executable,
+                ])
+                s = 'rtt=%dms %s window' % (
+                    1000 * rtt, adaptive and 'adaptive' or 'fixed'
+                )
+                run_test(router, sweepfile, s, context)
+                context.shutdown(wait=True)
+    finally:
+        file_service.adaptive_window = True
+        sweepfile.close()
+
+
 @mitogen.main()
 def main(router):
     ansible_mitogen.affinity.policy.assign_muxprocess()
@@ -57,6 +90,8 @@ def main(router):
         run_test(router, bigfile, 'local()', context)
         context.shutdown(wait=True)
 
+        sweep_latency(router, file_service)
+
         context = router.sudo()
         run_test(router, bigfile, 'sudo()', context)
         context.shutdown(wait=True)
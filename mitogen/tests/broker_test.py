@@ -1,3 +1,5 @@
+import os
+
 try:
     from unittest import mock
 except ImportError:
@@ -65,3 +67,101 @@ class DeferSyncTest(testlib.TestCase):
         finally:
             broker.shutdown()
             broker.join()
+
+
+class FlushWritersTest(testlib.TestCase):
+    klass = mitogen.core.Broker
+
+    def test_writes_coalesced(self):
+        if not mitogen.core.BufferedWriter.batched:
+            self.skipTest('batched writes require Python 3')
+
+        rfp, wfp = mitogen.core.pipe()
+        broker = self.klass()
+        try:
+            protocol = mock.Mock()
+            protocol.stream = mitogen.core.Stream()
+            protocol.stream.transmit_side = mitogen.core.Side(
+                protocol.stream, wfp,
+            )
+            writer = mitogen.core.BufferedWriter(broker, protocol)
+
+            def write_all():
+                for i in range(10):
+                    writer.write(mitogen.core.b('%d,' % (i,)))
+
+            broker.defer_sync(write_all)
+            self.assertEqual(mitogen.core.b('0,1,2,3,4,5,6,7,8,9,'),
+                             rfp.read(20))
+            self.assertEqual(1, broker.writev_count)
+            self.assertEqual(10, broker.writev_buffer_count)
+        finally:
+            broker.shutdown()
+            broker.join()
+            rfp.close()
+            protocol.stream.transmit_side.close()
+
+    def test_message_parts_counted_once(self):
+        if not mitogen.core.BufferedWriter.batched:
+            self.skipTest('batched writes require Python 3')
+
+        rfp, wfp = mitogen.core.pipe()
+        broker = self.klass()
+        try:
+            protocol = mock.Mock()
+            protocol.stream = mitogen.core.Stream()
+            protocol.stream.transmit_side = mitogen.core.Side(
+                protocol.stream, wfp,
+            )
+            writer = mitogen.core.BufferedWriter(broker, protocol)
+
+            def write_all():
+                for i in range(2):
+                    writer.write(mitogen.core.b('head%d,' % (i,)), more=True)
+                    writer.write(mitogen.core.b('body%d,' % (i,)))
+
+            broker.defer_sync(write_all)
+            self.assertEqual(mitogen.core.b('head0,body0,head1,body1,'),
+                             rfp.read(24))
+            self.assertEqual(1, broker.writev_count)
+            self.assertEqual(2, broker.writev_buffer_count)
+        finally:
+            broker.shutdown()
+            broker.join()
+            rfp.close()
+            protocol.stream.transmit_side.close()
+
+    def test_flush_when_buffer_full(self):
+        if not mitogen.core.BufferedWriter.batched:
+            self.skipTest('batched writes require Python 3')
+
+        rfp, wfp = mitogen.core.pipe()
+        broker = self.klass()
+        try:
+            protocol = mock.Mock()
+            protocol.stream = mitogen.core.Stream()
+            protocol.stream.protocol = protocol
+            protocol.stream.transmit_side = mitogen.core.Side(
+                protocol.stream, wfp,
+            )
+            writer = mitogen.core.BufferedWriter(broker, protocol)
+            protocol.on_transmit = writer.on_transmit
+
+            filled = 0
+            while True:
+                try:
+                    filled += os.write(wfp.fileno(), mitogen.core.b('x') * 4096)
+                except OSError:
+                    break
+
+            broker.defer_sync(lambda: writer.write(mitogen.core.b('end')))
+            s = mitogen.core.b('')
+            while len(s) < filled + 3:
+                s += rfp.read(filled + 3 - len(s))
+            self.assertEqual(mitogen.core.b('end'), s[filled:])
+            self.assertTrue(broker.defer_sync(lambda: writer._len == 0))
+        finally:
+            broker.shutdown()
+            broker.join()
+            rfp.close()
+            protocol.stream.transmit_side.close()
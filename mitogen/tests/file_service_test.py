@@ -1,10 +1,74 @@
+import io
+import os
 import sys
+import tempfile
+import unittest
+import zlib
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import mitogen.core
 import mitogen.service
 
 import testlib
 
 
+def get_acknowledged(context, path, ack_size_bytes, ack_interval):
+    """
+    Fetch `path` from `context`, returning the size passed to each
+    acknowledge() call.
+    """
+    klass = mitogen.service.FileService
+    sizes = []
+    acknowledge = klass._acknowledge
+
+    def _acknowledge(cls, context, recv, size):
+        sizes.append(size)
+        acknowledge(context, recv, size)
+
+    klass._acknowledge = classmethod(_acknowledge)
+    klass.ack_size_bytes = ack_size_bytes
+    klass.ack_interval = ack_interval
+    ok, metadata = klass.get(context, path, io.BytesIO())
+    assert ok
+    return sizes
+
+
+def get_failing(context, path, fail_after):
+    """
+    Fetch `path` from `context` into a file whose write() fails once it would
+    exceed `fail_after` bytes, returning :data:`True` if get() raised.
+    """
+    class FailingFile(io.BytesIO):
+        def write(self, s):
+            if self.tell() + len(s) > fail_after:
+                raise IOError('disk full')
+            return io.BytesIO.write(self, s)
+
+    try:
+        mitogen.service.FileService.get(context, path, FailingFile())
+    except IOError:
+        return True
+    return False
+
+
+def get_data(context, path, raw_chunks=True, prefix=None, if_range=None):
+    mitogen.service.FileService.raw_chunks = raw_chunks
+    fp = io.BytesIO()
+    offset = 0
+    if prefix:
+        fp.write(prefix)
+        offset = len(prefix)
+    ok, metadata = mitogen.service.FileService.get(context, path, fp,
+                                                   offset=offset,
+                                                   if_range=if_range)
+    assert ok
+    return mitogen.core.Blob(fp.getvalue())
+
+
 class FetchTest(testlib.RouterMixin, testlib.TestCase):
     klass = mitogen.service.FileService
 
@@ -92,6 +156,20 @@ class FetchTest(testlib.RouterMixin, testlib.TestCase):
         )
         self._validate_response(recv.get().unpickle())
 
+    def test_bad_priority(self):
+        service = self.klass(self.router)
+        service.register('/etc/passwd')
+        recv, msg = self.replyable_msg()
+        service.fetch(
+            path='/etc/passwd',
+            sender=recv.to_sender(),
+            msg=msg,
+            priority=0,
+        )
+        e = self.assertRaises(mitogen.core.CallError,
+                              lambda: recv.get().unpickle())
+        self.assertIn(service.bad_priority_msg % (0,), e.args[0])
+
     def test_prefix_authorized_abspath_bad(self):
         l1 = self.router.local()
 
@@ -145,3 +223,295 @@ class FetchTest(testlib.RouterMixin, testlib.TestCase):
 
         expect = service.unregistered_msg % (path,)
         self.assertIn(expect, e.args[0])
+
+
+class GetTest(testlib.RouterMixin, testlib.TestCase):
+    klass = mitogen.service.FileService
+
+    def setUp(self):
+        super(GetTest, self).setUp()
+        self.service = self.klass(self.router)
+        self.service.adaptive_window = False
+        self.pool = mitogen.service.Pool(
+            router=self.router,
+            services=[self.service],
+            size=1,
+        )
+        self.fp = tempfile.NamedTemporaryFile()
+
+    def tearDown(self):
+        self.pool.stop()
+        self.fp.close()
+        super(GetTest, self).tearDown()
+
+    def make_file(self, size):
+        self.fp.write(mitogen.core.b('x') * size)
+        self.fp.flush()
+        self.service.register(self.fp.name)
+
+    def test_ack_size(self):
+        size = 8 * self.klass.IO_SIZE + 1000
+        self.make_file(size)
+        sizes = self.router.local().call(get_acknowledged,
+            context=self.router.myself(),
+            path=self.fp.name,
+            ack_size_bytes=2 * self.klass.IO_SIZE,
+            ack_interval=60.0,
+        )
+        self.assertEqual([2 * self.klass.IO_SIZE] * 4 + [1000], sizes)
+
+    def _test_data(self, raw_chunks):
+        self.make_file(3 * self.klass.IO_SIZE + 1000)
+        self.fp.seek(0)
+        expect = self.fp.read()
+        data = self.router.local().call(get_data,
+            context=self.router.myself(),
+            path=self.fp.name,
+            raw_chunks=raw_chunks,
+        )
+        self.assertEqual(expect, data)
+
+    def test_raw_chunks(self):
+        self._test_data(raw_chunks=True)
+
+    def test_pickled_chunks(self):
+        self._test_data(raw_chunks=False)
+
+    def get_resumed(self, prefix, if_range):
+        return self.router.local().call(get_data,
+            context=self.router.myself(),
+            path=self.fp.name,
+            prefix=mitogen.core.Blob(prefix),
+            if_range=if_range,
+        )
+
+    def test_resume(self):
+        self.make_file(3 * self.klass.IO_SIZE + 1000)
+        self.fp.seek(0)
+        expect = self.fp.read()
+        st = os.stat(self.fp.name)
+        data = self.get_resumed(expect[:1000],
+                                (st.st_size, float(st.st_mtime)))
+        self.assertEqual(expect, data)
+
+    def test_resume_changed(self):
+        self.make_file(3 * self.klass.IO_SIZE + 1000)
+        self.fp.seek(0)
+        expect = self.fp.read()
+        data = self.get_resumed(mitogen.core.b('y') * 1000, (1, 1.0))
+        self.assertEqual(expect, data)
+
+    def test_checksum(self):
+        self.make_file(3 * self.klass.IO_SIZE + 1000)
+        self.fp.seek(0)
+        expect = zlib.crc32(self.fp.read()) & 0xffffffff
+        for _ in range(2):
+            result = self.service.checksum(path=self.fp.name,
+                                           msg=mitogen.core.Message())
+            self.assertEqual(expect, result['crc32'])
+            self.assertEqual(3 * self.klass.IO_SIZE + 1000, result['size'])
+        self.assertEqual([self.fp.name], list(self.service._checksums))
+
+    def test_receiver_aborts(self):
+        size = 4 * self.service.window_size_bytes
+        self.make_file(size)
+        context = self.router.local()
+        self.assertTrue(context.call(get_failing,
+            context=self.router.myself(),
+            path=self.fp.name,
+            fail_after=self.klass.IO_SIZE,
+        ))
+
+        state, = self.service._state_by_stream.values()
+        deadline = mitogen.core.now() + 10.0
+        while state.job_by_key and mitogen.core.now() < deadline:
+            context.call(os.getpid)
+        self.assertEqual({}, state.job_by_key)
+        self.assertEqual([], state.jobs)
+        self.assertEqual(0, state.unacked)
+
+        # The stream's window is not held by the aborted transfer.
+        self.fp.seek(0)
+        expect = self.fp.read()
+        self.assertEqual(expect, context.call(get_data,
+            context=self.router.myself(),
+            path=self.fp.name,
+        ))
+        self.assertEqual({}, state.job_by_key)
+        self.assertEqual(0, state.unacked)
+
+    def test_ack_interval(self):
+        # Larger than the window, so only the timer keeps the transfer going.
+        size = 2 * self.service.window_size_bytes
+        self.make_file(size)
+        sizes = self.router.local().call(get_acknowledged,
+            context=self.router.myself(),
+            path=self.fp.name,
+            ack_size_bytes=size + 1,
+            ack_interval=0.01,
+        )
+        self.assertEqual(size, sum(sizes))
+        self.assertTrue(len(sizes) > 1)
+
+
+class WindowTest(testlib.TestCase):
+    klass = mitogen.service.FileService
+    MiB = 1048576
+
+    def setUp(self):
+        super(WindowTest, self).setUp()
+        self.service = self.klass(mock.Mock())
+        self.state = mitogen.service.FileStreamState(self.MiB)
+        self.job = mitogen.service.FileJob(mock.Mock(), None, 0)
+        self.state.jobs.append(self.job)
+        self.now = 0.0
+        patcher = mock.patch('mitogen.core.now', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def round_trip(self, rtt, size):
+        """
+        Send `size` bytes, then after `rtt` seconds acknowledge them.
+        """
+        job = self.job
+        self.state.sent += size
+        job.sent += size
+        job.send_times.append((job.sent, self.now))
+        self.now += rtt
+        self.service._update_window_unlocked(self.state, job, size)
+
+    def test_grows_with_latency(self):
+        self.round_trip(0.125, self.MiB)
+        self.assertEqual(0.125, self.state.min_rtt)
+        self.assertEqual(self.MiB, self.state.window)
+        # 1MiB per 125ms RTT is 8MiB/s, whose BDP is 1MiB.
+        self.round_trip(0.125, self.MiB)
+        self.assertEqual(2 * self.MiB, self.state.window)
+        self.round_trip(0.125, 2 * self.MiB)
+        self.assertEqual(4 * self.MiB, self.state.window)
+
+    def test_ceiling(self):
+        self.round_trip(1.0, self.MiB)
+        self.round_trip(1.0, 1024 * self.MiB)
+        self.assertEqual(self.service.max_window_size_bytes,
+                         self.state.window)
+
+    def test_shrinks_to_floor(self):
+        self.round_trip(0.001, 65536)
+        self.round_trip(0.001, 65536)
+        self.assertEqual(self.service.min_window_size_bytes,
+                         self.state.window)
+
+    def test_app_limited_no_shrink(self):
+        self.round_trip(0.001, 65536)
+        self.state.app_limited = True
+        self.round_trip(0.001, 65536)
+        self.assertEqual(self.MiB, self.state.window)
+
+    def test_fixed(self):
+        self.service.adaptive_window = False
+        self.round_trip(0.1, self.MiB)
+        self.round_trip(0.1, self.MiB)
+        self.assertEqual(self.MiB, self.state.window)
+
+
+class ScheduleTest(testlib.TestCase):
+    klass = mitogen.service.FileService
+
+    def setUp(self):
+        super(ScheduleTest, self).setUp()
+        self.service = self.klass(mock.Mock())
+        self.service.IO_SIZE = 1
+        self.service.adaptive_window = False
+        self.state = mitogen.service.FileStreamState(1024)
+        self.sent = []
+
+    def add_job(self, name, size, priority=1, raw=False):
+        sender = mock.Mock()
+        sender.send.side_effect = lambda blob: self.sent.append(name)
+        sender.context.send.side_effect = lambda msg: self.sent.append(name)
+        fp = io.BytesIO(mitogen.core.b('x') * size)
+        job = mitogen.service.FileJob(sender, fp, size, priority, raw)
+        self.state.jobs.append(job)
+        self.state.job_by_key[job.key] = job
+        return job
+
+    def run_schedule(self, schedule):
+        self.service.schedule = schedule
+        self.service._schedule_pending_unlocked(self.state)
+        return ''.join(self.sent)
+
+    def test_fifo(self):
+        self.add_job('a', 3)
+        self.add_job('b', 2)
+        self.assertEqual('aaabb', self.run_schedule(self.klass.SCHEDULE_FIFO))
+
+    def test_round_robin(self):
+        self.add_job('a', 4)
+        self.add_job('b', 2)
+        self.add_job('c', 1)
+        self.assertEqual('abcabaa', self.run_schedule(
+            self.klass.SCHEDULE_ROUND_ROBIN))
+
+    def test_round_robin_priority(self):
+        self.add_job('a', 4)
+        self.add_job('b', 4, priority=3)
+        self.assertEqual('abbbabaa', self.run_schedule(
+            self.klass.SCHEDULE_ROUND_ROBIN))
+
+    def test_shortest_first(self):
+        self.add_job('a', 4)
+        self.add_job('b', 2)
+        self.add_job('c', 3, priority=2)
+        self.assertEqual('cccbbaaaa', self.run_schedule(
+            self.klass.SCHEDULE_SHORTEST_FIRST))
+
+    def test_finished_jobs_closed(self):
+        a = self.add_job('a', 1)
+        b = self.add_job('b', 2)
+        self.run_schedule(self.klass.SCHEDULE_ROUND_ROBIN)
+        self.assertEqual([], self.state.jobs)
+        self.assertTrue(a.sender.close.called)
+        self.assertTrue(b.fp.closed)
+
+    def test_raw(self):
+        job = self.add_job('a', 2, raw=True)
+        self.run_schedule(self.klass.SCHEDULE_FIFO)
+        self.assertFalse(job.sender.send.called)
+        msg, = job.sender.context.send.call_args_list[0][0]
+        self.assertEqual(job.sender.dst_handle, msg.handle)
+        self.assertEqual(mitogen.core.b('x'), bytes(msg.data))
+
+    @unittest.skipIf(not mitogen.service.FileService.reuse_buffers,
+                     'buffers are not reused on this Python')
+    def test_buffers_reused_after_ack(self):
+        self.state.window = 2
+        job = self.add_job('a', 4, raw=True)
+        self.run_schedule(self.klass.SCHEDULE_FIFO)
+        self.assertEqual(2, len(job.busy_buffers))
+        first = job.busy_buffers[0][1]
+
+        job.acked = 1
+        self.state.unacked = 1
+        self.service._release_buffers_unlocked(self.state, job)
+        self.assertEqual([first], self.state.free_buffers)
+        self.service._schedule_pending_unlocked(self.state)
+        self.assertIs(first, job.busy_buffers[-1][1])
+        self.assertEqual([], self.state.free_buffers)
+
+    def test_target_disconnect(self):
+        self.state.window = 2
+        a = self.add_job('a', 4, raw=True)
+        b = self.add_job('b', 4, raw=True)
+        self.run_schedule(self.klass.SCHEDULE_FIFO)
+        self.assertEqual('aa', ''.join(self.sent))
+
+        # a's unacknowledged bytes are credited, and b may use the window.
+        self.service._on_target_disconnect(self.state,
+                                           a.sender.context.context_id)
+        self.assertTrue(a.fp.closed)
+        self.assertEqual([], a.busy_buffers)
+        self.assertEqual([b], self.state.jobs)
+        self.assertEqual([b.key], list(self.state.job_by_key))
+        self.assertEqual('aabb', ''.join(self.sent))
+        self.assertEqual(2, self.state.unacked)
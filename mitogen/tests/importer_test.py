@@ -1,4 +1,7 @@
+import os
+import shutil
 import sys
+import tempfile
 import threading
 import types
 import zlib
@@ -10,6 +13,7 @@ except ImportError:
     import mock
 
 import mitogen.core
+import mitogen.parent
 import mitogen.utils
 from mitogen.core import b
 
@@ -253,6 +257,220 @@ class PackageSpecTest(ImporterMixin, testlib.TestCase):
             mitogen.core.to_text(zlib.decompress(self.data)))
 
 
+class LoadModuleBundleTest(ImporterMixin, testlib.TestCase):
+    modname = 'fake_bundled'
+
+    # 0:fullname 1:pkg_present 2:path 3:compressed 4:related
+    tups = [
+        ('fake_bundled_missing', None, None, None, []),
+        ('fake_bundled_dep', None, 'fake_bundled_dep.py', None, []),
+        (modname, None, 'fake_bundled.py', None, ['fake_bundled_dep']),
+    ]
+    sources = [None, b('dep = 1\n'), b('data = 2\n')]
+
+    def deliver(self):
+        self.importer._on_load_module_bundle(
+            mitogen.core.Message.pickled(
+                mitogen.parent.pack_module_bundle(self.tups, self.sources)
+            )
+        )
+
+    def test_cached(self):
+        self.deliver()
+        self.assertEqual(b('dep = 1\n'),
+                         self.importer.get_source_bytes('fake_bundled_dep'))
+        self.assertEqual(b('data = 2\n'),
+                         self.importer.get_source_bytes(self.modname))
+        self.assertEqual(None,
+                         self.importer.get_source_bytes('fake_bundled_missing'))
+        self.assertRaises(ImportError, self.importer.get_source,
+                          'fake_bundled_missing')
+        self.assertEqual(['fake_bundled_dep'],
+                         self.importer._cache[self.modname][4])
+
+    def test_callbacks_fired(self):
+        fired = []
+        self.importer._request_module(self.modname, lambda: fired.append(1))
+        self.importer._request_module('fake_bundled_dep',
+                                      lambda: fired.append(2))
+        self.deliver()
+        self.assertEqual([1, 2], sorted(fired))
+        self.assertEqual({}, self.importer._callbacks)
+
+    def test_later_load_module_replaces(self):
+        self.deliver()
+        self.importer._on_load_module(mitogen.core.Message.pickled(
+            (self.modname, None, 'fake_bundled.py',
+             zlib.compress(b('data = 3\n')), [])
+        ))
+        self.assertEqual(b('data = 3\n'),
+                         self.importer.get_source_bytes(self.modname))
+
+
+@unittest.skipIf(not mitogen.core.ZDICT_SUPPORTED, 'Requires zdict support')
+class LoadModuleZdictTest(ImporterMixin, testlib.TestCase):
+    modname = 'fake_zdict'
+    source = b('from ansible.module_utils.basic import AnsibleModule\n')
+
+    def test_get_module_advertises_version(self):
+        self.set_get_module_response(
+            (self.modname, None, None, None, [])
+        )
+        self.importer._request_module(self.modname, lambda: None)
+        self.assertEqual(
+            ([self.modname], mitogen.core.ZDICT_VERSION, 0),
+            mitogen.parent.parse_get_module(self.context_send_msg.data),
+        )
+
+    def test_stored_uncompressed(self):
+        compressed = mitogen.parent.zlib_compress(self.source, zdict=True)
+        self.assertTrue(mitogen.core.is_zdict_compressed(compressed))
+        self.importer._on_load_module(mitogen.core.Message.pickled(
+            (self.modname, None, 'fake_zdict.py', compressed, [])
+        ))
+        self.assertIn(self.modname, self.importer._uncompressed)
+        self.assertEqual(self.source,
+                         self.importer.get_source_bytes(self.modname))
+
+    def test_bundle(self):
+        tups = [(self.modname, None, 'fake_zdict.py', None, [])]
+        self.importer._on_load_module_bundle(mitogen.core.Message.pickled(
+            mitogen.parent.pack_module_bundle(tups, [self.source], zdict=True)
+        ))
+        self.assertEqual(self.source,
+                         self.importer.get_source_bytes(self.modname))
+
+
+class PrefetchTest(ImporterMixin, testlib.TestCase):
+    modname = 'fake_prefetch'
+
+    def setUp(self):
+        super(PrefetchTest, self).setUp()
+        self.sent = []
+        self.context.send = self.sent.append
+
+    def test_single_message(self):
+        names = self.importer.prefetch(['fake_prefetch', 'fake_prefetch2'])
+        self.assertEqual([u'fake_prefetch', u'fake_prefetch2'], names)
+        self.assertEqual(1, len(self.sent))
+        self.assertEqual(mitogen.core.GET_MODULE, self.sent[0].handle)
+        self.assertEqual(names,
+            mitogen.parent.parse_get_module(self.sent[0].data)[0])
+
+    def test_skips_known(self):
+        self.importer.prefetch(['fake_prefetch'])
+        self.assertEqual([], self.importer.prefetch(['fake_prefetch', 'sys']))
+        self.assertEqual(1, len(self.sent))
+
+    def test_request_waits_on_prefetch(self):
+        self.importer.prefetch(['fake_prefetch'])
+        called = []
+        self.importer._request_module('fake_prefetch',
+                                      lambda: called.append(True))
+        self.assertEqual(1, len(self.sent))
+        self.assertEqual([], called)
+
+        self.importer._on_load_module(mitogen.core.Message.pickled(
+            (self.modname, None, 'fake_prefetch.py',
+             zlib.compress(b('data = 1\n')), [])
+        ))
+        self.assertEqual([True], called)
+
+
+class StdlibRefusalTest(ImporterMixin, testlib.TestCase):
+    modname = 'fake_stdlib'
+
+    def setUp(self):
+        super(StdlibRefusalTest, self).setUp()
+        self.importer.stdlib_names = frozenset([self.modname])
+
+    def find(self, fullname):
+        if sys.version_info >= (3, 4):
+            return self.importer.find_spec(fullname, path=None)
+        return self.importer.find_module(fullname)
+
+    def test_refused(self):
+        self.assertIsNone(self.find(self.modname))
+        self.assertEqual(1, self.importer.avoided_get_module_count)
+
+    def test_available_locally(self):
+        self.importer.stdlib_names = frozenset(['zlib'])
+        self.find('zlib')
+        self.assertEqual(0, self.importer.avoided_get_module_count)
+
+    def test_other_names_handled(self):
+        self.assertIs(self.importer, getattr(self.find('fake_not_stdlib'),
+                                             'loader', self.importer))
+        self.assertEqual(0, self.importer.avoided_get_module_count)
+
+    def test_count_reported(self):
+        self.find(self.modname)
+        sent = []
+        self.context.send = sent.append
+        self.importer._request_module('other', lambda: None)
+        fullnames, _, avoided = mitogen.parent.parse_get_module(sent[0].data)
+        self.assertEqual([u'other'], fullnames)
+        self.assertEqual(1, avoided)
+
+
+class CodeCacheTest(ImporterMixin, testlib.TestCase):
+    modname = 'fake_cached'
+    path = 'fake_cached.py'
+
+    def setUp(self):
+        super(CodeCacheTest, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp(prefix='mitogen_code_cache_')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(CodeCacheTest, self).tearDown()
+
+    def make_importer(self, source):
+        importer = mitogen.core.Importer(mock.Mock(), self.context, '')
+        importer.set_code_cache_dir(self.cache_dir)
+        importer._on_load_module(mitogen.core.Message.pickled(
+            (self.modname, None, self.path, zlib.compress(source), [])
+        ))
+        return importer
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.importer.code_cache_dir)
+
+    def test_reused(self):
+        code = self.make_importer(b('data = 1\n')).get_code(self.modname)
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+        importer = self.make_importer(b('data = 1\n'))
+        with mock.patch.object(mitogen.core, 'compile', create=True) as comp:
+            self.assertEqual(code, importer.get_code(self.modname))
+        self.assertFalse(comp.called)
+
+    def test_hit_decompresses_once(self):
+        self.make_importer(b('data = 1\n')).get_code(self.modname)
+        importer = self.make_importer(b('data = 1\n'))
+        with mock.patch.object(importer, 'get_source') as get_source:
+            with mock.patch('zlib.decompress',
+                            wraps=zlib.decompress) as decompress:
+                importer.get_code(self.modname)
+        self.assertFalse(get_source.called)
+        self.assertEqual(1, decompress.call_count)
+
+    def test_source_change(self):
+        self.make_importer(b('data = 1\n')).get_code(self.modname)
+        code = self.make_importer(b('data = 2\n')).get_code(self.modname)
+        ns = {}
+        exec(code, ns)
+        self.assertEqual(2, ns['data'])
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+    def test_not_private(self):
+        os.mkdir(self.cache_dir)
+        os.chmod(self.cache_dir, int('777', 8))
+        importer = self.make_importer(b('data = 1\n'))
+        self.assertIsNone(importer.code_cache_dir)
+
+
 class EmailParseAddrSysTest(testlib.RouterMixin, testlib.TestCase):
     def initdir(self, caplog):
         self.caplog = caplog
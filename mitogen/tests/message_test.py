@@ -63,6 +63,13 @@ class ConstructorTest(testlib.TestCase):
         self.assertRaises(Exception,
             lambda: self.klass(data=u'asdf'))
 
+    def test_unknown_kwarg_rejected(self):
+        self.assertRaises(TypeError,
+            lambda: self.klass(data=b(''), bogus=1))
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(self.klass(), '__dict__'))
+
 
 class PackTest(testlib.TestCase):
     klass = mitogen.core.Message
@@ -541,3 +548,102 @@ class ReprTest(testlib.TestCase):
     def test_repr(self):
         # doesn't crash
         repr(self.klass.pickled('test'))
+
+
+class TlvPickledTest(PickledTest):
+    def setUp(self):
+        super(TlvPickledTest, self).setUp()
+        self.klass.codec = mitogen.core.TlvCodec
+
+    def tearDown(self):
+        self.klass.codec = None
+        super(TlvPickledTest, self).tearDown()
+
+    def test_uses_tlv(self):
+        msg = self.klass.pickled((1, u'a', b('b'), None))
+        self.assertEqual(msg.data[:1], mitogen.core.TlvCodec.MAGIC)
+
+    def test_too_many_parts_pickled(self):
+        l = list(range(mitogen.core.TlvCodec.max_parts + 1))
+        msg = self.klass.pickled(l)
+        self.assertNotEqual(msg.data[:1], mitogen.core.TlvCodec.MAGIC)
+        self.assertEqual(l, msg.unpickle())
+
+    def test_nested_too_many_parts_not_encoded(self):
+        kwargs = dict(('k%d' % (i,), i) for i in range(20))
+        obj = (None, u'mod', None, u'func', (),
+               mitogen.core.Kwargs({'kwargs': kwargs}))
+        self.assertFalse(mitogen.core.TlvCodec.accepts(obj))
+        with mock.patch.object(mitogen.core.TlvCodec, 'dumps') as dumps:
+            msg = self.klass.pickled(obj)
+        self.assertFalse(dumps.called)
+        self.assertEqual(obj, msg.unpickle())
+
+    def test_big_int(self):
+        for i in -(1 << 70), (1 << 70):
+            self.assertEqual(i, self.roundtrip(i))
+
+    def test_float(self):
+        self.assertEqual(1.5, self.roundtrip(1.5))
+
+    def test_kwargs(self):
+        roundtrip = self.roundtrip(mitogen.core.Kwargs({'a': 1}))
+        self.assertIsInstance(roundtrip, mitogen.core.Kwargs)
+        self.assertEqual({'a': 1}, roundtrip)
+
+    def test_memoryview_data(self):
+        data = self.klass.pickled((1, u'a')).data
+        msg = self.klass(data=memoryview(data))
+        self.assertEqual((1, u'a'), msg.unpickle())
+
+    def test_truncated_fails(self):
+        data = self.klass.pickled((1, u'abc')).data
+        msg = self.klass(data=data[:-1])
+        self.assertRaises(mitogen.core.StreamError, msg.unpickle)
+
+    def test_trailing_bytes_fails(self):
+        data = self.klass.pickled((1, u'abc')).data
+        msg = self.klass(data=data + b('x'))
+        self.assertRaises(mitogen.core.StreamError, msg.unpickle)
+
+    def test_bad_tag_fails(self):
+        msg = self.klass(data=mitogen.core.TlvCodec.MAGIC + b('z'))
+        self.assertRaises(mitogen.core.StreamError, msg.unpickle)
+
+    def test_deep_nesting_fails(self):
+        depth = 100000
+        data = (mitogen.core.TlvCodec.MAGIC +
+                b('l\x00\x00\x00\x01') * depth + b('N'))
+        msg = self.klass(data=data)
+        self.assertRaises(mitogen.core.StreamError, msg.unpickle)
+
+    def test_huge_length_fails(self):
+        data = mitogen.core.TlvCodec.MAGIC + b('l\xff\xff\xff\xff')
+        msg = self.klass(data=data)
+        self.assertRaises(mitogen.core.StreamError, msg.unpickle)
+
+    def test_rejected_when_disabled(self):
+        data = self.klass.pickled((1, u'abc')).data
+        self.klass.codec = None
+        msg = self.klass(data=data)
+        self.assertRaises(mitogen.core.pickle.UnpicklingError, msg.unpickle)
+
+
+def get_codec_name():
+    codec = mitogen.core.Message.codec
+    return codec and codec.__name__
+
+
+class TlvNegotiationTest(testlib.RouterMixin, testlib.TestCase):
+    def tearDown(self):
+        mitogen.core.Message.codec = None
+        super(TlvNegotiationTest, self).tearDown()
+
+    def test_child_inherits_codec(self):
+        mitogen.core.Message.codec = mitogen.core.TlvCodec
+        c = self.router.local()
+        self.assertEqual(u'TlvCodec', c.call(get_codec_name))
+
+    def test_child_defaults_to_pickle(self):
+        c = self.router.local()
+        self.assertEqual(None, c.call(get_codec_name))
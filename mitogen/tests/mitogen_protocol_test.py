@@ -3,7 +3,9 @@ try:
 except ImportError:
     import mock
 
+import mitogen
 import mitogen.core
+from mitogen.core import b
 
 import testlib
 
@@ -29,3 +31,103 @@ class ReceiveOneTest(testlib.TestCase):
         self.assertEqual(1, stream.on_disconnect.call_count)
         expect = self.klass.corrupt_msg % (stream.name, junk)
         self.assertIn(expect, capture.raw())
+
+
+class ReceiveRingTest(testlib.TestCase):
+    klass = mitogen.core.MitogenProtocol
+
+    def setUp(self):
+        super(ReceiveRingTest, self).setUp()
+        if not self.klass.use_ring:
+            self.skipTest('receive ring requires Python 3')
+        self.broker = mock.Mock()
+        self.router = mock.Mock()
+        self.router.max_message_size = 128 * 1048576
+        self.router._async_forward.return_value = False
+        self.protocol = self.klass(self.router, 1)
+        self.protocol.stream = mock.Mock()
+
+    def _frame(self, data, dst_id=None):
+        if dst_id is None:
+            dst_id = mitogen.context_id
+        return mitogen.core.Message(dst_id=dst_id, handle=1000,
+                                    data=data).pack()
+
+    def _received(self):
+        return [
+            args[0].data
+            for args, _ in self.router._async_route.call_args_list
+        ]
+
+    def test_split_frames(self):
+        frames = self._frame(b('a') * 100) + self._frame(b('b') * 300)
+        for i in range(0, len(frames), 7):
+            self.protocol.on_receive(self.broker, frames[i:i+7])
+        self.assertEqual(self._received(), [b('a') * 100, b('b') * 300])
+
+    def test_large_data_is_readonly_view(self):
+        payload = b('a') * self.klass.min_view_size
+        self.protocol.on_receive(self.broker, self._frame(payload))
+        data, = self._received()
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(payload, data)
+        if hasattr(data, 'toreadonly'):
+            self.assertTrue(data.readonly)
+
+    def test_small_data_is_copied(self):
+        self.protocol.on_receive(self.broker, self._frame(b('abc')))
+        data, = self._received()
+        self.assertIsInstance(data, mitogen.core.BytesType)
+        self.assertEqual(b('abc'), data)
+        self.assertFalse(self.protocol._ring_exported)
+
+    def test_wrapped_frame_preserves_earlier_data(self):
+        self.protocol.ring_size = 64
+        self.protocol.read_size = 64
+        first = self._frame(b('x') * 10)
+        second = self._frame(b('y') * 100)
+        self.protocol.on_receive(self.broker, first + second[:20])
+        self.protocol.on_receive(self.broker, second[20:])
+        self.assertEqual(self._received(), [b('x') * 10, b('y') * 100])
+
+    def test_get_read_buffer(self):
+        frame = self._frame(b('z') * 50)
+        buf = self.protocol.get_read_buffer()
+        self.assertEqual(self.protocol.read_size, len(buf))
+        buf[:len(frame)] = frame
+        self.protocol.on_receive_into(self.broker, len(frame))
+        self.assertEqual(self._received(), [b('z') * 50])
+
+    def test_forward_skips_message(self):
+        self.router._async_forward.return_value = True
+        frame = self._frame(b('fwd'), dst_id=mitogen.context_id + 1)
+        self.protocol.on_receive(self.broker, frame)
+        self.assertEqual(0, self.router._async_route.call_count)
+        (view, dst_id, src_id, auth_id, stream), _ = \
+            self.router._async_forward.call_args
+        self.assertEqual(frame, view)
+        self.assertEqual(mitogen.context_id + 1, dst_id)
+        self.assertEqual(self.protocol.stream, stream)
+
+    def test_forward_small_frame_is_copied(self):
+        self.router._async_forward.return_value = True
+        frame = self._frame(b('fwd'), dst_id=mitogen.context_id + 1)
+        self.protocol.on_receive(self.broker, frame)
+        (data, _, _, _, _), _ = self.router._async_forward.call_args
+        self.assertIsInstance(data, mitogen.core.BytesType)
+        self.assertFalse(self.protocol._ring_exported)
+
+    def test_forward_large_frame_is_view(self):
+        self.router._async_forward.return_value = True
+        payload = b('a') * self.klass.min_view_size
+        frame = self._frame(payload, dst_id=mitogen.context_id + 1)
+        self.protocol.on_receive(self.broker, frame)
+        (data, _, _, _, _), _ = self.router._async_forward.call_args
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(frame, data)
+
+    def test_forward_refused_falls_back(self):
+        frame = self._frame(b('fwd'), dst_id=mitogen.context_id + 1)
+        self.protocol.on_receive(self.broker, frame)
+        self.assertEqual(1, self.router._async_forward.call_count)
+        self.assertEqual(self._received(), [b('fwd')])
@@ -1,7 +1,10 @@
 import inspect
 import json
 import os
+import pkgutil
+import shutil
 import sys
+import tempfile
 import unittest
 
 import mitogen.master
@@ -108,6 +111,44 @@ class PkgutilMethodTest(testlib.TestCase):
         self.assertFalse(is_pkg)
 
 
+@unittest.skipIf(sys.version_info < (3, 4), 'requires __spec__')
+class SysModulesSpecMethodTest(testlib.TestCase):
+    klass = mitogen.master.SysModulesSpecMethod
+
+    def call(self, fullname):
+        return self.klass().find(fullname)
+
+    def test_regular_mod(self):
+        from module_finder_testmod import regular_mod
+        path, src, is_pkg = self.call('module_finder_testmod.regular_mod')
+        self.assertEqual(path, regular_mod.__file__)
+        with open(path, 'rb') as f:
+            self.assertEqual(src, f.read())
+        self.assertFalse(is_pkg)
+
+    def test_pkg(self):
+        import module_finder_testmod
+        path, src, is_pkg = self.call('module_finder_testmod')
+        self.assertEqual(path, module_finder_testmod.__file__)
+        self.assertTrue(is_pkg)
+
+    def test_not_imported_fails(self):
+        self.assertIsNone(self.call('module_finder_testmod.not_a_module'))
+
+    def test_renamed_fails(self):
+        # #590: the distro package replaces itself with its _distro child.
+        import pkg_like_ansible.module_utils.distro
+        tup = self.call('pkg_like_ansible.module_utils.distro')
+        self.assertIsNone(tup)
+
+    def test_dylib_fails(self):
+        import _socket
+        self.assertIsNone(self.call('_socket'))
+
+    def test_builtin_fails(self):
+        self.assertIsNone(self.call('sys'))
+
+
 class SysModulesMethodTest(testlib.TestCase):
     klass = mitogen.master.SysModulesMethod
 
@@ -240,6 +281,80 @@ class ParentSpecEnumerationMethodTest(ParentEnumerationMixin, testlib.TestCase):
     klass = mitogen.master.ParentSpecEnumerationMethod
 
 
+class DirectoryCacheTest(testlib.TestCase):
+    klass = mitogen.master.DirectoryCache
+
+    def setUp(self):
+        super(DirectoryCacheTest, self).setUp()
+        self.cache = self.klass()
+        self.tmpdir = tempfile.mkdtemp(prefix='mitogen_dir_cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super(DirectoryCacheTest, self).tearDown()
+
+    def touch(self, *names):
+        path = os.path.join(self.tmpdir, *names)
+        open(path, 'w').close()
+
+    def test_not_dir(self):
+        self.touch('mod.py')
+        self.assertIsNone(self.cache.listdir(os.path.join(self.tmpdir, 'mod.py')))
+        self.assertIsNone(self.cache.listdir(os.path.join(self.tmpdir, 'absent')))
+
+    def test_cached(self):
+        self.touch('mod.py')
+        self.assertEqual({'mod.py': False}, self.cache.listdir(self.tmpdir))
+        self.assertEqual({'mod.py': False}, self.cache.listdir(self.tmpdir))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_mtime_invalidates(self):
+        self.cache.listdir(self.tmpdir)
+        self.touch('mod.py')
+        os.utime(self.tmpdir, (0, 0))
+        self.assertEqual({'mod.py': False}, self.cache.listdir(self.tmpdir))
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+
+    def test_iter_modules_matches_pkgutil(self):
+        os.mkdir(os.path.join(self.tmpdir, 'pkg'))
+        os.mkdir(os.path.join(self.tmpdir, 'notpkg'))
+        self.touch('pkg', '__init__.py')
+        self.touch('notpkg', 'x.py')
+        self.touch('__init__.py')
+        self.touch('mod.py')
+        self.touch('data.txt')
+        expect = sorted(
+            (name, is_pkg)
+            for _, name, is_pkg in pkgutil.iter_modules([self.tmpdir])
+        )
+        self.assertEqual(expect, sorted(self.cache.iter_modules(self.tmpdir)))
+        self.assertEqual([('mod', False), ('pkg', True)], expect)
+
+    def test_has_candidate(self):
+        os.mkdir(os.path.join(self.tmpdir, 'pkg'))
+        self.touch('mod.py')
+        self.assertTrue(self.cache.has_candidate(self.tmpdir, 'mod'))
+        self.assertTrue(self.cache.has_candidate(self.tmpdir, 'pkg'))
+        self.assertFalse(self.cache.has_candidate(self.tmpdir, 'absent'))
+        self.assertTrue(self.cache.has_candidate(
+            os.path.join(self.tmpdir, 'mod.py'), 'absent'))
+
+
+class GetChildModulesTest(testlib.TestCase):
+    func = staticmethod(mitogen.master.get_child_modules)
+
+    def test_pkg(self):
+        import module_finder_testmod
+        self.assertEqual(
+            sorted(
+                name for _, name, _ in pkgutil.iter_modules(
+                    module_finder_testmod.__path__)
+            ),
+            sorted(self.func(module_finder_testmod.__file__,
+                             'module_finder_testmod')),
+        )
+
+
 class ResolveRelPathTest(testlib.TestCase):
     klass = mitogen.master.ModuleFinder
 
@@ -305,6 +420,61 @@ class FindRelatedTest(testlib.TestCase):
         self.assertEqual(set(related), self.SIMPLE_EXPECT)
 
 
+class ImportGraphTest(testlib.TestCase):
+    klass = mitogen.master.ImportGraph
+
+    EDGES = {
+        'a': ['b', 'c'],
+        'b': ['c'],
+        'c': ['a', 'd'],
+        'd': [],
+    }
+
+    def setUp(self):
+        super(ImportGraphTest, self).setUp()
+        self.graph = self.klass()
+        self.scanned = []
+
+    def get_imports(self, name):
+        names = self.graph.get(name)
+        if names is None:
+            self.scanned.append(name)
+            names = self.EDGES[name]
+            self.graph.add(name, None, names)
+        return names
+
+    def test_closure(self):
+        self.assertEqual(['b', 'c', 'd'],
+                         self.graph.closure('a', self.get_imports))
+        self.assertEqual(['a', 'b', 'd'],
+                         self.graph.closure('c', self.get_imports))
+        self.assertEqual([], self.graph.closure('d', self.get_imports))
+
+    def test_scanned_once(self):
+        self.graph.closure('a', self.get_imports)
+        self.graph.closure('b', self.get_imports)
+        self.graph.closure('a', self.get_imports)
+        self.assertEqual(['a', 'b', 'c', 'd'], sorted(self.scanned))
+
+    def test_stale_file(self):
+        tf = tempfile.NamedTemporaryFile()
+        self.graph.add('a', tf.name, ['b'])
+        self.graph.add('b', None, [])
+        self.assertEqual(['b'], self.graph.closure('a', self.graph.get))
+        self.assertFalse(self.graph.is_stale('a'))
+
+        tf.write(b('import c\n'))
+        tf.flush()
+        self.assertTrue(self.graph.is_stale('a'))
+        self.graph.discard('a')
+        self.assertEqual(None, self.graph.get('a'))
+
+        self.graph.add('a', tf.name, ['c'])
+        self.graph.add('c', None, [])
+        self.assertFalse(self.graph.is_stale('a'))
+        self.assertEqual(['c'], self.graph.closure('a', self.graph.get))
+
+
 class DjangoMixin(object):
     WEBPROJECT_PATH = os.path.join(testlib.MODS_DIR, 'webproject')
 
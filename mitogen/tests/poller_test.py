@@ -6,6 +6,7 @@ import sys
 import unittest
 
 import mitogen.core
+import mitogen.master
 import mitogen.parent
 
 from mitogen.core import next
@@ -419,3 +420,120 @@ EpollTest = unittest.skipIf(
     condition=(not EpollTest.klass.SUPPORTED),
     reason='select.epoll() not available',
 )(EpollTest)
+
+
+class EdgeEpollTest(AllMixin, testlib.TestCase):
+    klass = mitogen.parent.EdgeEpollPoller
+
+EdgeEpollTest = unittest.skipIf(
+    condition=(not EdgeEpollTest.klass.SUPPORTED),
+    reason='select.epoll() not available',
+)(EdgeEpollTest)
+
+
+class FakeSide(object):
+    short_io = False
+
+
+class EdgeEpollEdgeTest(PollerMixin, SockMixin, testlib.TestCase):
+    klass = mitogen.parent.EdgeEpollPoller
+
+    def setUp(self):
+        super(EdgeEpollEdgeTest, self).setUp()
+        self.side = FakeSide()
+        self.data = (self.side, None)
+
+    def count_control(self, func):
+        calls = []
+        real = self.p._control
+        self.p._control = lambda fd: (calls.append(fd), real(fd))
+        try:
+            func()
+        finally:
+            del self.p._control
+        return len(calls)
+
+    def test_registered_for_both_directions(self):
+        self.p.start_receive(self.r1, self.data)
+        self.assertEqual(0, self.count_control(
+            lambda: self.p.start_transmit(self.r1, self.data)))
+        self.assertEqual(0, self.count_control(
+            lambda: self.p.stop_transmit(self.r1)))
+        self.assertEqual(set([self.r1]), self.p._registered)
+
+    def test_start_transmit_after_short_write(self):
+        self.p.start_receive(self.r1, self.data)
+        self.assertEqual([], list(self.p.poll(0)))
+        self.fill(self.r1)
+        self.side.short_io = True
+        self.p.start_transmit(self.r1, self.data)
+        self.assertEqual([], list(self.p.poll(0)))
+        self.drain(self.l1)
+        self.assertEqual([self.data], list(self.p.poll(0)))
+
+    def test_start_transmit_without_short_write(self):
+        self.p.start_receive(self.r1, self.data)
+        self.assertEqual([], list(self.p.poll(0)))
+        self.assertEqual(0, self.count_control(
+            lambda: self.p.start_transmit(self.r1, self.data)))
+        self.assertEqual([self.data], list(self.p.poll(0)))
+
+    def test_short_read_waits_for_edge(self):
+        self.fill(self.l1)
+        self.p.start_receive(self.r1, self.data)
+        self.side.short_io = True
+        self.assertEqual([self.data], list(self.p.poll(0)))
+        self.drain(self.r1)
+        self.assertEqual([], list(self.p.poll(0)))
+        os.write(self.l1, mitogen.core.b('x'))
+        self.assertEqual([self.data], list(self.p.poll(0)))
+
+    def test_full_read_stays_ready(self):
+        self.fill(self.l1)
+        self.p.start_receive(self.r1, self.data)
+        self.assertEqual([self.data], list(self.p.poll(0)))
+        self.assertEqual(0, self.count_control(
+            lambda: self.assertEqual([self.data], list(self.p.poll(0)))))
+
+    def test_unregistered_without_interest(self):
+        self.p.start_receive(self.r1, self.data)
+        self.p.start_transmit(self.r1, self.data)
+        self.p.stop_transmit(self.r1)
+        self.p.stop_receive(self.r1)
+        self.assertEqual(set(), self.p._registered)
+        self.assertEqual(set(), self.p._readable)
+        self.assertEqual(set(), self.p._writable)
+
+EdgeEpollEdgeTest = unittest.skipIf(
+    condition=(not EdgeEpollEdgeTest.klass.SUPPORTED),
+    reason='select.epoll() not available',
+)(EdgeEpollEdgeTest)
+
+
+class EdgeEpollBroker(mitogen.master.Broker):
+    poller_class = mitogen.parent.EdgeEpollPoller
+
+
+def echo(s):
+    return s
+
+
+class EdgeEpollBrokerTest(testlib.RouterMixin, testlib.TestCase):
+    broker_class = EdgeEpollBroker
+
+    def test_poller_class(self):
+        self.assertIsInstance(self.broker.poller,
+                              mitogen.parent.EdgeEpollPoller)
+
+    def test_large_messages(self):
+        # Larger than socket buffers, forcing short writes and full reads.
+        s = mitogen.core.b('x') * (4 * 1048576)
+        c = self.router.local()
+        recvs = [c.call_async(echo, s) for _ in range(4)]
+        for recv in recvs:
+            self.assertEqual(s, recv.get().unpickle())
+
+EdgeEpollBrokerTest = unittest.skipIf(
+    condition=(not mitogen.parent.EdgeEpollPoller.SUPPORTED),
+    reason='select.epoll() not available',
+)(EdgeEpollBrokerTest)
@@ -1,3 +1,6 @@
+import os
+import shutil
+import sys
 import tempfile
 
 import mitogen.core
@@ -47,3 +50,43 @@ class PropagateToTest(testlib.RouterMixin, testlib.TestCase):
             self.assertEqual(b('test'), s)
         finally:
             tf.close()
+
+
+def import_pushed_module():
+    import pushed_module
+    return pushed_module.pow(2, 8)
+
+
+class PropagatePathsAndModulesTest(testlib.RouterMixin, testlib.TestCase):
+    klass = mitogen.service.PushFileService
+
+    def setUp(self):
+        super(PropagatePathsAndModulesTest, self).setUp()
+        self.src_dir = tempfile.mkdtemp(prefix='mitogen_push_src_')
+        fp = open(os.path.join(self.src_dir, 'pushed_module.py'), 'w')
+        try:
+            fp.write('def pow(x, y):\n    return x ** y\n')
+        finally:
+            fp.close()
+        sys.path.insert(0, self.src_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.src_dir)
+        sys.modules.pop('pushed_module', None)
+        shutil.rmtree(self.src_dir)
+        super(PropagatePathsAndModulesTest, self).tearDown()
+
+    def test_modules_forwarded(self):
+        c1 = self.router.local()
+        c1.call(prepare)
+        get_module_count = self.router.responder.get_module_count
+
+        service = self.klass(router=self.router)
+        service.propagate_paths_and_modules(
+            context=c1,
+            paths=[],
+            modules=[u'pushed_module'],
+        )
+        self.assertEqual(256, c1.call(import_pushed_module))
+        self.assertEqual(get_module_count,
+                         self.router.responder.get_module_count)
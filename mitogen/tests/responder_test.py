@@ -1,7 +1,12 @@
+import os
+import shutil
+import tempfile
 import textwrap
 import subprocess
 import sys
+import threading
 import unittest
+import zlib
 
 try:
     from unittest import mock
@@ -93,6 +98,31 @@ class GoodModulesTest(testlib.RouterMixin, testlib.TestCase):
         self.assertEqual(0, self.router.responder.bad_load_module_count)
         self.assertLess(450, self.router.responder.good_load_module_size)
 
+    def test_simple_pkg_bundled(self):
+        # simple_pkg.b is sent alongside simple_pkg.a in a single message.
+        context = self.router.local()
+        self.assertEqual(3,
+            context.call(simple_pkg.a.subtract_one_add_two, 2))
+        self.assertEqual(1, self.router.responder.load_module_bundle_count)
+
+    @unittest.skipIf(not mitogen.core.ZDICT_SUPPORTED,
+                     'Requires zdict support')
+    def test_zdict_advertised(self):
+        context = self.router.local()
+        self.assertEqual(256, context.call(plain_old_module.pow, 2, 8))
+        stream = self.router.stream_by_id(context.context_id)
+        self.assertEqual(mitogen.core.ZDICT_VERSION,
+                         stream.protocol.zdict_version)
+        self.assertIn('plain_old_module', self.router.responder._zdict_cache)
+
+    def test_simple_pkg_unbundled(self):
+        self.router.responder.bundle_modules = False
+        context = self.router.local()
+        self.assertEqual(3,
+            context.call(simple_pkg.a.subtract_one_add_two, 2))
+        self.assertEqual(0, self.router.responder.load_module_bundle_count)
+        self.assertEqual(0, self.router.responder.bad_load_module_count)
+
     def test_self_contained_program(self):
         # Ensure a program composed of a single script can be imported
         # successfully.
@@ -104,14 +134,29 @@ class GoodModulesTest(testlib.RouterMixin, testlib.TestCase):
 
 
 class BrokenModulesTest(testlib.TestCase):
+    def make_router(self, stream):
+        router = mock.Mock()
+        router.stream_by_id = lambda n: stream
+        router.broker.defer = lambda func, *args: func(*args)
+        return router
+
+    def wait_for_builder(self, responder):
+        # Modules that are not yet built are answered once the builder
+        # thread has built them.
+        self.assertEqual(1, responder.deferred_get_module_count)
+        latch = mitogen.core.Latch()
+        responder._build_latch.put(lambda: latch.put(None))
+        latch.get(timeout=10.0)
+        responder._build_latch.close()
+        responder._build_thread.join()
+
     def test_obviously_missing(self):
         # Ensure we don't crash in the case of a module legitimately being
         # unavailable. Should never happen in the real world.
 
         stream = mock.Mock()
         stream.protocol.sent_modules = set()
-        router = mock.Mock()
-        router.stream_by_id = lambda n: stream
+        router = self.make_router(stream)
 
         msg = mitogen.core.Message(
             data=mitogen.core.b('non_existent_module'),
@@ -121,6 +166,7 @@ class BrokenModulesTest(testlib.TestCase):
 
         responder = mitogen.master.ModuleResponder(router)
         responder._on_get_module(msg)
+        self.wait_for_builder(responder)
         self.assertEqual(1, len(router._async_route.mock_calls))
 
         self.assertEqual(1, responder.get_module_count)
@@ -148,8 +194,7 @@ class BrokenModulesTest(testlib.TestCase):
 
         stream = mock.Mock()
         stream.protocol.sent_modules = set()
-        router = mock.Mock()
-        router.stream_by_id = lambda n: stream
+        router = self.make_router(stream)
 
         msg = mitogen.core.Message(
             data=mitogen.core.b('six_brokenpkg._six'),
@@ -159,6 +204,7 @@ class BrokenModulesTest(testlib.TestCase):
 
         responder = mitogen.master.ModuleResponder(router)
         responder._on_get_module(msg)
+        self.wait_for_builder(responder)
         self.assertEqual(1, len(router._async_route.mock_calls))
 
         self.assertEqual(1, responder.get_module_count)
@@ -173,6 +219,211 @@ class BrokenModulesTest(testlib.TestCase):
         self.assertIsInstance(tup, tuple)
 
 
+def prefetch(fullnames):
+    for finder in sys.meta_path:
+        if isinstance(finder, mitogen.core.Importer):
+            return finder.prefetch(fullnames)
+
+
+def sorted_stdlib_names():
+    for finder in sys.meta_path:
+        if isinstance(finder, mitogen.core.Importer):
+            return sorted(finder.stdlib_names)
+
+
+def ping():
+    import simple_pkg.ping
+    return simple_pkg.ping.ping(1)
+
+
+class PrefetchTest(testlib.RouterMixin, testlib.TestCase):
+    def test_single_request(self):
+        context = self.router.local()
+        self.assertEqual([], context.call(prefetch, []))
+        get_module_count = self.router.responder.get_module_count
+
+        names = [u'simple_pkg.ping', u'pkg_like_plumbum',
+                 u'pkg_like_plumbum.colors']
+        self.assertEqual(names, context.call(prefetch, names))
+        self.assertEqual(get_module_count + 1,
+                         self.router.responder.get_module_count)
+        self.assertEqual(3, self.router.responder.prefetch_module_count)
+
+        self.assertEqual((1,), context.call(ping))
+        self.assertEqual(get_module_count + 1,
+                         self.router.responder.get_module_count)
+
+    def test_via_intermediary(self):
+        c1 = self.router.local()
+        c2 = self.router.local(via=c1)
+        self.assertEqual([], c2.call(prefetch, []))
+        get_module_count = self.router.responder.get_module_count
+
+        names = [u'simple_pkg.ping', u'pkg_like_plumbum']
+        self.assertEqual(names, c2.call(prefetch, names))
+        self.assertEqual((1,), c2.call(ping))
+        self.assertEqual(get_module_count + 1,
+                         self.router.responder.get_module_count)
+
+    def test_loaded_skipped(self):
+        context = self.router.local()
+        self.assertEqual(3,
+            context.call(simple_pkg.a.subtract_one_add_two, 2))
+        self.assertEqual([], context.call(prefetch, [u'simple_pkg.a', u'os']))
+
+
+def import_master_only(fullname):
+    try:
+        __import__(fullname)
+    except ImportError:
+        return False
+    return True
+
+
+class StdlibRefusalTest(testlib.RouterMixin, testlib.TestCase):
+    def setUp(self):
+        super(StdlibRefusalTest, self).setUp()
+        self.src_dir = tempfile.mkdtemp(prefix='mitogen_stdlib_src_')
+        for fullname in 'master_only_module', 'master_only_module2':
+            open(os.path.join(self.src_dir, fullname + '.py'), 'w').close()
+        sys.path.insert(0, self.src_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.src_dir)
+        shutil.rmtree(self.src_dir)
+        super(StdlibRefusalTest, self).tearDown()
+
+    def test_stdlib_names_sent(self):
+        context = self.router.local()
+        self.assertIn('os', self.router.responder.get_stdlib_names())
+        self.assertEqual(self.router.responder.get_stdlib_names(),
+                         context.call(sorted_stdlib_names))
+
+    def test_refused_in_child(self):
+        context = self.router.local()
+        self.assertTrue(context.call(import_master_only,
+                                     'master_only_module'))
+
+        # Pretend the module is part of the stdlib, so children refuse it.
+        self.router.responder._stdlib_names = ['master_only_module']
+        context = self.router.local()
+        context.call(sorted_stdlib_names)
+        get_module_count = self.router.responder.get_module_count
+        self.assertFalse(context.call(import_master_only,
+                                      'master_only_module'))
+        self.assertEqual(get_module_count,
+                         self.router.responder.get_module_count)
+
+        # The count is reported with the next request.
+        self.assertTrue(context.call(import_master_only,
+                                     'master_only_module2'))
+        self.assertEqual(1,
+            self.router.get_stats()['avoided_get_module_count'])
+
+
+class BuilderTest(testlib.RouterMixin, testlib.TestCase):
+    def setUp(self):
+        super(BuilderTest, self).setUp()
+        self.src_dir = tempfile.mkdtemp(prefix='mitogen_builder_src_')
+        os.mkdir(os.path.join(self.src_dir, 'master_forward_pkg'))
+        for path, source in [
+            ('master_built_module.py', 'X = 1\n'),
+            ('master_warm_module.py', 'X = 1\n'),
+            ('master_forward_pkg/__init__.py', ''),
+            ('master_forward_pkg/a.py', 'from master_forward_pkg import b\n'),
+            ('master_forward_pkg/b.py', 'X = 1\n'),
+        ]:
+            fp = open(os.path.join(self.src_dir, path), 'w')
+            try:
+                fp.write(source)
+            finally:
+                fp.close()
+        sys.path.insert(0, self.src_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.src_dir)
+        for fullname in 'master_forward_pkg', 'master_forward_pkg.b':
+            sys.modules.pop(fullname, None)
+        shutil.rmtree(self.src_dir)
+        super(BuilderTest, self).tearDown()
+
+    def test_unbuilt_deferred(self):
+        responder = self.router.responder
+        context = self.router.local()
+        context.call(sorted_stdlib_names)
+        deferred = responder.deferred_get_module_count
+        self.assertTrue(context.call(import_master_only,
+                                     'master_built_module'))
+        self.assertEqual(deferred + 1, responder.deferred_get_module_count)
+
+    def test_warm_sent_from_broker(self):
+        responder = self.router.responder
+        self.assertEqual(1, responder.warm([u'master_warm_module']))
+        context = self.router.local()
+        context.call(sorted_stdlib_names)
+        deferred = responder.deferred_get_module_count
+        get_module_count = responder.get_module_count
+        self.assertTrue(context.call(import_master_only,
+                                     'master_warm_module'))
+        self.assertEqual(get_module_count + 1, responder.get_module_count)
+        self.assertEqual(deferred, responder.deferred_get_module_count)
+
+    def test_warm_builds_no_bundles(self):
+        # Related modules must be loaded in the master.
+        __import__('master_forward_pkg.b')
+        responder = self.router.responder
+        self.assertEqual(3, responder.warm([u'master_forward_pkg.a']))
+        for names, _ in responder._bundle_cache:
+            self.assertNotIn(u'master_forward_pkg.a', names)
+
+    def test_forward_builds_on_builder(self):
+        threads = []
+        pack_module_bundle = mitogen.parent.pack_module_bundle
+
+        def pack(*args):
+            threads.append(threading.current_thread().name)
+            return pack_module_bundle(*args)
+
+        __import__('master_forward_pkg.b')
+        context = self.router.local()
+        context.call(sorted_stdlib_names)
+        patcher = mock.patch.object(mitogen.parent, 'pack_module_bundle',
+                                    pack)
+        patcher.start()
+        try:
+            self.router.responder.forward_modules(context,
+                                                  ['master_forward_pkg.a'])
+            self.assertTrue(context.call(import_master_only,
+                                         'master_forward_pkg.a'))
+        finally:
+            patcher.stop()
+        self.assertTrue(threads)
+        for name in threads:
+            self.assertEqual('mitogen.master.ModuleResponder', name)
+
+
+class LruCacheTest(testlib.TestCase):
+    klass = mitogen.master.LruCache
+
+    def test_evicts_least_recently_used(self):
+        cache = self.klass(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(1, cache.get('a'))
+        cache['c'] = 3
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(['a', 'c'], list(cache))
+
+    def test_replace(self):
+        cache = self.klass(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache['a'] = 3
+        self.assertEqual(2, len(cache))
+        self.assertEqual(3, cache.get('a'))
+        self.assertEqual(['b', 'a'], list(cache))
+
+
 class ForwardTest(testlib.RouterMixin, testlib.TestCase):
     def test_forward_to_nonexistent_context(self):
         nonexistent = mitogen.core.Context(self.router, 123)
@@ -200,6 +451,108 @@ class ForwardTest(testlib.RouterMixin, testlib.TestCase):
         self.assertGreater(40000, self.router.responder.good_load_module_size)
 
 
+class PersistentCacheTest(testlib.TestCase):
+    def setUp(self):
+        super(PersistentCacheTest, self).setUp()
+        self.src_dir = tempfile.mkdtemp(prefix='mitogen_cache_src_')
+        self.cache_dir = os.path.join(self.src_dir, 'cache')
+        self.path = os.path.join(self.src_dir, 'cached_module.py')
+        self.write_source('import plain_old_module\n')
+        sys.path.insert(0, self.src_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.src_dir)
+        sys.modules.pop('cached_module', None)
+        shutil.rmtree(self.src_dir)
+        super(PersistentCacheTest, self).tearDown()
+
+    def write_source(self, source):
+        fp = open(self.path, 'w')
+        try:
+            fp.write(source)
+        finally:
+            fp.close()
+
+    def build(self):
+        responder = mitogen.master.ModuleResponder(mock.Mock())
+        responder.cache_dir = self.cache_dir
+        return responder, responder._build_tuple('cached_module')
+
+    def test_hit_after_miss(self):
+        responder, tup = self.build()
+        self.assertEqual(1, responder.module_cache_miss_count)
+        self.assertEqual(0, responder.module_cache_hit_count)
+
+        responder, tup2 = self.build()
+        self.assertEqual(0, responder.module_cache_miss_count)
+        self.assertEqual(1, responder.module_cache_hit_count)
+        self.assertEqual(tup, tup2)
+        self.assertIsInstance(tup2[3], mitogen.core.Blob)
+        self.assertEqual(['plain_old_module'], tup2[4])
+
+    def test_invalidated_by_source_change(self):
+        self.build()
+        self.write_source('import plain_old_module\nx = 1\n')
+        responder, tup = self.build()
+        self.assertEqual(1, responder.module_cache_miss_count)
+        self.assertEqual(0, responder.module_cache_hit_count)
+
+    def test_not_private(self):
+        os.mkdir(self.cache_dir)
+        os.chmod(self.cache_dir, int('0777', 8))
+        responder, tup = self.build()
+        self.assertEqual(0, responder.module_cache_miss_count)
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_invalidated_by_new_location(self):
+        self.build()
+        other_dir = tempfile.mkdtemp(prefix='mitogen_cache_other_')
+        try:
+            fp = open(os.path.join(other_dir, 'cached_module.py'), 'w')
+            try:
+                fp.write('x = 2\n')
+            finally:
+                fp.close()
+            sys.path.insert(0, other_dir)
+            try:
+                responder, tup = self.build()
+            finally:
+                sys.path.remove(other_dir)
+        finally:
+            shutil.rmtree(other_dir)
+        self.assertEqual(1, responder.module_cache_miss_count)
+        self.assertEqual(0, responder.module_cache_hit_count)
+        self.assertEqual(mitogen.core.b('x = 2\n'), zlib.decompress(tup[3]))
+
+    def test_garbage_entry(self):
+        responder, tup = self.build()
+        for name in os.listdir(self.cache_dir):
+            fp = open(os.path.join(self.cache_dir, name), 'wb')
+            try:
+                fp.write(mitogen.core.b('garbage'))
+            finally:
+                fp.close()
+        responder, tup2 = self.build()
+        self.assertEqual(1, responder.module_cache_miss_count)
+        self.assertEqual(tup, tup2)
+
+    def test_override_not_cached(self):
+        self.build()
+        responder = mitogen.master.ModuleResponder(mock.Mock())
+        responder.cache_dir = self.cache_dir
+        responder._finder.add_source_override(
+            'cached_module', self.path, mitogen.core.b('x = 1\n'), False)
+        tup = responder._build_tuple('cached_module')
+        self.assertEqual(0, responder.module_cache_hit_count)
+        self.assertEqual(mitogen.core.b('x = 1\n'), zlib.decompress(tup[3]))
+
+    def test_disabled_by_default(self):
+        responder = mitogen.master.ModuleResponder(mock.Mock())
+        responder._build_tuple('plain_old_module')
+        self.assertEqual(0, responder.module_cache_miss_count)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+
 class BlacklistTest(testlib.TestCase):
     @unittest.skip('implement me')
     def test_whitelist_no_blacklist(self):
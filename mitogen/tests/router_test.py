@@ -450,6 +450,37 @@ class UnidirectionalTest(testlib.RouterMixin, testlib.TestCase):
         self.assertTrue(str(e).startswith(msg))
 
 
+class ForwardTest(testlib.RouterMixin, testlib.TestCase):
+    def test_forwarded_between_children(self):
+        c1 = self.router.local(name='c1')
+        c2 = self.router.local(name='c2')
+
+        # Stamp the master's authority on c1, so c2 accepts its call only if
+        # the forwarding path rewrites auth_id.
+        c1s = self.router.stream_by_id(c1.context_id)
+        c1s.protocol.auth_id = mitogen.context_id
+        c1.call(ping_context, c2)
+        self.assertIn(c2.context_id, c1s.protocol.egress_ids)
+
+    def test_forward_refused_for_bad_auth_id(self):
+        c1 = self.router.local(name='c1')
+        c2 = self.router.local(name='c2')
+        c1s = self.router.stream_by_id(c1.context_id)
+        frame = mitogen.core.Message(
+            dst_id=c2.context_id,
+            src_id=c2.context_id,
+            auth_id=c2.context_id,
+            handle=1234,
+        ).pack()
+
+        forwarded = self.broker.defer_sync(
+            lambda: self.router._async_forward(
+                frame, c2.context_id, c2.context_id, c2.context_id, c1s,
+            )
+        )
+        self.assertFalse(forwarded)
+
+
 class EgressIdsTest(testlib.RouterMixin, testlib.TestCase):
     def test_egress_ids_populated(self):
         # Ensure Stream.egress_ids is populated on message reception.